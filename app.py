@@ -1,21 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_file, Response
-from flask_socketio import SocketIO, emit
-import threading
+from flask import Flask, render_template, request, jsonify, send_file, Response, g
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 import time
 import os
-import json
 import logging
 from typing import Dict, List, Optional
 import tempfile
 import mimetypes
+import fcntl
 
 from yts_scraper import YTSScraper
+from catalog_index import CatalogIndex, CatalogSyncer
+from progress_fanout import ProgressFanout
+from hls_remux import HLSRemuxer, RemuxError
+from image_cache import ImageCache, POSTER_SIZES
+from warmup import WarmupPrefetcher
+from session_store import SessionStore
+from offload import in_green_thread, poll_until, run_blocking
+from http_cache import finalize, parse_fields, payload_etag, project
+from streaming import (RangeNotSatisfiable, parse_range_header, iter_file_range,
+                       iter_complete_range, content_range)
 
 # Try to import libtorrent, but handle gracefully if it fails
 try:
     import libtorrent as lt
     LIBTORRENT_AVAILABLE = True
-    print("✓ libtorrent loaded successfully")
+    print(f"✓ libtorrent {lt.__version__} loaded successfully")
 except ImportError as e:
     LIBTORRENT_AVAILABLE = False
     print(f"⚠ libtorrent not available: {e}")
@@ -23,15 +32,128 @@ except ImportError as e:
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'torrent_player_secret_key')
-socketio = SocketIO(app, cors_allowed_origins="*")
+# A message queue lets every web worker emit to clients connected to any other
+socketio = SocketIO(app, cors_allowed_origins="*",
+                    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None)
 
 # Global instances
 scraper = YTSScraper()
 torrent_manager = None
-active_sessions = {}  # Store user sessions
+session_store = SessionStore()  # Replaced by the engine's store when one is configured
 
-# Initialize torrent manager only if libtorrent is available
-if LIBTORRENT_AVAILABLE:
+# Progress is coalesced per room and emitted at a bounded rate
+progress_fanout = ProgressFanout(
+    lambda event, data, room: socketio.emit(event, data, to=room),
+    interval=float(os.environ.get('PROGRESS_EMIT_INTERVAL', 1.0))
+)
+_fanout_started = False
+
+# Ranges at least this large that are already on disk are served zero-copy,
+# even if that means answering a Range request with a shorter 206
+MIN_COMPLETE_RANGE_BYTES = int(os.environ.get('MIN_COMPLETE_RANGE_BYTES', 1024 * 1024))
+
+# Cache-Control per endpoint; anything not listed gets no header
+ROUTE_CACHE_CONTROL = {
+    'get_movies': 'public, max-age=60, stale-while-revalidate=300',
+    'get_movie_details': 'public, max-age=600, stale-while-revalidate=3600',
+    'get_movie_details_batch': 'public, max-age=600, stale-while-revalidate=3600',
+    'get_torrent_info': 'public, max-age=300, stale-while-revalidate=1800',
+    'get_torrent_info_batch': 'public, max-age=300, stale-while-revalidate=1800',
+    'get_cache_stats': 'no-store',
+    'get_metrics': 'no-store',
+    'get_status': 'no-store',
+    'get_pieces': 'no-store',
+    'seek_video': 'no-store',
+    'hls_init': 'private, max-age=3600',
+    'hls_segment': 'private, max-age=3600',
+    'get_poster': 'public, max-age=31536000, immutable'
+}
+
+# Longest a seek hint holds its reader waiting for the keyframe's piece
+SEEK_HOLD_SECONDS = float(os.environ.get('SEEK_HOLD_SECONDS', 10))
+
+# Oldest measured download rate still trusted when choosing a torrent
+THROUGHPUT_ESTIMATE_MAX_AGE = float(os.environ.get('THROUGHPUT_ESTIMATE_MAX_AGE', 600))
+# Lowest ceiling a measured rate alone may put on torrent choice (bytes/s):
+# slow swarms drag measurements down, so they must not rule out 1080p
+THROUGHPUT_ESTIMATE_FLOOR = float(os.environ.get('THROUGHPUT_ESTIMATE_FLOOR', 512 * 1024))
+
+# Most ids accepted by one batch request
+MAX_BATCH_IDS = 50
+
+# Requests and bytes served by each video path
+stream_stats = {
+    'complete': {'requests': 0, 'bytes': 0},
+    'chunked': {'requests': 0, 'bytes': 0}
+}
+
+# Optional HLS remux of containers browsers cannot play (needs ffmpeg)
+hls_remuxer = None
+if os.environ.get('HLS_REMUX', '1') != '0':
+    hls_remuxer = HLSRemuxer(
+        os.environ.get('HLS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'torrent_player_hls')),
+        int(os.environ.get('HLS_CACHE_BYTES', 1024 ** 3)),
+        segment_seconds=float(os.environ.get('HLS_SEGMENT_SECONDS', 6))
+    )
+    if not hls_remuxer.available:
+        print("⚠ ffmpeg not found, HLS remux disabled")
+        hls_remuxer = None
+
+# Resized poster variants, served from /img instead of hotlinking YTS
+image_cache = ImageCache(
+    os.environ.get('IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'torrent_player_images')),
+    int(os.environ.get('IMAGE_CACHE_BYTES', 256 * 1024 ** 2)),
+    scraper.fetch_image
+)
+
+# Lock files held for the life of the process, so only one web worker runs
+# each background job
+_held_locks = {}
+
+def _hold_lock(path: str) -> bool:
+    """Take an exclusive lock on path for the rest of this process, if no other process holds it"""
+    if path in _held_locks:
+        return True
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _held_locks[path] = lock_file
+    return True
+
+# Local catalog index, kept in sync with YTS in the background by whichever
+# worker takes its lock; the others read the same database
+catalog_index = None
+catalog_syncer = None
+if os.environ.get('CATALOG_SYNC', '1') != '0':
+    try:
+        catalog_db = os.environ.get(
+            'CATALOG_DB', os.path.join(tempfile.gettempdir(), 'torrent_player_catalog.db')
+        )
+        catalog_index = CatalogIndex(catalog_db)
+        catalog_syncer = CatalogSyncer(
+            scraper, catalog_index,
+            interval=float(os.environ.get('CATALOG_SYNC_INTERVAL', 1800)),
+            full_refresh_interval=float(os.environ.get('CATALOG_FULL_SYNC_INTERVAL', 86400))
+        )
+        if _hold_lock(catalog_db + '.lock'):
+            catalog_syncer.start()
+    except Exception as e:
+        print(f"⚠ Catalog index disabled: {e}")
+        catalog_index = None
+        catalog_syncer = None
+
+# Talk to a separate engine process when one is configured, otherwise run
+# the torrent manager in-process (only if libtorrent is available)
+if os.environ.get('TORRENT_ENGINE_SOCKET'):
+    from engine_client import EngineClient
+    torrent_manager = EngineClient(os.environ['TORRENT_ENGINE_SOCKET'])
+    session_store = torrent_manager
+    LIBTORRENT_AVAILABLE = True
+    print(f"✓ Using torrent engine at {os.environ['TORRENT_ENGINE_SOCKET']}")
+elif LIBTORRENT_AVAILABLE:
     try:
         from torrent_manager import TorrentManager
         torrent_manager = TorrentManager()
@@ -40,18 +162,47 @@ if LIBTORRENT_AVAILABLE:
         print(f"⚠ Failed to initialize torrent manager: {e}")
         LIBTORRENT_AVAILABLE = False
 
+# Optional background warm-up of trending titles, so they start near-instantly.
+# Only one worker drives it, even when several share one engine.
+warmup_prefetcher = None
+if (LIBTORRENT_AVAILABLE and os.environ.get('WARMUP_PREFETCH', '0') != '0'
+        and _hold_lock(os.environ.get('WARMUP_LOCK',
+                                      os.path.join(tempfile.gettempdir(), 'torrent_player_warmup.lock')))):
+    warmup_prefetcher = WarmupPrefetcher(
+        scraper, torrent_manager,
+        sort_by=os.environ.get('WARMUP_SORT_BY', 'download_count'),
+        titles=int(os.environ.get('WARMUP_TITLES', 10)),
+        head_seconds=float(os.environ.get('WARMUP_HEAD_SECONDS', 30)),
+        download_limit=int(os.environ.get('WARMUP_DOWNLOAD_BYTES', 0)),
+        disk_budget=int(os.environ.get('WARMUP_DISK_BYTES', 1024 ** 3)),
+        interval=float(os.environ.get('WARMUP_INTERVAL', 1800))
+    )
+    warmup_prefetcher.start()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WebSession:
-    def __init__(self, session_id: str):
+    """Read-only view of a session record, valid for one request"""
+    def __init__(self, session_id: str, current_torrent_id: Optional[str] = None,
+                 current_movie: Optional[Dict] = None, status: str = "ready"):
         self.session_id = session_id
-        self.current_movies = []
-        self.current_torrent_id = None
-        self.current_movie = None
-        self.download_progress = 0.0
-        self.status = "ready"
+        self.current_torrent_id = current_torrent_id
+        self.current_movie = current_movie
+        self.status = status
+    
+    @classmethod
+    def from_record(cls, record: Dict) -> 'WebSession':
+        return cls(record['session_id'], record.get('current_torrent_id'),
+                   record.get('current_movie'), record.get('status', 'ready'))
+
+def _get_session(session_id: str) -> Optional[WebSession]:
+    record = session_store.get_session(session_id)
+    return WebSession.from_record(record) if record else None
+
+def _update_session(session_id: str, **fields) -> WebSession:
+    return WebSession.from_record(session_store.update_session(session_id, **fields))
 
 @app.route('/')
 def index():
@@ -66,15 +217,24 @@ def get_movies():
         limit = request.args.get('limit', 20, type=int)
         quality = request.args.get('quality', '720p')
         query = request.args.get('query', '')
+        genre = request.args.get('genre', '')
+        sort_by = request.args.get('sort_by', 'date_added')
+        minimum_rating = request.args.get('minimum_rating', 0, type=int)
         
-        if query:
-            movies = scraper.search_movies(query, limit)
+        if catalog_syncer and catalog_syncer.ready and catalog_index.can_sort(sort_by):
+            # Answer from the local index without an upstream round-trip
+            movies = run_blocking(catalog_index.search, query, page=page, limit=limit,
+                                  quality=quality, genre=genre,
+                                  minimum_rating=minimum_rating, sort_by=sort_by)
         else:
-            movies = scraper.get_movies(page=page, limit=limit, quality=quality)
+            movies = run_blocking(scraper.get_movies, page=page, limit=limit, quality=quality,
+                                  minimum_rating=minimum_rating, query_term=query,
+                                  genre=genre, sort_by=sort_by)
+            g.etag = payload_etag('movies', _fields_key(), scraper.etag(movies))
         
         return jsonify({
             'success': True,
-            'movies': movies,
+            'movies': project(movies, parse_fields(request.args.get('fields'))),
             'total': len(movies)
         })
     except Exception as e:
@@ -84,12 +244,40 @@ def get_movies():
             'error': str(e)
         }), 500
 
+@app.route('/api/cache/stats')
+def get_cache_stats():
+    """Get response and disk cache counters"""
+    return jsonify({
+        'success': True,
+        'cache': scraper.cache_stats(),
+        'disk_cache': torrent_manager.get_disk_cache_stats() if torrent_manager else None,
+        'windows': torrent_manager.get_window_stats() if torrent_manager else {},
+        'images': image_cache.stats()
+    })
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Get torrent startup latency metrics"""
+    return jsonify({
+        'success': True,
+        'metrics': torrent_manager.get_metrics() if torrent_manager else {},
+        'bandwidth': torrent_manager.get_bandwidth_stats() if torrent_manager else {},
+        'progress_fanout': progress_fanout.stats,
+        'streams': stream_stats,
+        'hls': hls_remuxer.stats() if hls_remuxer else None,
+        'warmup': warmup_prefetcher.stats() if warmup_prefetcher else None
+    })
+
 @app.route('/api/movie/<int:movie_id>')
 def get_movie_details(movie_id):
     """Get detailed movie information"""
     try:
-        movie = scraper.get_movie_details(movie_id)
+        movie = run_blocking(scraper.get_movie_details, movie_id)
         if movie:
+            if catalog_index:
+                # Details carry the cast, which the listing does not
+                run_blocking(catalog_index.upsert, [movie])
+            g.etag = payload_etag('movie', scraper.etag(movie))
             return jsonify({
                 'success': True,
                 'movie': movie
@@ -106,11 +294,80 @@ def get_movie_details(movie_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/movies/batch')
+def get_movie_details_batch():
+    """Get details of several movies (?ids=1,2,3) in one request, in the order given"""
+    movie_ids = _parse_batch_ids()
+    if movie_ids is None:
+        return jsonify({
+            'success': False,
+            'error': f'ids must be 1 to {MAX_BATCH_IDS} comma-separated movie ids'
+        }), 400
+    
+    try:
+        movies = run_blocking(scraper.get_movie_details_many, movie_ids,
+                              request.args.get('timeout', type=float))
+        found = [movie for movie in movies if movie]
+        if catalog_index and found:
+            run_blocking(catalog_index.upsert, found)
+        g.etag = payload_etag('movies/batch', _fields_key(), *(
+            scraper.etag(movie) if movie else f'missing:{movie_id}'
+            for movie_id, movie in zip(movie_ids, movies)
+        ))
+        
+        return jsonify({
+            'success': True,
+            'movies': project(movies, parse_fields(request.args.get('fields'))),
+            'missing': [movie_id for movie_id, movie in zip(movie_ids, movies) if not movie]
+        })
+    except Exception as e:
+        logger.error(f"Error fetching movie details batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/torrents/batch')
+def get_torrent_info_batch():
+    """Get the best torrent of several movies (?ids=1,2,3&quality=720p) in one request"""
+    movie_ids = _parse_batch_ids()
+    if movie_ids is None:
+        return jsonify({
+            'success': False,
+            'error': f'ids must be 1 to {MAX_BATCH_IDS} comma-separated movie ids'
+        }), 400
+    
+    try:
+        quality = request.args.get('quality', '720p')
+        throughput = _client_throughput()
+        movies = run_blocking(scraper.get_movie_details_many, movie_ids,
+                              request.args.get('timeout', type=float))
+        
+        torrents = []
+        for movie_id, movie in zip(movie_ids, movies):
+            torrent = scraper.get_best_torrent(movie, quality, throughput) if movie else None
+            torrents.append({
+                'movie_id': movie_id,
+                'torrent': _torrent_summary(torrent) if torrent else None
+            })
+        
+        return jsonify({
+            'success': True,
+            'torrents': torrents,
+            'streaming_available': LIBTORRENT_AVAILABLE
+        })
+    except Exception as e:
+        logger.error(f"Error getting torrent info batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/torrent/<int:movie_id>')
 def get_torrent_info(movie_id):
     """Get torrent information for a movie"""
     try:
-        movie = scraper.get_movie_details(movie_id)
+        movie = run_blocking(scraper.get_movie_details, movie_id)
         if not movie:
             return jsonify({
                 'success': False,
@@ -118,18 +375,12 @@ def get_torrent_info(movie_id):
             }), 404
         
         quality = request.args.get('quality', '720p')
-        torrent = scraper.get_best_torrent(movie, quality)
+        torrent = scraper.get_best_torrent(movie, quality, _client_throughput())
         
         if torrent:
             return jsonify({
                 'success': True,
-                'torrent': {
-                    'url': torrent.get('url'),
-                    'quality': torrent.get('quality'),
-                    'size': torrent.get('size'),
-                    'seeds': torrent.get('seeds', 0),
-                    'peers': torrent.get('peers', 0)
-                },
+                'torrent': _torrent_summary(torrent),
                 'movie': movie,
                 'streaming_available': LIBTORRENT_AVAILABLE
             })
@@ -162,14 +413,10 @@ def play_movie():
         quality = data.get('quality', '720p')
         session_id = data.get('session_id', 'default')
         
-        # Get or create session
-        if session_id not in active_sessions:
-            active_sessions[session_id] = WebSession(session_id)
-        
-        session = active_sessions[session_id]
+        session = _get_session(session_id) or WebSession(session_id)
         
         # Get movie details
-        movie = scraper.get_movie_details(movie_id)
+        movie = run_blocking(scraper.get_movie_details, movie_id)
         if not movie:
             return jsonify({
                 'success': False,
@@ -177,35 +424,38 @@ def play_movie():
             }), 404
         
         # Get best torrent
-        torrent = scraper.get_best_torrent(movie, quality)
+        torrent = scraper.get_best_torrent(movie, quality, _client_throughput())
         if not torrent:
             return jsonify({
                 'success': False,
                 'error': 'No torrent available for this quality'
             }), 400
         
-        # Start torrent download
+        # Start torrent download, sharing it with anyone already watching
         torrent_url = torrent.get('url')
-        torrent_id = torrent_manager.add_torrent(
-            torrent_url, 
-            lambda tid, info: _on_torrent_progress(session_id, tid, info)
+        torrent_id = run_blocking(
+            torrent_manager.add_torrent,
+            torrent_url,
+            lambda tid, info: _on_torrent_progress(session_id, tid, info),
+            viewer_id=session_id,
+            info_hash=torrent.get('hash')
         )
         
         if torrent_id:
-            session.current_torrent_id = torrent_id
-            session.current_movie = movie
-            session.status = "downloading"
+            # Leave whatever this session was watching before
+            if session.current_torrent_id and session.current_torrent_id != torrent_id:
+                torrent_manager.release_torrent(session.current_torrent_id, session_id)
+            _update_session(session_id, current_torrent_id=torrent_id, current_movie=movie,
+                            status="downloading")
+            _notify_session_torrent(session_id, session.current_torrent_id, torrent_id)
             
-            # Start monitoring for video files
-            threading.Thread(
-                target=_monitor_for_video_files,
-                args=(session_id, torrent_id),
-                daemon=True
-            ).start()
+            # Watch for video files from the torrent engine loop
+            _watch_for_video_files(session_id, torrent_id)
             
             return jsonify({
                 'success': True,
                 'torrent_id': torrent_id,
+                'movie': movie,
                 'message': 'Torrent started successfully'
             })
         else:
@@ -221,32 +471,328 @@ def play_movie():
             'error': str(e)
         }), 500
 
+@app.route('/api/control/<session_id>', methods=['POST'])
+def control_torrent(session_id):
+    """Pause, resume or stop the session's torrent"""
+    session = _get_session(session_id)
+    if not session or not session.current_torrent_id or not torrent_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    action = (request.get_json() or {}).get('action')
+    torrent_id = session.current_torrent_id
+    
+    if action == 'stop':
+        # The download keeps going while other viewers share it
+        torrent_manager.release_torrent(torrent_id, session_id)
+        _update_session(session_id, current_torrent_id=None, current_movie=None, status="ready")
+        _notify_session_torrent(session_id, torrent_id, None)
+        return jsonify({'success': True, 'message': 'Stopped'})
+    
+    if action in ('pause', 'resume'):
+        if torrent_manager.get_viewer_count(torrent_id) > 1:
+            return jsonify({
+                'success': False,
+                'error': 'Torrent is shared with other viewers'
+            }), 409
+        
+        if action == 'pause':
+            ok = torrent_manager.pause_torrent(torrent_id)
+        else:
+            ok = torrent_manager.resume_torrent(torrent_id)
+        
+        if ok:
+            status = 'paused' if action == 'pause' else 'downloading'
+            _update_session(session_id, status=status)
+            return jsonify({'success': True, 'message': f'Torrent {status}'})
+        return jsonify({
+            'success': False,
+            'error': f'Failed to {action} torrent'
+        }), 500
+    
+    return jsonify({
+        'success': False,
+        'error': f'Unknown action: {action}'
+    }), 400
+
 @app.route('/api/status/<session_id>')
 def get_status(session_id):
     """Get current session status"""
-    session = active_sessions.get(session_id)
+    session = _get_session(session_id)
     if not session:
         return jsonify({
             'success': False,
             'error': 'Session not found'
         }), 404
     
+    # Snapshots are built by the engine loop, so polling never touches libtorrent
     torrent_status = None
     if session.current_torrent_id and torrent_manager:
-        torrent_status = torrent_manager.get_torrent_status(session.current_torrent_id)
+        snapshot = torrent_manager.get_torrent_status(session.current_torrent_id)
+        torrent_status = snapshot.to_dict() if snapshot else None
     
     return jsonify({
         'success': True,
         'status': session.status,
-        'progress': session.download_progress,
+        'progress': torrent_status['progress'] if torrent_status else 0.0,
         'torrent_status': torrent_status,
         'current_movie': session.current_movie,
         'streaming_available': LIBTORRENT_AVAILABLE
     })
 
+@app.route('/api/video/<session_id>')
+def stream_video(session_id):
+    """Stream the session's main video file with HTTP Range support"""
+    if not LIBTORRENT_AVAILABLE or not torrent_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Torrent functionality not available. Please install libtorrent.'
+        }), 503
+    
+    session = _get_session(session_id)
+    if not session or not session.current_torrent_id:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    torrent_id = session.current_torrent_id
+    main_video = _get_main_video(torrent_id)
+    if not main_video:
+        return jsonify({
+            'success': False,
+            'error': 'No video file available yet'
+        }), 404
+    
+    file_index = main_video['index']
+    file_size = main_video['size']
+    local_path = torrent_manager.get_file_location(torrent_id, file_index)
+    
+    try:
+        byte_range = parse_range_header(request.headers.get('Range'), file_size)
+    except RangeNotSatisfiable:
+        return Response(status=416, headers={'Content-Range': f'bytes */{file_size}'})
+    
+    start, end = byte_range if byte_range else (0, file_size - 1)
+    length = end - start + 1
+    
+    # Each request is its own reader so a seek (a new Range request) moves
+    # the readahead window instead of stacking on the old one
+    reader_id = f'{session_id}:{start}:{time.monotonic()}'
+    
+    # Bytes already on disk skip the per-chunk piece waits. A Range request
+    # whose head is complete gets just that head (a shorter 206 the player
+    # follows up on), so only the still-downloading tail is streamed chunked.
+    available = torrent_manager.available_length(torrent_id, file_index, start, length)
+    if available < length and (not byte_range or available < MIN_COMPLETE_RANGE_BYTES):
+        available = 0
+    
+    # direct_passthrough hands the body straight to the server, which skips
+    # Response.call_on_close, so the body itself drops the reader on close
+    def remove_reader():
+        run_blocking(torrent_manager.remove_reader, torrent_id, reader_id)
+    
+    # Bytes are counted as the server takes them, so disconnects and
+    # early ends are not counted as served
+    path_stats = stream_stats['complete' if available else 'chunked']
+    path_stats['requests'] += 1
+    
+    def count_sent(sent):
+        path_stats['bytes'] += sent
+    
+    if available:
+        end = start + available - 1
+        # Keep the readahead window just past what is being sent
+        if end + 1 < file_size and request.method != 'HEAD':
+            run_blocking(torrent_manager.update_playhead, torrent_id, reader_id, file_index, end + 1)
+        body = iter_complete_range(request.environ, local_path, start, end,
+                                   on_close=remove_reader, on_sent=count_sent)
+    else:
+        def wait_for_chunk(offset, length):
+            run_blocking(torrent_manager.update_playhead, torrent_id, reader_id, file_index, offset)
+            return _wait_for_range(torrent_id, file_index, offset, length)
+        
+        body = iter_file_range(local_path, start, end, wait_for_chunk,
+                               on_close=remove_reader, on_sent=count_sent)
+    
+    mimetype = mimetypes.guess_type(main_video['path'])[0] or 'application/octet-stream'
+    partial = byte_range is not None or end < file_size - 1
+    response = Response(body, status=206 if partial else 200,
+                        mimetype=mimetype, direct_passthrough=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Length'] = str(end - start + 1)
+    if partial:
+        response.headers['Content-Range'] = content_range(start, end, file_size)
+    return response
+
+@app.route('/api/pieces/<session_id>')
+def get_pieces(session_id):
+    """Get the run-length encoded piece bitfield of the session's torrent"""
+    session = _get_session(session_id)
+    if not session or not session.current_torrent_id or not torrent_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    snapshot = torrent_manager.get_torrent_status(session.current_torrent_id)
+    if not snapshot:
+        return jsonify({
+            'success': False,
+            'error': 'Torrent not found'
+        }), 404
+    
+    pieces = snapshot.pieces_dict()
+    
+    # Piece range of the main video, so the UI can draw its buffered ranges
+    video_index = snapshot.main_video_index()
+    if video_index is not None:
+        span = snapshot.file_piece_span(video_index)
+        if span:
+            pieces['video_pieces'] = list(span)
+    
+    return jsonify({
+        'success': True,
+        'pieces': pieces
+    })
+
+@app.route('/api/hls/<session_id>/index.m3u8')
+def hls_playlist(session_id):
+    """HLS playlist of the session's video, growing as its pieces arrive"""
+    source, error = _hls_source(session_id)
+    if error:
+        return error
+    torrent_id, main_video, path, key, info = source
+    
+    ready, complete = _hls_ready_segments(torrent_id, main_video, info)
+    response = Response(hls_remuxer.playlist(info, ready, complete),
+                        mimetype='application/vnd.apple.mpegurl')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/hls/<session_id>/init.mp4')
+def hls_init(session_id):
+    """fMP4 init segment shared by every media segment"""
+    source, error = _hls_source(session_id)
+    if error:
+        return error
+    torrent_id, main_video, path, key, info = source
+    
+    if not _wait_for_hls_segment(session_id, torrent_id, main_video, 0, info):
+        return Response(status=503, headers={'Retry-After': '2'})
+    try:
+        return Response(run_blocking(hls_remuxer.init_segment, key, path), mimetype='video/mp4')
+    except RemuxError as e:
+        logger.error(f"HLS init segment failed for {key}: {e}")
+        return jsonify({'success': False, 'error': 'Remux failed'}), 500
+
+@app.route('/api/hls/<session_id>/<int:index>.m4s')
+def hls_segment(session_id, index):
+    """One fMP4 media segment, remuxed on first request and cached"""
+    source, error = _hls_source(session_id)
+    if error:
+        return error
+    torrent_id, main_video, path, key, info = source
+    
+    if index >= hls_remuxer.segment_count(info):
+        return jsonify({'success': False, 'error': 'Segment not found'}), 404
+    if not _wait_for_hls_segment(session_id, torrent_id, main_video, index, info):
+        return Response(status=503, headers={'Retry-After': '2'})
+    try:
+        return Response(run_blocking(hls_remuxer.segment, key, path, index),
+                        mimetype='video/iso.segment')
+    except RemuxError as e:
+        logger.error(f"HLS segment {index} failed for {key}: {e}")
+        return jsonify({'success': False, 'error': 'Remux failed'}), 500
+
+@app.route('/img/<int:movie_id>/<size>')
+def get_poster(movie_id, size):
+    """Serve a movie poster resized to small, medium or large"""
+    if size not in POSTER_SIZES:
+        return jsonify({'success': False, 'error': 'Unknown poster size'}), 404
+    
+    image_format = image_cache.choose_format(request.headers.get('Accept', ''))
+    try:
+        poster = run_blocking(image_cache.get, movie_id, size, image_format,
+                              lambda: _poster_url(movie_id))
+    except Exception as e:
+        logger.error(f"Error fetching poster for {movie_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 502
+    
+    if not poster:
+        return jsonify({'success': False, 'error': 'Poster not found'}), 404
+    
+    path, mimetype, etag = poster
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    # send_file marks everything no-cache; variants never change, on 200 and 304 alike
+    response.headers['Cache-Control'] = ROUTE_CACHE_CONTROL['get_poster']
+    response.vary.add('Accept')
+    if response.status_code == 200 and request.method == 'GET':
+        image_cache.record_sent(movie_id, path)
+    return response
+
+@app.route('/api/seek/<session_id>')
+def seek_video(session_id):
+    """Prioritize the pieces for the keyframe nearest a playback time"""
+    if not LIBTORRENT_AVAILABLE or not torrent_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Torrent functionality not available. Please install libtorrent.'
+        }), 503
+    
+    session = _get_session(session_id)
+    if not session or not session.current_torrent_id:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    seconds = request.args.get('t', 0.0, type=float)
+    torrent_id = session.current_torrent_id
+    main_video = _get_main_video(torrent_id)
+    if not main_video:
+        return jsonify({
+            'success': False,
+            'error': 'Video not available yet'
+        }), 404
+    
+    reader_id = f'{session_id}:seek'
+    try:
+        keyframe = run_blocking(torrent_manager.seek, torrent_id, reader_id, main_video['index'], seconds)
+        if not keyframe:
+            # No index (yet): aim at the proportional byte offset instead
+            keyframe = _estimate_keyframe(session, main_video, seconds)
+            if keyframe:
+                run_blocking(torrent_manager.update_playhead, torrent_id, reader_id,
+                             main_video['index'], keyframe['offset'])
+        
+        if not keyframe:
+            return jsonify({
+                'success': False,
+                'error': 'Video index not available'
+            }), 404
+        
+        # Hold the hint until the keyframe's piece is in, then let the
+        # player's own reader take over
+        _wait_for_range(torrent_id, main_video['index'], keyframe['offset'], 1, SEEK_HOLD_SECONDS)
+    finally:
+        run_blocking(torrent_manager.remove_reader, torrent_id, reader_id)
+    
+    return jsonify({
+        'success': True,
+        'keyframe': keyframe
+    })
+
 @socketio.on('connect')
 def handle_connect():
     """Handle client connection"""
+    global _fanout_started
+    if not _fanout_started:
+        _fanout_started = True
+        socketio.start_background_task(progress_fanout.run, socketio.sleep)
+    
     logger.info(f"Client connected: {request.sid}")
     emit('status', {'message': 'Connected to server'})
 
@@ -257,62 +803,262 @@ def handle_disconnect():
 
 @socketio.on('join_session')
 def handle_join_session(data):
-    """Handle client joining a session"""
+    """
+    Handle client joining a session. Clients join again whenever their
+    session switches torrents, so the worker holding their connection
+    moves them between torrent rooms; no worker tracks who is connected.
+    """
     session_id = data.get('session_id', 'default')
+    session = _get_session(session_id)
+    torrent_id = session.current_torrent_id if session else None
+    
+    # A client follows one session and its current torrent; leave the rest
+    keep = {_session_room(session_id)}
+    if torrent_id:
+        keep.add(_torrent_room(torrent_id))
+    for room in rooms():
+        if room.startswith(('session:', 'torrent:')) and room not in keep:
+            leave_room(room)
+    for room in keep:
+        join_room(room)
+    
+    # Deltas on the torrent room assume the client has its full state
+    if torrent_id:
+        emit('torrent_progress', _progress_snapshot(torrent_id))
+    
     logger.info(f"Client {request.sid} joined session {session_id}")
-    emit('session_joined', {'session_id': session_id})
+    emit('session_joined', {'session_id': session_id, 'torrent_id': torrent_id})
+
+def _session_room(session_id: str) -> str:
+    return f'session:{session_id}'
+
+def _torrent_room(torrent_id: str) -> str:
+    return f'torrent:{torrent_id}'
+
+def _notify_session_torrent(session_id: str, old_torrent_id: Optional[str], new_torrent_id: Optional[str]):
+    """Ask a session's clients, on whichever worker they are connected, to rejoin it"""
+    if old_torrent_id == new_torrent_id:
+        return
+    socketio.emit('session_torrent', {'session_id': session_id, 'torrent_id': new_torrent_id},
+                  to=_session_room(session_id))
+
+def _progress_snapshot(torrent_id: str) -> Dict:
+    """Full progress state of a torrent, for clients that have just joined its room"""
+    state = {'torrent_id': torrent_id, 'progress': 0.0, 'status': 'downloading',
+             'download_rate': 0, 'peers': 0}
+    snapshot = torrent_manager.get_torrent_status(torrent_id) if torrent_manager else None
+    if snapshot:
+        state.update(_progress_fields(snapshot.to_dict()))
+    state.update(progress_fanout.full_state(_torrent_room(torrent_id)) or {})
+    return state
+
+def _progress_fields(torrent_info: Dict) -> Dict:
+    # Rounding keeps insignificant changes out of the deltas
+    return {
+        'progress': round(torrent_info.get('progress', 0), 1),
+        'status': torrent_info.get('status', 'downloading'),
+        'download_rate': torrent_info.get('download_rate', 0) // 1024 * 1024,
+        'peers': torrent_info.get('peers', 0)
+    }
 
 def _on_torrent_progress(session_id: str, torrent_id: str, torrent_info: Dict):
     """Handle torrent progress updates"""
-    session = active_sessions.get(session_id)
-    if session:
-        session.download_progress = torrent_info.get('progress', 0)
-        session.status = torrent_info.get('status', 'downloading')
-        
-        # Emit progress update to all clients in this session
-        socketio.emit('torrent_progress', {
-            'session_id': session_id,
-            'progress': session.download_progress,
-            'status': session.status,
-            'download_rate': torrent_info.get('download_rate', 0),
-            'peers': torrent_info.get('peers', 0)
-        })
+    # Every viewer of the torrent shares one coalesced update
+    progress_fanout.publish(_torrent_room(torrent_id), 'torrent_progress', {
+        'torrent_id': torrent_id,
+        **_progress_fields(torrent_info)
+    })
+
+def _get_main_video(torrent_id: str) -> Optional[Dict]:
+    """Return the largest video file of a torrent, if its metadata is known"""
+    video_files = torrent_manager.get_video_files(torrent_id)
+    if not video_files:
+        return None
+    return max(video_files, key=lambda x: x['size'])
+
+def _wait_for_range(torrent_id: str, file_index: int, offset: int, length: int,
+                    timeout: float = 60.0) -> bool:
+    """
+    Wait for the pieces under a byte range. Piece waits can last a minute,
+    so a green thread polls for them cooperatively instead of holding an
+    offload thread that catalog and YTS calls need.
+    """
+    if not in_green_thread():
+        return torrent_manager.wait_for_range(torrent_id, file_index, offset, length, timeout)
+    return poll_until(
+        lambda: torrent_manager.have_range(torrent_id, file_index, offset, length),
+        timeout,
+        alive=lambda: torrent_manager.get_torrent_status(torrent_id) is not None
+    )
+
+def _hls_source(session_id: str):
+    """Resolve a session to its remuxable video: ((torrent_id, video, path, key, probe), error)"""
+    if not hls_remuxer or not torrent_manager:
+        return None, (jsonify({'success': False, 'error': 'HLS remux not available'}), 503)
+    
+    session = _get_session(session_id)
+    if not session or not session.current_torrent_id:
+        return None, (jsonify({'success': False, 'error': 'Session not found'}), 404)
+    
+    torrent_id = session.current_torrent_id
+    main_video = _get_main_video(torrent_id)
+    if not main_video:
+        return None, (jsonify({'success': False, 'error': 'No video file available yet'}), 404)
+    
+    path = torrent_manager.get_file_location(torrent_id, main_video['index'])
+    key = f"{torrent_id}-{main_video['index']}"
+    
+    # ffprobe needs the container header on disk first; copied segments are
+    # cut at the keyframes of the container index
+    info = None
+    if torrent_manager.have_range(torrent_id, main_video['index'], 0,
+                                  min(main_video['size'], 1024 * 1024)):
+        info = run_blocking(
+            hls_remuxer.probe, key, path,
+            lambda: torrent_manager.get_keyframe_times(torrent_id, main_video['index'])
+        )
+    if not info:
+        return None, Response(status=503, headers={'Retry-After': '2'})
+    
+    return (torrent_id, main_video, path, key, info), None
 
-def _monitor_for_video_files(session_id: str, torrent_id: str):
-    """Monitor torrent for video files"""
+def _hls_byte_span(main_video: Dict, start: float, end: float, duration: float):
+    """Byte range likely to hold a time span, widened for variable bitrate"""
+    size = main_video['size']
+    slack = size * hls_remuxer.segment_seconds / duration
+    first = max(0, int(size * start / duration * 0.9 - slack))
+    last = min(size, int(size * end / duration * 1.1 + slack))
+    return first, last - first
+
+def _hls_ready_segments(torrent_id: str, main_video: Dict, info: Dict):
+    """Number of leading segments whose bytes are on disk, and whether all are"""
+    size = main_video['size']
+    available = torrent_manager.available_length(torrent_id, main_video['index'], 0, size)
+    if available >= size:
+        return hls_remuxer.segment_count(info), True
+    
+    ready = 0
+    for index in range(hls_remuxer.segment_count(info)):
+        start, length = hls_remuxer.segment_bounds(info, index)
+        offset, span = _hls_byte_span(main_video, start, start + length, info['duration'])
+        if offset + span > available:
+            break
+        ready += 1
+    return ready, False
+
+def _wait_for_hls_segment(session_id: str, torrent_id: str, main_video: Dict,
+                          index: int, info: Dict) -> bool:
+    """Move the readahead to a segment and wait for the bytes under it"""
+    start, length = hls_remuxer.segment_bounds(info, index)
+    offset, span = _hls_byte_span(main_video, start, start + length, info['duration'])
+    run_blocking(torrent_manager.update_playhead, torrent_id, f'{session_id}:hls',
+                 main_video['index'], offset)
+    return _wait_for_range(torrent_id, main_video['index'], offset, span)
+
+def _poster_url(movie_id: int) -> Optional[str]:
+    """Largest upstream cover of a movie, from the catalog when it is known"""
+    movie = catalog_index.get(movie_id) if catalog_index else None
+    if not movie:
+        movie = scraper.get_movie_details(movie_id)
+    if not movie:
+        return None
+    return movie.get('large_cover_image') or movie.get('medium_cover_image')
+
+def _estimate_keyframe(session: WebSession, main_video: Dict, seconds: float) -> Optional[Dict]:
+    """Byte offset of a playback time assuming a constant bitrate over the runtime"""
+    runtime = (session.current_movie or {}).get('runtime')
+    if not runtime:
+        return None
+    duration = runtime * 60
+    offset = int(main_video['size'] * min(max(seconds, 0.0) / duration, 1.0))
+    return {'time': seconds, 'offset': min(offset, main_video['size'] - 1),
+            'duration': duration, 'estimated': True}
+
+def _fields_key() -> str:
+    """The fields= projection of a request, normalized for ETags"""
+    return ','.join(parse_fields(request.args.get('fields')) or ())
+
+def _parse_batch_ids() -> Optional[List[int]]:
+    """Movie ids of a batch request, or None if missing, malformed or too many"""
+    try:
+        movie_ids = [int(part) for part in request.args.get('ids', '').split(',') if part.strip()]
+    except ValueError:
+        return None
+    if not movie_ids or len(movie_ids) > MAX_BATCH_IDS:
+        return None
+    return movie_ids
+
+def _torrent_summary(torrent: Dict) -> Dict:
+    """The fields of a torrent the frontend needs"""
+    return {
+        'url': torrent.get('url'),
+        'quality': torrent.get('quality'),
+        'size': torrent.get('size'),
+        'seeds': torrent.get('seeds', 0),
+        'peers': torrent.get('peers', 0)
+    }
+
+def _client_throughput() -> Optional[float]:
+    """
+    Ceiling on the rate this server can download at (bytes/s), or None if
+    unknown. Measured rates are held back by the swarms as much as by the
+    link, so they are only used while recent: they raise a configured
+    capacity, and without one they stand in for it but never below
+    THROUGHPUT_ESTIMATE_FLOOR.
+    """
     if not torrent_manager:
-        return
+        return None
+    stats = torrent_manager.get_bandwidth_stats()
+    capacity = stats.get('download_capacity') or 0
+    age = stats.get('estimate_age')
+    if age is None or age > THROUGHPUT_ESTIMATE_MAX_AGE or not stats.get('estimated_capacity'):
+        return capacity or None
+    if capacity:
+        return max(capacity, stats['estimated_capacity'])
+    return max(THROUGHPUT_ESTIMATE_FLOOR, stats['estimated_capacity'])
+
+def _watch_for_video_files(session_id: str, torrent_id: str):
+    """Notify the session once the head and index pieces of its video are on disk"""
+    def on_ready(tid: str, file_index: int):
+        session = _get_session(session_id)
+        if not session or session.current_torrent_id != torrent_id:
+            return
         
-    session = active_sessions.get(session_id)
-    if not session:
-        return
+        _update_session(session_id, status="ready_to_play")
+        
+        # Notify clients that video is ready
+        ready = {
+            'session_id': session_id,
+            'video_path': f'/api/video/{session_id}',
+            'movie': session.current_movie
+        }
+        main_video = _get_main_video(torrent_id)
+        if hls_remuxer and main_video and hls_remuxer.needs_remux(main_video['path']):
+            ready['hls_path'] = f'/api/hls/{session_id}/index.m3u8'
+        socketio.emit('video_ready', ready, to=_session_room(session_id))
     
-    while session.current_torrent_id == torrent_id:
-        try:
-            # Get video files
-            video_files = torrent_manager.get_video_files(torrent_id)
-            
-            if video_files:
-                # Find the largest video file
-                main_video = max(video_files, key=lambda x: x['size'])
-                
-                # Check if file is available locally
-                if main_video['local_path'] and os.path.exists(main_video['local_path']):
-                    session.status = "ready_to_play"
-                    
-                    # Notify clients that video is ready
-                    socketio.emit('video_ready', {
-                        'session_id': session_id,
-                        'video_path': f'/api/video/{session_id}',
-                        'movie': session.current_movie
-                    })
-                    break
-            
-            time.sleep(2)
-            
-        except Exception as e:
-            logger.error(f"Error monitoring torrent: {e}")
-            break
+    def on_event(tid: str, event: str, torrent_info: Dict):
+        session = _get_session(session_id)
+        if not session or session.current_torrent_id != torrent_id:
+            torrent_manager.remove_listener(torrent_id, on_event)
+            return
+        
+        if event != 'metadata':
+            return
+        
+        # Find the largest video file and fetch what the player needs first
+        main_video = _get_main_video(torrent_id)
+        if main_video:
+            torrent_manager.remove_listener(torrent_id, on_event)
+            torrent_manager.prepare_playback(torrent_id, main_video['index'], on_ready)
+    
+    run_blocking(torrent_manager.add_listener, torrent_id, on_event)
+
+@app.after_request
+def add_cache_headers(response):
+    """Cache-Control, ETag/304 and compression for buffered API responses"""
+    # Routes built from cached values set g.etag so the body is not hashed
+    return finalize(response, request, ROUTE_CACHE_CONTROL.get(request.endpoint), g.get('etag'))
 
 @app.errorhandler(404)
 def not_found(error):
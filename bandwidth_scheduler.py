@@ -0,0 +1,191 @@
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Torrent classes, most urgent first
+BUFFERING = 'buffering'
+PLAYING = 'playing'
+PREFETCHING = 'prefetching'
+IDLE = 'idle'
+
+CLASSES = (BUFFERING, PLAYING, PREFETCHING, IDLE)
+
+
+class Demand:
+    """
+    What one torrent needs from the next plan: its class, the bitrate of
+    the video being played, the download rate it achieved last interval and
+    any fixed caps (0 = none)
+    """
+
+    __slots__ = ('torrent_id', 'klass', 'bitrate', 'download_rate', 'upload_cap', 'download_cap')
+
+    def __init__(self, torrent_id: str, klass: str, bitrate: float = 0.0,
+                 download_rate: float = 0.0, upload_cap: int = 0, download_cap: int = 0):
+        self.torrent_id = torrent_id
+        self.klass = klass
+        self.bitrate = bitrate
+        self.download_rate = download_rate
+        self.upload_cap = upload_cap
+        self.download_cap = download_cap
+
+
+class Allocation:
+    """
+    Per-torrent limits for libtorrent; 0 means unlimited, as in libtorrent
+    """
+
+    __slots__ = ('download_limit', 'upload_limit', 'max_connections')
+
+    def __init__(self, download_limit: int, upload_limit: int, max_connections: int):
+        self.download_limit = download_limit
+        self.upload_limit = upload_limit
+        self.max_connections = max_connections
+
+    def as_tuple(self):
+        return self.download_limit, self.upload_limit, self.max_connections
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            'download_limit': self.download_limit,
+            'upload_limit': self.upload_limit,
+            'max_connections': self.max_connections
+        }
+
+
+class BandwidthScheduler:
+    """
+    Splits download bandwidth, upload bandwidth and connections between
+    torrents. Buffering and playing torrents are first given enough to stay
+    ahead of their bitrate, then what is left is shared by weight so a
+    background download can never starve a stream. Without a configured
+    download capacity it is estimated from the best aggregate rate seen
+    while downloading, and streams are left unlimited while prefetching gets
+    the spare capacity. Observed rates are limited by the swarms as much as
+    by the link, so the estimate is only ever a lower bound.
+    """
+
+    # Share of leftover bandwidth and connections per class
+    WEIGHTS = {BUFFERING: 4, PLAYING: 4, PREFETCHING: 1, IDLE: 0}
+    # How far ahead of its bitrate a stream is kept
+    HEADROOM = {BUFFERING: 2.0, PLAYING: 1.25}
+    # Floors so a limited torrent can still make some progress
+    MIN_DOWNLOAD = 64 * 1024
+    MIN_CONNECTIONS = 8
+    # Plan intervals with a downloading torrent the estimate is taken over
+    ESTIMATE_SAMPLES = 120
+
+    def __init__(self, download_capacity: int = 0, upload_capacity: int = 0,
+                 connections: int = 200, default_bitrate: float = 625 * 1024):
+        self.download_capacity = download_capacity
+        self.upload_capacity = upload_capacity
+        self.connections = connections
+        self.default_bitrate = default_bitrate
+        self.logger = logging.getLogger(__name__)
+        self._samples = deque(maxlen=self.ESTIMATE_SAMPLES)
+        self._estimated_at: Optional[float] = None
+
+    def observe(self, total_download_rate: float, active: bool = True):
+        """
+        Record the aggregate download rate of one plan interval. Intervals
+        with nothing to download say nothing about the link and are skipped,
+        so idle time neither lowers the estimate nor ages it out of the
+        sample window; a network that got slower shows up once the window
+        has rolled over with active intervals.
+        """
+        if not active:
+            return
+        self._samples.append(total_download_rate)
+        self._estimated_at = time.monotonic()
+
+    @property
+    def estimated_capacity(self) -> float:
+        return max(self._samples, default=0.0)
+
+    @property
+    def estimate_age(self) -> Optional[float]:
+        """Seconds since the estimate last saw a downloading interval"""
+        if self._estimated_at is None:
+            return None
+        return time.monotonic() - self._estimated_at
+
+    @property
+    def capacity(self) -> float:
+        return self.download_capacity or self.estimated_capacity
+
+    def plan(self, demands: Dict[str, Demand]) -> Dict[str, Allocation]:
+        if not demands:
+            return {}
+
+        download = self._plan_download(demands)
+        upload = self._plan_upload(demands)
+        connections = self._plan_connections(demands)
+        return {
+            torrent_id: Allocation(download[torrent_id], upload[torrent_id], connections[torrent_id])
+            for torrent_id in demands
+        }
+
+    def _plan_download(self, demands: Dict[str, Demand]) -> Dict[str, int]:
+        limits = self._share_download(demands)
+        for tid, demand in demands.items():
+            caps = [c for c in (limits[tid], demand.download_cap) if c]
+            limits[tid] = min(caps) if caps else 0
+        return limits
+
+    def _share_download(self, demands: Dict[str, Demand]) -> Dict[str, int]:
+        active = {tid: d for tid, d in demands.items() if d.klass != IDLE}
+        limits = {tid: 0 for tid in demands}
+        if len(active) <= 1 or not self.capacity:
+            return limits
+
+        # Streams first: enough to stay ahead of their bitrate, most urgent first
+        remaining = float(self.capacity)
+        shares = {tid: 0.0 for tid in active}
+        for klass in (BUFFERING, PLAYING):
+            for tid, demand in active.items():
+                if demand.klass != klass:
+                    continue
+                need = (demand.bitrate or self.default_bitrate) * self.HEADROOM[klass]
+                shares[tid] = min(need, remaining)
+                remaining -= shares[tid]
+
+        # Then the rest by weight
+        total_weight = sum(self.WEIGHTS[d.klass] for d in active.values())
+        for tid, demand in active.items():
+            shares[tid] += remaining * self.WEIGHTS[demand.klass] / total_weight
+
+        streaming = any(d.klass in (BUFFERING, PLAYING) for d in active.values())
+        for tid, demand in active.items():
+            if not self.download_capacity and demand.klass in (BUFFERING, PLAYING):
+                # The capacity is only an estimate; never cap a stream by it
+                continue
+            if demand.klass == PREFETCHING and not streaming and not self.download_capacity:
+                continue
+            limits[tid] = max(self.MIN_DOWNLOAD, int(shares[tid]))
+        return limits
+
+    def _plan_upload(self, demands: Dict[str, Demand]) -> Dict[str, int]:
+        limits = {}
+        share = self.upload_capacity // len(demands) if self.upload_capacity else 0
+        for tid, demand in demands.items():
+            caps = [c for c in (share, demand.upload_cap) if c]
+            limits[tid] = min(caps) if caps else 0
+        return limits
+
+    def _plan_connections(self, demands: Dict[str, Demand]) -> Dict[str, int]:
+        weights = {tid: max(1, self.WEIGHTS[d.klass]) for tid, d in demands.items()}
+        total_weight = sum(weights.values())
+        return {
+            tid: max(self.MIN_CONNECTIONS, self.connections * weight // total_weight)
+            for tid, weight in weights.items()
+        }
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            'download_capacity': self.download_capacity or None,
+            'estimated_capacity': round(self.estimated_capacity),
+            'estimate_age': self.estimate_age,
+            'upload_capacity': self.upload_capacity or None,
+            'connections': self.connections
+        }
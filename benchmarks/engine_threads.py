@@ -0,0 +1,123 @@
+"""
+Thread count and CPU use of the torrent engine at 1, 10 and 100 torrents.
+
+Compares the single alert-driven engine loop of TorrentManager with the
+polling model it replaced: one thread per torrent calling handle.status()
+every second, plus one per play polling for video files every 2 s. Each
+model runs in its own subprocess with idle magnet torrents (made-up
+info-hashes, so nothing is downloaded) and is measured over a fixed window
+after a warm-up.
+
+    python benchmarks/engine_threads.py [--counts 1 10 100] [--seconds 10]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _magnet(index: int) -> tuple:
+    info_hash = f'{index + 1:040x}'
+    return f'magnet:?xt=urn:btih:{info_hash}', info_hash
+
+
+def _native_threads() -> int:
+    # Counts libtorrent's own threads too, which threading.active_count misses
+    return len(os.listdir('/proc/self/task'))
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _measure(seconds: float) -> dict:
+    time.sleep(2)
+    threads = _native_threads()
+    started_cpu, started = _cpu_seconds(), time.monotonic()
+    time.sleep(seconds)
+    elapsed = time.monotonic() - started
+    return {
+        'threads': threads,
+        'cpu_percent': round(100 * (_cpu_seconds() - started_cpu) / elapsed, 2)
+    }
+
+
+def run_engine(count: int, seconds: float) -> dict:
+    from torrent_manager import TorrentManager
+
+    manager = TorrentManager(download_dir=tempfile.mkdtemp(prefix='bench_engine_'))
+    for index in range(count):
+        url, info_hash = _magnet(index)
+        torrent_id = manager.add_torrent(url, lambda tid, info: None, info_hash=info_hash)
+        manager.add_listener(torrent_id, lambda tid, event, info: None)
+    result = _measure(seconds)
+    manager.cleanup(delete_files=True)
+    return result
+
+
+def run_polling(count: int, seconds: float) -> dict:
+    import libtorrent as lt
+
+    session = lt.session()
+    download_dir = tempfile.mkdtemp(prefix='bench_polling_')
+    stop = threading.Event()
+
+    def monitor_torrent(handle):
+        while not stop.is_set():
+            handle.status()
+            time.sleep(1)
+
+    def monitor_for_video_files(handle):
+        while not stop.is_set():
+            torrent_file = handle.torrent_file()
+            if torrent_file:
+                [torrent_file.file_at(i).path for i in range(torrent_file.num_files())]
+            time.sleep(2)
+
+    for index in range(count):
+        url, _ = _magnet(index)
+        handle = session.add_torrent({'url': url, 'save_path': download_dir})
+        for target in (monitor_torrent, monitor_for_video_files):
+            threading.Thread(target=target, args=(handle,), daemon=True).start()
+
+    result = _measure(seconds)
+    stop.set()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--model', choices=('engine', 'polling'))
+    parser.add_argument('--count', type=int)
+    args = parser.parse_args()
+
+    if args.model:
+        run = run_engine if args.model == 'engine' else run_polling
+        print(json.dumps(run(args.count, args.seconds)))
+        return
+
+    print(f"{'torrents':>8}  {'model':<8}  {'threads':>7}  {'cpu %':>6}")
+    for count in args.counts:
+        for model in ('polling', 'engine'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--model', model, '--count', str(count),
+                 '--seconds', str(args.seconds)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{count:>8}  {model:<8}  {result['threads']:>7}  {result['cpu_percent']:>6}")
+
+
+if __name__ == '__main__':
+    main()
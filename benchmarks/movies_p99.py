@@ -0,0 +1,211 @@
+"""
+/api/movies latency while the upstream is slow: YTS answers after a delay
+and every stream is stuck waiting for pieces that never arrive.
+
+The app runs under gunicorn's eventlet worker with a stand-in YTS and a
+stand-in torrent engine whose piece waits block a native thread, like
+TorrentManager.wait_for_range. /api/movies is measured once idle and once
+while detail lookups hit the slowed upstream and streams wait on pieces,
+with piece waits done cooperatively (the app) and on the offload pool (as
+before, for comparison). A flat p99 means neither the hub nor the pool is
+starved.
+
+    python benchmarks/movies_p99.py [--streams 40] [--lookups 8] [--delay 1.0]
+"""
+import argparse
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+_web = None
+
+
+class SlowPieces:
+    """Engine stand-in: one video whose pieces never arrive"""
+
+    def __init__(self, path: str):
+        from eventlet import patcher
+        self.path = path
+        self._sleep = patcher.original('time').sleep
+
+    def get_video_files(self, torrent_id):
+        return [{'index': 0, 'path': 'movie.mp4', 'size': os.path.getsize(self.path)}]
+
+    def get_file_location(self, torrent_id, file_index):
+        return self.path
+
+    def get_torrent_status(self, torrent_id):
+        return True
+
+    def available_length(self, torrent_id, file_index, offset, length):
+        return 0
+
+    def have_range(self, torrent_id, file_index, offset, length):
+        return False
+
+    def wait_for_range(self, torrent_id, file_index, offset, length, timeout=60.0):
+        self._sleep(timeout)
+        return False
+
+    def update_playhead(self, torrent_id, reader_id, file_index, offset):
+        return True
+
+    def remove_reader(self, torrent_id, reader_id):
+        pass
+
+
+def app(environ, start_response):
+    """WSGI entry for the gunicorn under test: the real app on stand-ins"""
+    global _web
+    if _web is None:
+        sys.modules['libtorrent'] = None  # no in-process engine; SlowPieces stands in
+        import app as web
+        from offload import run_blocking
+
+        web.scraper.base_url = os.environ['BENCH_YTS']
+        web.torrent_manager = SlowPieces(os.environ['BENCH_FILE'])
+        web.LIBTORRENT_AVAILABLE = True
+        web.session_store.update_session('bench', current_torrent_id='slow')
+        if os.environ.get('BENCH_POOL_WAITS'):
+            web._wait_for_range = lambda *args: run_blocking(web.torrent_manager.wait_for_range, *args)
+        _web = web.app
+    return _web(environ, start_response)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(port: int, path: str, timeout: float = 120) -> float:
+    started = time.monotonic()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    conn.request('GET', path)
+    conn.getresponse().read()
+    conn.close()
+    return time.monotonic() - started
+
+
+def _measure(port: int, requests: int) -> dict:
+    latencies = sorted(_get(port, '/api/movies') for _ in range(requests))
+    return {
+        'p50_ms': 1000 * latencies[len(latencies) // 2],
+        'p99_ms': 1000 * latencies[int(len(latencies) * 0.99) - 1],
+        'max_ms': 1000 * latencies[-1]
+    }
+
+
+def _stream(port: int, stop: threading.Event):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request('GET', '/api/video/bench')
+        conn.sock.settimeout(0.5)
+        while not stop.is_set():
+            try:
+                conn.getresponse()
+                break
+            except socket.timeout:
+                continue
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def _lookups(port: int, first_id: int, stop: threading.Event):
+    movie_id = first_id
+    while not stop.is_set():
+        try:
+            _get(port, f'/api/movie/{movie_id}')
+        except OSError:
+            pass
+        movie_id += 1000
+
+
+def run(yts, video_path: str, args, pool_waits: bool) -> dict:
+    port = _free_port()
+    env = {**os.environ, 'BENCH_YTS': yts.url, 'BENCH_FILE': video_path, 'PYTHONPATH': ROOT,
+           'CATALOG_SYNC': '0', 'HLS_REMUX': '0', 'WARMUP_PREFETCH': '0'}
+    env.pop('TORRENT_ENGINE_SOCKET', None)
+    if pool_waits:
+        env['BENCH_POOL_WAITS'] = '1'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--chdir', os.path.join(ROOT, 'benchmarks'),
+         '--worker-class', 'eventlet', '--workers', '1', '--worker-connections', '1000',
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'movies_p99:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    stop = threading.Event()
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                _get(port, '/api/movies', timeout=5)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+        yts.delay = 0.0
+        idle = _measure(port, args.requests)
+
+        yts.delay = args.delay
+        load = [threading.Thread(target=_stream, args=(port, stop), daemon=True)
+                for _ in range(args.streams)]
+        load += [threading.Thread(target=_lookups, args=(port, 100_000 + i, stop), daemon=True)
+                 for i in range(args.lookups)]
+        for thread in load:
+            thread.start()
+        time.sleep(2)
+        slowed = _measure(port, args.requests)
+    finally:
+        stop.set()
+        yts.delay = 0.0
+        server.terminate()
+        server.wait()
+    return {'idle': idle, 'slowed': slowed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=40)
+    parser.add_argument('--lookups', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=1.0)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    from conftest import StandInYTS, make_movie
+
+    yts = StandInYTS()
+    yts.movies = [make_movie(i) for i in range(1, 41)]
+    try:
+        with tempfile.NamedTemporaryFile(prefix='bench_movies_', suffix='.mp4') as video:
+            video.write(os.urandom(1024 * 1024))
+            video.flush()
+
+            print(f"{args.streams} stalled streams, {args.lookups} lookups, "
+                  f"upstream delay {args.delay:.1f} s")
+            print(f"{'piece waits':<12}  {'phase':<7}  {'p50 ms':>7}  {'p99 ms':>7}  {'max ms':>7}")
+            for label, pool_waits in (('pool', True), ('cooperative', False)):
+                result = run(yts, video.name, args, pool_waits)
+                for phase in ('idle', 'slowed'):
+                    r = result[phase]
+                    print(f"{label:<12}  {phase:<7}  {r['p50_ms']:>7.1f}  "
+                          f"{r['p99_ms']:>7.1f}  {r['max_ms']:>7.1f}")
+    finally:
+        yts.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Progress fan-out to many Socket.IO clients, coalesced per torrent room versus
+one full snapshot per viewer callback.
+
+500 clients (by default) each follow their own session, and the sessions
+share a smaller number of torrents. Every simulated second each torrent's
+engine callback fires a few times per viewer with a changed download rate,
+as TorrentManager does. The "direct" model emits the full snapshot to the
+viewer's session room on every callback, like the app did before
+ProgressFanout; the "fanout" model publishes to the torrent room and flushes
+once per tick. Clients are in-process Socket.IO test clients, so the real
+room machinery and packet encoding are exercised without a network.
+
+Reported per simulated second: messages and bytes delivered to clients
+(the Socket.IO packet text), and the server's wall time to produce them.
+
+    python benchmarks/progress_fanout.py [--clients 500] [--torrents 50] [--updates 4] [--seconds 10]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _load_app():
+    os.environ.update({'CATALOG_SYNC': '0', 'HLS_REMUX': '0', 'WARMUP_PREFETCH': '0'})
+    os.environ.pop('TORRENT_ENGINE_SOCKET', None)
+    sys.modules['libtorrent'] = None  # no in-process engine
+    import app as web
+
+    # Flushes are driven by the benchmark, not the background task
+    web._fanout_started = True
+    return web
+
+
+def _packet_bytes(event: dict) -> int:
+    # Socket.IO EVENT packet as sent over the transport: 42["name",args...]
+    return len('42' + json.dumps([event['name'], *event['args']], separators=(',', ':')))
+
+
+def _drain(clients) -> tuple:
+    messages = sent = 0
+    for client in clients:
+        for event in client.get_received():
+            if event['name'] == 'torrent_progress':
+                messages += 1
+                sent += _packet_bytes(event)
+    return messages, sent
+
+
+def run(web, model: str, args) -> dict:
+    fanout = web.progress_fanout
+    viewers = {}
+    clients = []
+    for index in range(args.clients):
+        session_id = f'bench-{model}-{index}'
+        torrent_id = f'{index % args.torrents:040x}'
+        web.session_store.update_session(session_id, current_torrent_id=torrent_id, status='downloading')
+        client = web.socketio.test_client(web.app)
+        client.emit('join_session', {'session_id': session_id})
+        clients.append(client)
+        viewers.setdefault(torrent_id, []).append(session_id)
+    _drain(clients)
+
+    messages = sent = 0
+    busy = 0.0
+    for second in range(int(args.seconds)):
+        started = time.perf_counter()
+        for update in range(args.updates):
+            for torrent_number, (torrent_id, sessions) in enumerate(viewers.items()):
+                info = {'progress': second + update / args.updates, 'status': 'downloading',
+                        'download_rate': (1 + torrent_number) * 1024 * 1024 + update * 4096,
+                        'peers': 20 + update}
+                for session_id in sessions:
+                    if model == 'direct':
+                        web.socketio.emit('torrent_progress', {
+                            'session_id': session_id, 'torrent_id': torrent_id, **info
+                        }, to=web._session_room(session_id))
+                    else:
+                        web._on_torrent_progress(session_id, torrent_id, info)
+        if model == 'fanout':
+            fanout.flush(now=1e6 + second * fanout.interval)
+        busy += time.perf_counter() - started
+        delivered, delivered_bytes = _drain(clients)
+        messages += delivered
+        sent += delivered_bytes
+
+    for client in clients:
+        client.disconnect()
+    seconds = int(args.seconds)
+    return {
+        'msgs_per_s': messages / seconds,
+        'bytes_per_s': sent / seconds,
+        'server_ms_per_s': 1000 * busy / seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--torrents', type=int, default=50)
+    parser.add_argument('--updates', type=int, default=4, help='engine callbacks per viewer per second')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    web = _load_app()
+    print(f"{args.clients} clients on {args.torrents} torrents, "
+          f"{args.updates} callbacks per viewer per second")
+    print(f"{'model':<8}  {'msgs/s':>9}  {'bytes/s':>11}  {'server ms/s':>11}")
+    for model in ('direct', 'fanout'):
+        result = run(web, model, args)
+        print(f"{model:<8}  {result['msgs_per_s']:>9.0f}  {result['bytes_per_s']:>11.0f}  "
+              f"{result['server_ms_per_s']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
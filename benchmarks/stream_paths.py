@@ -0,0 +1,133 @@
+"""
+Throughput and server CPU of the two /api/video body paths at 50 concurrent
+streams from local files.
+
+"complete" is iter_complete_range handed to gunicorn's wsgi.file_wrapper
+(os.sendfile); "chunked" is iter_file_range with piece waits that always
+succeed, i.e. the per-chunk read-and-yield loop. Each path is served by its
+own gunicorn (one gthread worker, a thread per stream) and every stream
+downloads the whole file once; server CPU comes from the gunicorn process
+tree after it exits, so client work is not counted.
+
+    python benchmarks/stream_paths.py [--streams 50] [--size-mb 64]
+"""
+import argparse
+import http.client
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def app(environ, start_response):
+    """WSGI app for the gunicorn under test: /complete or /chunked"""
+    from streaming import iter_complete_range, iter_file_range
+
+    path = os.environ['BENCH_FILE']
+    size = os.path.getsize(path)
+    start_response('200 OK', [('Content-Type', 'video/mp4'), ('Content-Length', str(size))])
+    if environ['PATH_INFO'] == '/complete':
+        return iter_complete_range(environ, path, 0, size - 1)
+    return iter_file_range(path, 0, size - 1, lambda offset, length: True)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _download(port: int, path: str, results: list):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    received = 0
+    while True:
+        data = response.read(1024 * 1024)
+        if not data:
+            break
+        received += len(data)
+    conn.close()
+    results.append(received)
+
+
+def run(mode: str, file_path: str, streams: int) -> dict:
+    port = _free_port()
+    started_cpu = _children_cpu()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--chdir', os.path.join(ROOT, 'benchmarks'),
+         '--worker-class', 'gthread', '--workers', '1', '--threads', str(streams + 4),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'stream_paths:app'],
+        env={**os.environ, 'BENCH_FILE': file_path, 'PYTHONPATH': ROOT}
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        results = []
+        threads = [threading.Thread(target=_download, args=(port, f'/{mode}', results))
+                   for _ in range(streams)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    cpu = _children_cpu() - started_cpu
+    total = sum(results)
+    return {
+        'complete_streams': sum(1 for r in results if r == os.path.getsize(file_path)),
+        'mib_per_sec': total / elapsed / 1024 ** 2,
+        'per_stream_mib_per_sec': total / elapsed / 1024 ** 2 / streams,
+        'cpu_seconds_per_stream': cpu / streams,
+        'cpu_seconds_per_gib': cpu / (total / 1024 ** 3) if total else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=50)
+    parser.add_argument('--size-mb', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(prefix='bench_stream_', suffix='.mp4') as video:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            video.write(block)
+        video.flush()
+
+        print(f"{args.streams} streams x {args.size_mb} MiB")
+        print(f"{'path':<9}  {'ok':>3}  {'MiB/s':>8}  {'MiB/s/stream':>12}  "
+              f"{'cpu s/stream':>12}  {'cpu s/GiB':>9}")
+        for mode in ('chunked', 'complete'):
+            result = run(mode, video.name, args.streams)
+            print(f"{mode:<9}  {result['complete_streams']:>3}  {result['mib_per_sec']:>8.0f}  "
+                  f"{result['per_stream_mib_per_sec']:>12.1f}  "
+                  f"{result['cpu_seconds_per_stream']:>12.3f}  {result['cpu_seconds_per_gib']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
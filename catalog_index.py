@@ -0,0 +1,277 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+from offload import native_thread
+
+SORT_COLUMNS = {
+    'date_added': 'date_added DESC',
+    'rating': 'rating DESC',
+    'year': 'year DESC',
+    # Upstream orders every field descending, title included
+    'title': 'title COLLATE NOCASE DESC',
+    'runtime': 'runtime DESC'
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT,
+    year INTEGER,
+    rating REAL,
+    runtime INTEGER,
+    date_added INTEGER,
+    qualities TEXT,
+    genres TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_movies_rating ON movies(rating);
+CREATE INDEX IF NOT EXISTS idx_movies_year ON movies(year);
+CREATE INDEX IF NOT EXISTS idx_movies_date_added ON movies(date_added);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    title, summary, cast, genres, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class CatalogIndex:
+    """
+    Local SQLite copy of the YTS catalog with an FTS5 index over title,
+    summary, cast and genres, so search and listing never wait on upstream.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+
+    def upsert(self, movies: List[Dict]) -> int:
+        """
+        Insert or update processed movies, returning how many were new
+        """
+        added = 0
+        with self._lock, self._conn:
+            for movie in movies:
+                movie_id = movie.get('id')
+                if movie_id is None:
+                    continue
+
+                existing = self._conn.execute(
+                    'SELECT data FROM movies WHERE id = ?', (movie_id,)
+                ).fetchone()
+                if existing:
+                    # Keep details (e.g. cast) learned from an earlier fetch
+                    movie = {**json.loads(existing['data']), **{k: v for k, v in movie.items() if v}}
+                else:
+                    added += 1
+
+                genres = movie.get('genres') or []
+                cast = ' '.join(member.get('name', '') for member in movie.get('cast') or [])
+                qualities = ' '.join(t.get('quality', '') for t in movie.get('torrents') or [])
+
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO movies '
+                    '(id, title, year, rating, runtime, date_added, qualities, genres, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (movie_id, movie.get('title'), movie.get('year'), movie.get('rating'),
+                     movie.get('runtime'), movie.get('date_added'), f' {qualities} ',
+                     f" {' '.join(genres)} ", json.dumps(movie))
+                )
+                self._conn.execute('DELETE FROM movies_fts WHERE rowid = ?', (movie_id,))
+                self._conn.execute(
+                    'INSERT INTO movies_fts (rowid, title, summary, cast, genres) VALUES (?, ?, ?, ?, ?)',
+                    (movie_id, movie.get('title') or '', movie.get('summary') or '', cast, ' '.join(genres))
+                )
+        return added
+
+    @staticmethod
+    def can_sort(sort_by: str) -> bool:
+        """
+        Whether the local index can order by this field. Popularity sorts
+        (download_count, like_count, seeds, peers) change constantly and
+        are not stored, so they have to be answered upstream.
+        """
+        return sort_by in SORT_COLUMNS
+
+    def search(self, query: str = '', page: int = 1, limit: int = 20, quality: str = '',
+               genre: str = '', minimum_rating: float = 0, sort_by: str = 'date_added') -> List[Dict]:
+        """
+        Search, filter and sort the local catalog
+        """
+        clauses = []
+        args = []
+
+        match = self._match_expression(query)
+        if match:
+            clauses.append('m.id IN (SELECT rowid FROM movies_fts WHERE movies_fts MATCH ?)')
+            args.append(match)
+        if quality and quality != 'all':
+            clauses.append('m.qualities LIKE ?')
+            args.append(f'% {quality} %')
+        if genre and genre != 'all':
+            clauses.append('m.genres LIKE ?')
+            args.append(f'% {genre} %')
+        if minimum_rating:
+            clauses.append('m.rating >= ?')
+            args.append(minimum_rating)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order = SORT_COLUMNS.get(sort_by, SORT_COLUMNS['date_added'])
+        args.extend([limit, (max(page, 1) - 1) * limit])
+
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT m.data FROM movies m {where} ORDER BY m.{order}, m.id DESC LIMIT ? OFFSET ?',
+                args
+            ).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def get(self, movie_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM movies WHERE id = ?', (movie_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def known_ids(self, movie_ids: List[int]) -> set:
+        if not movie_ids:
+            return set()
+        placeholders = ','.join('?' * len(movie_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT id FROM movies WHERE id IN ({placeholders})', movie_ids
+            ).fetchall()
+        return {row['id'] for row in rows}
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM movies').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """
+        Turn free text into an FTS5 expression of quoted prefix terms, so
+        user input can never be parsed as FTS5 syntax
+        """
+        tokens = _TOKEN_RE.findall(query or '')
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class CatalogSyncer:
+    """
+    Background thread that pages through the upstream listing newest-first
+    and stores it in a CatalogIndex. The first run walks the whole catalog;
+    later runs re-store the first refresh_pages pages, so recent titles get
+    fresh seeds and torrents, and stop at the next page with nothing new.
+    Every full_refresh_interval seconds a run walks the whole catalog again
+    to refresh older titles.
+    """
+
+    def __init__(self, scraper, index: CatalogIndex, interval: float = 1800,
+                 page_size: int = 50, max_pages: int = 2000, page_delay: float = 0.5,
+                 refresh_pages: int = 2, full_refresh_interval: float = 86400):
+        self.scraper = scraper
+        self.index = index
+        self.interval = interval
+        self.refresh_pages = refresh_pages
+        self.full_refresh_interval = full_refresh_interval
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.page_delay = page_delay
+        self.logger = logging.getLogger(__name__)
+        self.last_sync = None
+        self.complete = index.get_state('complete') == '1'
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the local index is complete enough to answer queries. The
+        syncer may be running in another process, so this also checks the
+        index until it is complete.
+        """
+        if not self.complete:
+            self.complete = self.index.get_state('complete') == '1'
+        return self.complete
+
+    def start(self):
+        if self._thread is None:
+            self._thread = native_thread(self._run, name='catalog-sync')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sync_once(self) -> int:
+        """
+        Fetch new catalog entries, returning the number added
+        """
+        full_sync_at = float(self.index.get_state('full_sync_at') or 0)
+        incremental = self.complete and time.time() - full_sync_at < self.full_refresh_interval
+        added = 0
+
+        for page in range(1, self.max_pages + 1):
+            if self._stop.is_set():
+                break
+
+            # Raises on upstream errors, so a failed page never looks like
+            # the end of the catalog
+            movies, movie_count = self.scraper.fetch_movies_page(
+                page=page, limit=self.page_size, sort_by='date_added'
+            )
+
+            known = self.index.known_ids([m['id'] for m in movies if m.get('id') is not None])
+            added += self.index.upsert(movies)
+
+            if incremental and page >= self.refresh_pages and len(known) == len(movies):
+                break
+            if not movies or page * self.page_size >= movie_count:
+                self._mark_complete()
+                if not incremental:
+                    self.index.set_state('full_sync_at', str(time.time()))
+                break
+
+            self._stop.wait(self.page_delay)
+
+        self.last_sync = time.time()
+        self.logger.info(f"Catalog sync added {added} movies ({self.index.count()} total)")
+        return added
+
+    def _mark_complete(self):
+        if not self.complete:
+            self.complete = True
+            self.index.set_state('complete', '1')
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.logger.error(f"Catalog sync failed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,413 @@
+import bisect
+import struct
+import threading
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+# read(offset, length) -> bytes for the file being indexed
+Reader = Callable[[int, int], bytes]
+
+# Refuse to load index structures larger than this into memory
+MAX_INDEX_BYTES = 64 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class ContainerError(Exception):
+    """Raised when a file cannot be parsed as a supported container"""
+
+
+class ContainerIndex:
+    """
+    Keyframe table of a video file mapping playback time to byte offsets
+    """
+
+    def __init__(self, container: str, keyframes: List[Tuple[float, int]],
+                 duration: Optional[float] = None, index_range: Optional[Tuple[int, int]] = None):
+        self.container = container
+        self.keyframes = sorted(keyframes)
+        self.duration = duration
+        # (offset, length) of the index structure itself (moov or Cues)
+        self.index_range = index_range
+        self._times = [t for t, _ in self.keyframes]
+
+    def seek(self, seconds: float) -> Optional[Tuple[float, int]]:
+        """
+        The last keyframe at or before the given time, as (time, offset)
+        """
+        if not self.keyframes:
+            return None
+        position = bisect.bisect_right(self._times, max(0.0, seconds)) - 1
+        return self.keyframes[max(0, position)]
+
+    def to_dict(self) -> Dict:
+        return {
+            'container': self.container,
+            'duration': self.duration,
+            'keyframes': len(self.keyframes)
+        }
+
+
+def parse_container(read: Reader, size: int, name: str = '') -> ContainerIndex:
+    """
+    Build a ContainerIndex by reading only the header and index structures
+    """
+    head = read(0, min(size, 16))
+    if len(head) >= 8 and head[4:8] in (b'ftyp', b'moov', b'free', b'skip', b'wide', b'mdat'):
+        return parse_mp4(read, size)
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        return parse_matroska(read, size)
+    raise ContainerError(f'Unsupported container: {name or "unknown"}')
+
+
+# MP4 / ISO BMFF
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """
+    Yield (type, payload_start, payload_end) of boxes in an in-memory buffer
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header:
+            break
+        yield box_type, offset + header, min(offset + box_size, end)
+        offset += box_size
+
+
+def _find_box(data: bytes, path: List[bytes], start: int = 0, end: Optional[int] = None):
+    for box_type, payload_start, payload_end in _iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, payload_end
+            return _find_box(data, path[1:], payload_start, payload_end)
+    return None
+
+
+def _locate_moov(read: Reader, size: int) -> Tuple[int, int, int]:
+    """
+    Walk top-level box headers (skipping mdat) to find the moov box,
+    returning its offset, size and header length
+    """
+    offset = 0
+    while offset + 8 <= size:
+        header = read(offset, 16)
+        if len(header) < 8:
+            break
+        box_size, box_type = struct.unpack_from('>I4s', header)
+        header_length = 8
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', header, 8)[0]
+            header_length = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < header_length:
+            break
+        if box_type == b'moov':
+            return offset, box_size, header_length
+        offset += box_size
+    raise ContainerError('No moov box found')
+
+
+def parse_mp4(read: Reader, size: int) -> ContainerIndex:
+    moov_offset, moov_size, moov_header = _locate_moov(read, size)
+    if moov_size > MAX_INDEX_BYTES:
+        raise ContainerError(f'moov box too large ({moov_size} bytes)')
+
+    moov = read(moov_offset, moov_size)
+    duration = None
+
+    for box_type, trak_start, trak_end in _iter_boxes(moov, moov_header):
+        if box_type != b'trak':
+            continue
+
+        hdlr = _find_box(moov, [b'mdia', b'hdlr'], trak_start, trak_end)
+        if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+
+        mdhd = _find_box(moov, [b'mdia', b'mdhd'], trak_start, trak_end)
+        stbl = _find_box(moov, [b'mdia', b'minf', b'stbl'], trak_start, trak_end)
+        if not mdhd or not stbl:
+            continue
+
+        version = moov[mdhd[0]]
+        if version == 1:
+            timescale, track_duration = struct.unpack_from('>IQ', moov, mdhd[0] + 20)
+        else:
+            timescale, track_duration = struct.unpack_from('>II', moov, mdhd[0] + 12)
+        if timescale:
+            duration = track_duration / timescale
+
+        keyframes = _mp4_keyframes(moov, stbl, timescale or 1)
+        return ContainerIndex('mp4', keyframes, duration, (moov_offset, moov_size))
+
+    raise ContainerError('No video track found')
+
+
+def _read_table(data: bytes, box: Optional[Tuple[int, int]], fmt: str) -> List:
+    if not box:
+        return []
+    count = struct.unpack_from('>I', data, box[0] + 4)[0]
+    item = struct.calcsize('>' + fmt)
+    return [struct.unpack_from('>' + fmt, data, box[0] + 8 + i * item) for i in range(count)]
+
+
+def _mp4_keyframes(moov: bytes, stbl: Tuple[int, int], timescale: int) -> List[Tuple[float, int]]:
+    start, end = stbl
+    stts = _read_table(moov, _find_box(moov, [b'stts'], start, end), 'II')
+    stsc = _read_table(moov, _find_box(moov, [b'stsc'], start, end), 'III')
+    stss_box = _find_box(moov, [b'stss'], start, end)
+    stco_box = _find_box(moov, [b'stco'], start, end)
+    co64_box = _find_box(moov, [b'co64'], start, end)
+    stsz_box = _find_box(moov, [b'stsz'], start, end)
+
+    if not stsz_box or not (stco_box or co64_box) or not stsc:
+        raise ContainerError('Incomplete sample table')
+
+    chunk_offsets = [o for (o,) in (_read_table(moov, stco_box, 'I') if stco_box
+                                    else _read_table(moov, co64_box, 'Q'))]
+
+    uniform_size, sample_count = struct.unpack_from('>II', moov, stsz_box[0] + 4)
+    if uniform_size:
+        sample_sizes = None
+    else:
+        sample_sizes = struct.unpack_from(f'>{sample_count}I', moov, stsz_box[0] + 12)
+
+    # Samples are numbered from 1; without stss every sample is a sync sample
+    sync = [s for (s,) in _read_table(moov, stss_box, 'I')] if stss_box else None
+    wanted = set(sync) if sync is not None else None
+
+    # Decode time of each sync sample from the time-to-sample table
+    times = {}
+    sample = 1
+    elapsed = 0
+    for count, delta in stts:
+        if wanted is None:
+            for i in range(count):
+                times[sample + i] = elapsed + i * delta
+        else:
+            for s in range(sample, sample + count):
+                if s in wanted:
+                    times[s] = elapsed + (s - sample) * delta
+        sample += count
+        elapsed += count * delta
+
+    # Byte offset of each sync sample from the chunk tables
+    keyframes = []
+    sample = 1
+    for entry, (first_chunk, per_chunk, _) in enumerate(stsc):
+        last_chunk = stsc[entry + 1][0] - 1 if entry + 1 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for s in range(sample, sample + per_chunk):
+                if s in times:
+                    keyframes.append((times[s] / timescale, offset))
+                offset += uniform_size or sample_sizes[s - 1]
+            sample += per_chunk
+
+    return keyframes
+
+
+# Matroska / WebM (EBML)
+
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_CUES = 0x1C53BB6B
+_CUE_POINT = 0xBB
+_CUE_TIME = 0xB3
+_CUE_TRACK_POSITIONS = 0xB7
+_CUE_CLUSTER_POSITION = 0xF1
+_CLUSTER = 0x1F43B675
+
+
+def _read_vint(data: bytes, offset: int, keep_marker: bool) -> Tuple[Optional[int], int]:
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ContainerError('Invalid EBML variable-length integer')
+
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+
+    # An all-ones size means "unknown"
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, length
+
+
+def _read_element_header(data: bytes, offset: int) -> Tuple[int, Optional[int], int]:
+    element_id, id_length = _read_vint(data, offset, keep_marker=True)
+    element_size, size_length = _read_vint(data, offset + id_length, keep_marker=False)
+    return element_id, element_size, id_length + size_length
+
+
+def _iter_elements(data: bytes, start: int, end: int):
+    offset = start
+    while offset < end:
+        element_id, element_size, header = _read_element_header(data, offset)
+        payload = offset + header
+        payload_end = end if element_size is None else min(payload + element_size, end)
+        yield element_id, payload, payload_end
+        offset = payload_end
+
+
+def _uint(data: bytes, start: int, end: int) -> int:
+    return int.from_bytes(data[start:end], 'big')
+
+
+def _float(data: bytes, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack('>f', data[start:end])[0]
+    return struct.unpack('>d', data[start:end])[0]
+
+
+def _read_element(read: Reader, offset: int, limit: int = MAX_INDEX_BYTES) -> Tuple[int, bytes, int]:
+    """
+    Read one element at a file offset, returning (id, payload, payload offset)
+    """
+    header = read(offset, 12)
+    element_id, element_size, header_length = _read_element_header(header, 0)
+    if element_size is None or element_size > limit:
+        raise ContainerError(f'Element 0x{element_id:X} too large to index')
+    return element_id, read(offset + header_length, element_size), offset + header_length
+
+
+def parse_matroska(read: Reader, size: int) -> ContainerIndex:
+    # Skip the EBML header to find the Segment
+    _, ebml_size, ebml_header = _read_element_header(read(0, 12), 0)
+    segment_offset = ebml_header + ebml_size
+    segment_id, _, segment_header = _read_element_header(read(segment_offset, 12), 0)
+    if segment_id != _SEGMENT:
+        raise ContainerError('No Matroska segment found')
+    segment_start = segment_offset + segment_header
+
+    # The SeekHead (normally first in the segment) says where Info and Cues
+    # are; Info itself usually follows it within the first few kilobytes
+    positions = {}
+    info = None
+    probe = read(segment_start, min(64 * 1024, size - segment_start))
+    for element_id, start, end in _iter_elements(probe, 0, len(probe)):
+        if element_id == _SEEK_HEAD:
+            for seek_id, seek_start, seek_end in _iter_elements(probe, start, end):
+                if seek_id != _SEEK:
+                    continue
+                target = position = None
+                for child_id, child_start, child_end in _iter_elements(probe, seek_start, seek_end):
+                    if child_id == _SEEK_ID:
+                        target = _uint(probe, child_start, child_end)
+                    elif child_id == _SEEK_POSITION:
+                        position = _uint(probe, child_start, child_end)
+                if target is not None and position is not None:
+                    positions.setdefault(target, segment_start + position)
+        elif element_id == _INFO and end < len(probe):
+            info = probe[start:end]
+        if element_id == _CLUSTER or end >= len(probe):
+            break
+
+    if info is None:
+        info = _read_element(read, positions[_INFO])[1] if _INFO in positions else b''
+
+    timecode_scale = 1000000
+    duration = None
+    for element_id, start, end in _iter_elements(info, 0, len(info)):
+        if element_id == _TIMECODE_SCALE:
+            timecode_scale = _uint(info, start, end)
+        elif element_id == _DURATION:
+            duration = _float(info, start, end)
+    if duration is not None:
+        duration = duration * timecode_scale / 1e9
+
+    cues_offset = positions.get(_CUES)
+    if cues_offset is None:
+        raise ContainerError('Matroska file has no Cues in its SeekHead')
+
+    cues_id, cues, cues_payload = _read_element(read, cues_offset)
+    if cues_id != _CUES:
+        raise ContainerError('SeekHead does not point at Cues')
+
+    keyframes = []
+    for point_id, point_start, point_end in _iter_elements(cues, 0, len(cues)):
+        if point_id != _CUE_POINT:
+            continue
+        cue_time = cluster = None
+        for child_id, child_start, child_end in _iter_elements(cues, point_start, point_end):
+            if child_id == _CUE_TIME:
+                cue_time = _uint(cues, child_start, child_end)
+            elif child_id == _CUE_TRACK_POSITIONS and cluster is None:
+                for pos_id, pos_start, pos_end in _iter_elements(cues, child_start, child_end):
+                    if pos_id == _CUE_CLUSTER_POSITION:
+                        cluster = _uint(cues, pos_start, pos_end)
+        if cue_time is not None and cluster is not None:
+            keyframes.append((cue_time * timecode_scale / 1e9, segment_start + cluster))
+
+    index_range = (cues_offset, cues_payload - cues_offset + len(cues))
+    return ContainerIndex('matroska', keyframes, duration, index_range)
+
+
+class ContainerIndexCache:
+    """
+    Parsed indexes keyed by (info_hash, file_index), built at most once
+    """
+
+    def __init__(self):
+        self._indexes: Dict[Tuple[str, int], Optional[ContainerIndex]] = {}
+        self._lock = threading.Lock()
+        self._building: Dict[Tuple[str, int], threading.Event] = {}
+
+    def get(self, info_hash: str, file_index: int) -> Optional[ContainerIndex]:
+        with self._lock:
+            return self._indexes.get((info_hash, file_index))
+
+    def get_or_build(self, info_hash: str, file_index: int, read: Reader,
+                     size: int, name: str = '') -> Optional[ContainerIndex]:
+        key = (info_hash, file_index)
+        with self._lock:
+            if key in self._indexes:
+                return self._indexes[key]
+            event = self._building.get(key)
+            builder = event is None
+            if builder:
+                event = self._building[key] = threading.Event()
+
+        if not builder:
+            event.wait()
+            return self.get(info_hash, file_index)
+
+        index = None
+        try:
+            index = parse_container(read, size, name)
+            logger.info(f"Indexed {name or info_hash}: {len(index.keyframes)} keyframes")
+        except (ContainerError, struct.error, IndexError, ValueError, TimeoutError) as e:
+            logger.warning(f"Could not index {name or info_hash}: {e}")
+        finally:
+            with self._lock:
+                # Failures are not cached so a later attempt can retry once
+                # more of the file has arrived
+                if index is not None:
+                    self._indexes[key] = index
+                del self._building[key]
+            event.set()
+        return index
+
+    def forget(self, info_hash: str):
+        with self._lock:
+            for key in [k for k in self._indexes if k[0] == info_hash]:
+                del self._indexes[key]
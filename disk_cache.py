@@ -0,0 +1,208 @@
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List
+
+
+class DiskCache:
+    """
+    Tracks torrents stored under a persistent download directory and keeps
+    them within a byte budget. Torrents are evicted least-recently-watched
+    first; pinned torrents (currently streaming) are never evicted. The index
+    is saved alongside the data so cached files are re-adopted on restart.
+    """
+
+    INDEX_FILE = 'cache_index.json'
+
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict] = {}
+        self._pins: Dict[str, int] = {}
+        self.evictions = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def record(self, info_hash: str, paths: Iterable[str]):
+        """
+        Remember which files (relative to the root) belong to a torrent
+        """
+        with self._lock:
+            entry = self._entries.setdefault(info_hash, {'paths': [], 'last_watched': time.time()})
+            entry['paths'] = sorted(set(entry['paths']) | set(paths))
+            self._save()
+
+    def touch(self, info_hash: str):
+        """
+        Mark a torrent as just watched
+        """
+        with self._lock:
+            entry = self._entries.get(info_hash)
+            if entry:
+                entry['last_watched'] = time.time()
+
+    def pin(self, info_hash: str):
+        with self._lock:
+            self._pins[info_hash] = self._pins.get(info_hash, 0) + 1
+            self._entries.setdefault(info_hash, {'paths': [], 'last_watched': time.time()})
+
+    def unpin(self, info_hash: str):
+        with self._lock:
+            count = self._pins.get(info_hash, 0) - 1
+            if count > 0:
+                self._pins[info_hash] = count
+            else:
+                self._pins.pop(info_hash, None)
+            self.touch(info_hash)
+            self._save()
+
+    def is_pinned(self, info_hash: str) -> bool:
+        with self._lock:
+            return info_hash in self._pins
+
+    def contains(self, info_hash: str) -> bool:
+        """
+        Whether any data of a torrent is still on disk
+        """
+        with self._lock:
+            entry = self._entries.get(info_hash)
+            return bool(entry) and self._entry_size(entry) > 0
+
+    def cached_torrents(self) -> List[str]:
+        """
+        Info-hashes with data on disk, most recently watched first
+        """
+        with self._lock:
+            ordered = sorted(self._entries.items(), key=lambda item: item[1]['last_watched'], reverse=True)
+            return [info_hash for info_hash, entry in ordered if self._entry_size(entry) > 0]
+
+    def usage(self) -> int:
+        """
+        Bytes actually allocated on disk by every cached torrent
+        """
+        with self._lock:
+            return sum(self._entry_size(entry) for entry in self._entries.values())
+
+    def enforce_budget(self, busy: Iterable[str] = ()) -> List[str]:
+        """
+        Evict least-recently-watched torrents until usage fits the budget.
+        Torrents in busy (still in the libtorrent session) are skipped along
+        with pinned ones. Returns the evicted info-hashes.
+        """
+        busy = set(busy)
+        evicted = []
+
+        with self._lock:
+            sizes = {info_hash: self._entry_size(entry) for info_hash, entry in self._entries.items()}
+            usage = sum(sizes.values())
+            if usage <= self.budget_bytes:
+                return evicted
+
+            candidates = sorted(
+                (info_hash for info_hash in self._entries
+                 if info_hash not in self._pins and info_hash not in busy),
+                key=lambda info_hash: self._entries[info_hash]['last_watched']
+            )
+
+            for info_hash in candidates:
+                if usage <= self.budget_bytes:
+                    break
+                self._delete_files(self._entries.pop(info_hash))
+                usage -= sizes[info_hash]
+                evicted.append(info_hash)
+                self.evictions += 1
+                self.logger.info(f"Evicted {info_hash} from disk cache ({sizes[info_hash]} bytes)")
+
+            if evicted:
+                self._save()
+
+        return evicted
+
+    def forget(self, info_hash: str, delete_files: bool = False):
+        with self._lock:
+            entry = self._entries.pop(info_hash, None)
+            self._pins.pop(info_hash, None)
+            if entry and delete_files:
+                self._delete_files(entry)
+            self._save()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'pinned': len(self._pins),
+                'bytes': self.usage(),
+                'budget_bytes': self.budget_bytes,
+                'evictions': self.evictions
+            }
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _entry_size(self, entry: Dict) -> int:
+        size = 0
+        for path in entry['paths']:
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            # Files are sparse while downloading, so count allocated blocks
+            blocks = getattr(stat, 'st_blocks', None)
+            size += blocks * 512 if blocks is not None else stat.st_size
+        return size
+
+    def _delete_files(self, entry: Dict):
+        top_dirs = set()
+        for path in entry['paths']:
+            full_path = os.path.join(self.root, path)
+            try:
+                os.remove(full_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.error(f"Failed to delete cached file {full_path}: {e}")
+
+            parts = os.path.normpath(path).split(os.sep)
+            if len(parts) > 1:
+                top_dirs.add(parts[0])
+
+        # Remove the torrent's directory once it is empty
+        for top_dir in top_dirs:
+            full_dir = os.path.join(self.root, top_dir)
+            if os.path.isdir(full_dir) and not any(files for _, _, files in os.walk(full_dir)):
+                shutil.rmtree(full_dir, ignore_errors=True)
+
+    def _load(self):
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        try:
+            with open(index_path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable cache index {index_path}: {e}")
+            return
+
+        # Re-adopt whatever is still on disk
+        self._entries = {
+            info_hash: entry for info_hash, entry in entries.items()
+            if self._entry_size(entry) > 0
+        }
+        self.logger.info(f"Re-adopted {len(self._entries)} cached torrents from {self.root}")
+
+    def _save(self):
+        index_path = os.path.join(self.root, self.INDEX_FILE)
+        tmp_path = f'{index_path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            self.logger.error(f"Failed to save cache index: {e}")
@@ -0,0 +1,335 @@
+import json
+import socket
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+from offload import green_sockets, in_green_thread, native_thread, run_blocking
+from torrent_status import TorrentSnapshot
+
+
+class EngineError(Exception):
+    """Raised when the engine process rejects a request"""
+
+
+class EngineClient:
+    """
+    Stateless stand-in for TorrentManager inside a web worker. Every call is
+    forwarded to the engine process over its Unix domain socket; progress
+    callbacks, listeners and readiness notifications are driven by a single
+    poller thread that fetches all watched torrents in one round-trip.
+    """
+
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, socket_path: str, connect_timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[str, Dict[str, Callable]] = {}
+        self._listeners: Dict[str, List[Callable]] = {}
+        self._ready_waiters: Dict[str, Dict[int, List[Callable]]] = {}
+        self._snapshots: Dict[str, TorrentSnapshot] = {}
+        self._video_files: Dict[str, list] = {}
+
+        self._poller = native_thread(self._poll_loop, name='engine-poller')
+        self._poller.start()
+
+    # Transport
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.socket_path)
+                    break
+                except OSError:
+                    sock.close()
+                    # The engine may still be starting up
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.5)
+            conn = self._local.conn = (sock, sock.makefile('rb'))
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn:
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+    def call(self, op: str, **args):
+        """
+        Send one request and return its result (raw bytes for read_range).
+        From a green thread on an unpatched socket the round-trip runs on
+        the offload pool so it cannot stall the hub.
+        """
+        if in_green_thread() and not green_sockets():
+            return run_blocking(self._call, op, args)
+        return self._call(op, args)
+
+    def _call(self, op: str, args: Dict):
+        message = json.dumps({'op': op, 'args': args}, separators=(',', ':')).encode() + b'\n'
+        try:
+            sock, reader = self._connection()
+            sock.sendall(message)
+            line = reader.readline()
+            if not line:
+                raise ConnectionError('Engine closed the connection')
+            response = json.loads(line)
+            if response.get('ok') and 'length' in response:
+                data = reader.read(response['length'])
+                if len(data) != response['length']:
+                    raise ConnectionError('Short read from engine')
+                return data
+        except (OSError, ValueError):
+            self._reset()
+            raise
+
+        if not response.get('ok'):
+            raise EngineError(response.get('error', 'Unknown engine error'))
+        return response.get('result')
+
+    # TorrentManager API
+
+    def add_torrent(self, torrent_url: str, callback: Optional[Callable] = None,
+                    viewer_id: str = 'default', info_hash: Optional[str] = None) -> Optional[str]:
+        try:
+            torrent_id = self.call('add_torrent', torrent_url=torrent_url,
+                                   viewer_id=viewer_id, info_hash=info_hash)
+        except Exception as e:
+            self.logger.error(f"Failed to add torrent via engine: {e}")
+            return None
+
+        if torrent_id:
+            with self._lock:
+                self._callbacks.setdefault(torrent_id, {})[viewer_id] = callback
+        return torrent_id
+
+    def release_torrent(self, torrent_id: str, viewer_id: str = 'default',
+                        delete_files: bool = False) -> bool:
+        with self._lock:
+            viewers = self._callbacks.get(torrent_id, {})
+            viewers.pop(viewer_id, None)
+            if not viewers:
+                self._forget(torrent_id)
+        return self._safe_call('release_torrent', False, torrent_id=torrent_id,
+                               viewer_id=viewer_id, delete_files=delete_files)
+
+    def get_viewer_count(self, torrent_id: str) -> int:
+        return self._safe_call('get_viewer_count', 0, torrent_id=torrent_id)
+
+    def pause_torrent(self, torrent_id: str) -> bool:
+        return self._safe_call('pause_torrent', False, torrent_id=torrent_id)
+
+    def resume_torrent(self, torrent_id: str) -> bool:
+        return self._safe_call('resume_torrent', False, torrent_id=torrent_id)
+
+    def get_torrent_status(self, torrent_id: str) -> Optional[TorrentSnapshot]:
+        """
+        Latest snapshot fetched by the poller; no round-trip on the request path
+        """
+        snapshot = self._snapshots.get(torrent_id)
+        if snapshot is None:
+            statuses = self._safe_call('statuses', {}, torrent_ids=[torrent_id])
+            if torrent_id in statuses:
+                snapshot = TorrentSnapshot.from_wire(statuses[torrent_id])
+        return snapshot
+
+    def get_video_files(self, torrent_id: str) -> list:
+        cached = self._video_files.get(torrent_id)
+        if cached:
+            return cached
+        files = self._safe_call('get_video_files', [], torrent_id=torrent_id)
+        if files:
+            self._video_files[torrent_id] = files
+        return files
+
+    def get_file_location(self, torrent_id: str, file_index: int) -> Optional[str]:
+        # The engine shares the host filesystem, so workers read files directly
+        return self._safe_call('get_file_location', None, torrent_id=torrent_id, file_index=file_index)
+
+    def get_piece_span(self, torrent_id: str, file_index: int, offset: int, length: int) -> Optional[tuple]:
+        span = self._safe_call('get_piece_span', None, torrent_id=torrent_id,
+                               file_index=file_index, offset=offset, length=length)
+        return tuple(span) if span else None
+
+    def prioritize_file(self, torrent_id: str, file_index: int, priority: int = 7) -> bool:
+        return self._safe_call('prioritize_file', False, torrent_id=torrent_id,
+                               file_index=file_index, priority=priority)
+
+    def update_playhead(self, torrent_id: str, reader_id: str, file_index: int, offset: int) -> bool:
+        return self._safe_call('update_playhead', False, torrent_id=torrent_id, reader_id=reader_id,
+                               file_index=file_index, offset=offset)
+
+    def remove_reader(self, torrent_id: str, reader_id: str):
+        self._safe_call('remove_reader', None, torrent_id=torrent_id, reader_id=reader_id)
+
+    def have_range(self, torrent_id: str, file_index: int, offset: int, length: int) -> bool:
+        return self.wait_for_range(torrent_id, file_index, offset, length, timeout=0)
+
+    def available_length(self, torrent_id: str, file_index: int, offset: int, length: int) -> int:
+        return self._safe_call('available_length', 0, torrent_id=torrent_id, file_index=file_index,
+                               offset=offset, length=length)
+
+    def wait_for_range(self, torrent_id: str, file_index: int, offset: int, length: int,
+                       timeout: float = 60.0) -> bool:
+        return self._safe_call('wait_for_range', False, torrent_id=torrent_id, file_index=file_index,
+                               offset=offset, length=length, timeout=timeout)
+
+    def read_range(self, torrent_id: str, file_index: int, offset: int, length: int,
+                   timeout: float = 60.0) -> bytes:
+        return self.call('read_range', torrent_id=torrent_id, file_index=file_index,
+                         offset=offset, length=length, timeout=timeout)
+
+    def seek(self, torrent_id: str, reader_id: str, file_index: int, seconds: float) -> Optional[Dict]:
+        return self._safe_call('seek', None, torrent_id=torrent_id, reader_id=reader_id,
+                               file_index=file_index, seconds=seconds)
+
+    def get_keyframe_times(self, torrent_id: str, file_index: int) -> Optional[List[float]]:
+        return self._safe_call('get_keyframe_times', None, torrent_id=torrent_id, file_index=file_index)
+
+    def prepare_playback(self, torrent_id: str, file_index: int, on_ready: Callable) -> bool:
+        if not self._safe_call('prepare_playback', False, torrent_id=torrent_id, file_index=file_index):
+            return False
+        with self._lock:
+            self._ready_waiters.setdefault(torrent_id, {}).setdefault(file_index, []).append(on_ready)
+        return True
+
+    def add_listener(self, torrent_id: str, listener: Callable) -> bool:
+        with self._lock:
+            self._listeners.setdefault(torrent_id, []).append(listener)
+        return True
+
+    def remove_listener(self, torrent_id: str, listener: Callable):
+        with self._lock:
+            listeners = self._listeners.get(torrent_id, [])
+            if listener in listeners:
+                listeners.remove(listener)
+
+    def get_metrics(self) -> Dict:
+        return self._safe_call('get_metrics', {})
+
+    def get_disk_cache_stats(self) -> Optional[Dict]:
+        return self._safe_call('get_disk_cache_stats', None)
+
+    def get_bandwidth_stats(self) -> Dict:
+        return self._safe_call('get_bandwidth_stats', {})
+
+    def get_window_stats(self) -> Dict:
+        return self._safe_call('get_window_stats', {})
+
+    def warm_up(self, torrent_url: str, info_hash: Optional[str], head_bytes: int,
+                download_limit: int = 0, max_bytes: int = 0) -> Optional[str]:
+        return self._safe_call('warm_up', None, torrent_url=torrent_url, info_hash=info_hash,
+                               head_bytes=head_bytes, download_limit=download_limit,
+                               max_bytes=max_bytes)
+
+    def is_warming(self, torrent_id: str) -> bool:
+        return self._safe_call('is_warming', False, torrent_id=torrent_id)
+
+    def cancel_warm_up(self, torrent_id: str) -> bool:
+        return self._safe_call('cancel_warm_up', False, torrent_id=torrent_id)
+
+    def take_warm_up_bytes(self, torrent_id: str) -> int:
+        return self._safe_call('take_warm_up_bytes', 0, torrent_id=torrent_id)
+
+    def get_warmup_stats(self) -> Dict:
+        return self._safe_call('get_warmup_stats', {})
+
+    # SessionStore API, backed by the engine's store
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        return self._safe_call('get_session', None, session_id=session_id)
+
+    def update_session(self, session_id: str, **fields) -> Dict:
+        # Not swallowed: a lost write would leave the session inconsistent
+        return self.call('update_session', session_id=session_id, **fields)
+
+    def delete_session(self, session_id: str) -> bool:
+        return self._safe_call('delete_session', False, session_id=session_id)
+
+    # Internals
+
+    def _safe_call(self, op: str, default, **args):
+        try:
+            return self.call(op, **args)
+        except Exception as e:
+            self.logger.error(f"Engine call {op} failed: {e}")
+            return default
+
+    def _forget(self, torrent_id: str):
+        self._callbacks.pop(torrent_id, None)
+        self._listeners.pop(torrent_id, None)
+        self._ready_waiters.pop(torrent_id, None)
+        self._snapshots.pop(torrent_id, None)
+        self._video_files.pop(torrent_id, None)
+
+    def _poll_loop(self):
+        """
+        Fetch every watched torrent in one request per tick and dispatch the
+        same events the in-process engine loop would
+        """
+        while True:
+            time.sleep(self.POLL_INTERVAL)
+            with self._lock:
+                watched = set(self._callbacks) | set(self._listeners) | set(self._ready_waiters)
+            if not watched:
+                continue
+
+            try:
+                statuses = self.call('statuses', torrent_ids=sorted(watched))
+            except Exception as e:
+                self.logger.error(f"Engine poll failed: {e}")
+                continue
+
+            for torrent_id, data in statuses.items():
+                self._apply(torrent_id, data)
+
+    def _apply(self, torrent_id: str, data: Dict):
+        previous = self._snapshots.get(torrent_id)
+        snapshot = TorrentSnapshot.from_wire(data)
+        self._snapshots[torrent_id] = snapshot
+
+        events = []
+        if snapshot.files and (previous is None or not previous.files):
+            events.append('metadata')
+        if previous is not None and previous.piece_runs != snapshot.piece_runs:
+            events.append('piece')
+        events.append('progress')
+        if snapshot.status == 'completed' and (previous is None or previous.status != 'completed'):
+            events.append('finished')
+
+        with self._lock:
+            callbacks = list(self._callbacks.get(torrent_id, {}).values())
+            listeners = list(self._listeners.get(torrent_id, []))
+            waiters = self._ready_waiters.get(torrent_id, {})
+            ready = [(index, waiters.pop(index)) for index in data.get('ready_files', []) if index in waiters]
+
+        # Callbacks and listeners expect the torrent_info dict shape
+        info = snapshot.to_dict()
+        for callback in callbacks:
+            if callback:
+                self._run(callback, torrent_id, info)
+        for event in events:
+            for listener in listeners:
+                self._run(listener, torrent_id, event, info)
+        for index, on_ready_list in ready:
+            for on_ready in on_ready_list:
+                self._run(on_ready, torrent_id, index)
+
+    def _run(self, fn: Callable, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.logger.error(f"Error in engine callback: {e}")
@@ -0,0 +1,177 @@
+import json
+import os
+import socketserver
+import threading
+import logging
+from typing import Dict
+
+from session_store import SessionStore
+
+# Default Unix domain socket the engine listens on
+DEFAULT_SOCKET = os.environ.get('TORRENT_ENGINE_SOCKET', '/tmp/torrent_player_engine.sock')
+
+# Upper bound on a single read_range request, keeps one call from pinning
+# large buffers in either process
+MAX_READ_BYTES = 8 * 1024 * 1024
+
+
+class EngineRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves newline-delimited JSON requests on one connection:
+    {"op": "...", "args": {...}} -> {"ok": true, "result": ...}.
+    read_range answers with {"ok": true, "length": N} followed by N raw bytes.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                op = request['op']
+                args = request.get('args') or {}
+                handler = self.server.ops.get(op)
+                if handler is None:
+                    raise ValueError(f'Unknown op: {op}')
+
+                if op == 'read_range':
+                    data = handler(**args)
+                    self._send({'ok': True, 'length': len(data)})
+                    self.wfile.write(data)
+                else:
+                    self._send({'ok': True, 'result': handler(**args)})
+
+            except Exception as e:
+                self._send({'ok': False, 'error': f'{type(e).__name__}: {e}'})
+
+            self.wfile.flush()
+
+    def _send(self, message: Dict):
+        self.wfile.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+
+class EngineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Exposes one TorrentManager to any number of local web workers over a
+    Unix domain socket, so there is exactly one swarm presence per torrent
+    no matter how many HTTP processes are running. Viewing sessions live
+    here too, so web workers can be restarted or added freely.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, manager, socket_path: str = DEFAULT_SOCKET):
+        self.manager = manager
+        self.socket_path = socket_path
+        self.logger = logging.getLogger(__name__)
+        self._ready = set()
+        self._ready_lock = threading.Lock()
+        self.sessions = SessionStore()
+        self.ops = {
+            'add_torrent': self.add_torrent,
+            'release_torrent': self.release_torrent,
+            'pause_torrent': manager.pause_torrent,
+            'resume_torrent': manager.resume_torrent,
+            'get_viewer_count': manager.get_viewer_count,
+            'statuses': self.statuses,
+            'get_video_files': manager.get_video_files,
+            'get_file_location': manager.get_file_location,
+            'get_piece_span': self.get_piece_span,
+            'prioritize_file': manager.prioritize_file,
+            'update_playhead': manager.update_playhead,
+            'remove_reader': manager.remove_reader,
+            'wait_for_range': manager.wait_for_range,
+            'available_length': manager.available_length,
+            'read_range': self.read_range,
+            'seek': manager.seek,
+            'get_keyframe_times': manager.get_keyframe_times,
+            'prepare_playback': self.prepare_playback,
+            'get_metrics': manager.get_metrics,
+            'get_disk_cache_stats': manager.get_disk_cache_stats,
+            'get_window_stats': manager.get_window_stats,
+            'get_bandwidth_stats': manager.get_bandwidth_stats,
+            'warm_up': manager.warm_up,
+            'is_warming': manager.is_warming,
+            'cancel_warm_up': manager.cancel_warm_up,
+            'take_warm_up_bytes': manager.take_warm_up_bytes,
+            'get_warmup_stats': manager.get_warmup_stats,
+            'get_session': self.sessions.get_session,
+            'update_session': self.sessions.update_session,
+            'delete_session': self.sessions.delete_session,
+            'ping': lambda: 'pong'
+        }
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, EngineRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+    def add_torrent(self, torrent_url: str, viewer_id: str = 'default', info_hash=None):
+        # Progress callbacks cannot cross the process boundary; clients poll
+        # 'statuses' instead
+        return self.manager.add_torrent(torrent_url, None, viewer_id=viewer_id, info_hash=info_hash)
+
+    def release_torrent(self, torrent_id: str, viewer_id: str = 'default', delete_files: bool = False):
+        released = self.manager.release_torrent(torrent_id, viewer_id, delete_files)
+        if not self.manager.get_viewer_count(torrent_id):
+            with self._ready_lock:
+                self._ready = {entry for entry in self._ready if entry[0] != torrent_id}
+        return released
+
+    def statuses(self, torrent_ids):
+        """
+        Snapshots of several torrents in one round-trip, with the files that
+        have become ready to play
+        """
+        result = {}
+        for torrent_id in torrent_ids:
+            snapshot = self.manager.get_torrent_status(torrent_id)
+            if snapshot is None:
+                continue
+            entry = snapshot.to_wire()
+            with self._ready_lock:
+                entry['ready_files'] = [i for tid, i in self._ready if tid == torrent_id]
+            result[torrent_id] = entry
+        return result
+
+    def get_piece_span(self, torrent_id: str, file_index: int, offset: int, length: int):
+        span = self.manager.get_piece_span(torrent_id, file_index, offset, length)
+        return list(span) if span else None
+
+    def read_range(self, torrent_id: str, file_index: int, offset: int, length: int,
+                   timeout: float = 60.0) -> bytes:
+        return self.manager.read_range(torrent_id, file_index, offset,
+                                       min(length, MAX_READ_BYTES), timeout)
+
+    def prepare_playback(self, torrent_id: str, file_index: int):
+        def on_ready(tid, index):
+            with self._ready_lock:
+                self._ready.add((tid, index))
+
+        return self.manager.prepare_playback(torrent_id, file_index, on_ready)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    from torrent_manager import TorrentManager
+
+    manager = TorrentManager()
+    server = EngineServer(manager)
+    logging.getLogger(__name__).info(f"Torrent engine listening on {server.socket_path}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        manager.cleanup()
@@ -0,0 +1,339 @@
+import json
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import LatencyStats
+from single_flight import SingleFlight
+
+# Containers browsers play directly from /api/video
+BROWSER_CONTAINERS = ('.mp4', '.m4v', '.webm')
+
+# Codecs that can be copied into fMP4 for browser playback
+COPY_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'vp9'}
+COPY_AUDIO_CODECS = {'aac', 'mp3', 'opus'}
+
+# Copied segments are cut just past their own keyframe and just short of the
+# next one, so rounding can never pull in the neighbouring GOP
+CUT_MARGIN = 0.001
+
+
+class RemuxError(Exception):
+    """Raised when ffmpeg cannot produce a segment"""
+
+
+def split_init(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Split a fragmented MP4 into its init segment (ftyp + moov) and media
+    (every moof/mdat pair), at the first top-level moof box
+    """
+    position = 0
+    while position + 8 <= len(data):
+        size, kind = struct.unpack_from('>I4s', data, position)
+        if kind == b'moof':
+            return data[:position], data[position:]
+        if size == 1:
+            size = struct.unpack_from('>Q', data, position + 8)[0]
+        if size < 8:
+            break
+        position += size
+    raise RemuxError('No media fragment in ffmpeg output')
+
+
+class HLSRemuxer:
+    """
+    Remuxes partially downloaded videos into HLS fMP4 segments with a local
+    ffmpeg, copying streams whenever the browser can decode them. A copied
+    video can only be cut at keyframes, so its segments start at keyframes
+    from the container index, at least segment_seconds apart; without an
+    index the video is re-encoded in fixed-length slices. Segments are cut
+    on demand, once the bytes under them are on disk, and cached in a
+    directory kept within a byte budget by evicting the least recently
+    served segments.
+    """
+
+    def __init__(self, cache_dir: str, budget_bytes: int, segment_seconds: float = 6.0,
+                 ffmpeg: Optional[str] = None, ffprobe: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.budget_bytes = budget_bytes
+        self.segment_seconds = segment_seconds
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self.ffprobe = ffprobe or shutil.which('ffprobe')
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._probes: Dict[str, Dict] = {}
+        self._flight = SingleFlight()
+        self.generation = LatencyStats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.ffmpeg and self.ffprobe)
+
+    @staticmethod
+    def needs_remux(path: str) -> bool:
+        return not path.lower().endswith(BROWSER_CONTAINERS)
+
+    def probe(self, key: str, path: str,
+              keyframes: Optional[Callable[[], Optional[List[float]]]] = None) -> Optional[Dict]:
+        """
+        Duration, codecs and segment start times of a video, or None while
+        its header is still missing. keyframes loads the keyframe times of
+        the container index and is only called on a miss. Successful probes
+        are remembered per key, so a video's segments never change.
+        """
+        info = self._probes.get(key)
+        if info:
+            return info
+
+        try:
+            result = subprocess.run(
+                [self.ffprobe, '-v', 'error', '-of', 'json', '-show_format', '-show_streams', path],
+                capture_output=True, timeout=30, check=True
+            )
+            data = json.loads(result.stdout)
+        except (subprocess.SubprocessError, ValueError, OSError) as e:
+            self.logger.debug(f"ffprobe failed on {path}: {e}")
+            return None
+
+        streams = data.get('streams', [])
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        duration = float(data.get('format', {}).get('duration') or 0)
+        if not video or not duration:
+            return None
+
+        times = None
+        if video.get('codec_name') in COPY_VIDEO_CODECS and keyframes:
+            times = keyframes()
+        info = {
+            'duration': duration,
+            'video_codec': video.get('codec_name'),
+            'audio_codec': audio.get('codec_name') if audio else None,
+            'copy_video': bool(times),
+            'starts': self.segment_starts(duration, times)
+        }
+        self._probes[key] = info
+        return info
+
+    def segment_starts(self, duration: float, keyframes: Optional[List[float]] = None) -> List[float]:
+        """
+        Start times of a video's segments: the first keyframe at least
+        segment_seconds after the previous start, or a fixed grid without
+        keyframes
+        """
+        if not keyframes:
+            count = max(1, int(-(-duration // self.segment_seconds)))
+            return [index * self.segment_seconds for index in range(count)]
+
+        starts = [0.0]
+        for time_at in sorted(keyframes):
+            if time_at - starts[-1] >= self.segment_seconds and time_at < duration:
+                starts.append(time_at)
+        return starts
+
+    @staticmethod
+    def segment_count(info: Dict) -> int:
+        return len(info['starts'])
+
+    @staticmethod
+    def segment_bounds(info: Dict, index: int) -> Tuple[float, float]:
+        """
+        Start time and length of a segment
+        """
+        starts = info['starts']
+        start = starts[index]
+        end = starts[index + 1] if index + 1 < len(starts) else info['duration']
+        return start, end - start
+
+    def playlist(self, info: Dict, ready: int, complete: bool) -> str:
+        """
+        EVENT playlist listing the first `ready` segments; it ends once every
+        segment is available
+        """
+        lengths = [self.segment_bounds(info, index)[1] for index in range(self.segment_count(info))]
+        lines = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:7',
+            f'#EXT-X-TARGETDURATION:{int(-(-max(lengths) // 1))}',
+            '#EXT-X-PLAYLIST-TYPE:EVENT',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-INDEPENDENT-SEGMENTS',
+            '#EXT-X-MAP:URI="init.mp4"'
+        ]
+        for index, length in enumerate(lengths[:ready]):
+            lines.append(f'#EXTINF:{length:.3f},')
+            lines.append(f'{index}.m4s')
+        if complete:
+            lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def init_segment(self, key: str, path: str) -> bytes:
+        """
+        The shared ftyp + moov of a video's segments, cut along with segment 0
+        """
+        init_path = self._path(key, 'init.mp4')
+        data = self._read_cached(init_path)
+        if data is None:
+            self._flight.do((key, 0), lambda: self._generate(key, path, 0))
+            data = self._read_cached(init_path)
+        if data is None:
+            raise RemuxError(f'No init segment for {key}')
+        return data
+
+    def segment(self, key: str, path: str, index: int) -> bytes:
+        """
+        One media segment, cut by ffmpeg on a cache miss
+        """
+        segment_path = self._path(key, f'{index}.m4s')
+        data = self._read_cached(segment_path)
+        if data is not None:
+            with self._lock:
+                self.hits += 1
+            return data
+
+        with self._lock:
+            self.misses += 1
+        return self._flight.do((key, index), lambda: self._generate(key, path, index))
+
+    def forget(self, key: str):
+        """
+        Drop every cached segment of a video
+        """
+        directory = os.path.join(self.cache_dir, key)
+        with self._lock:
+            for entry in [p for p in self._entries if p.startswith(directory + os.sep)]:
+                del self._entries[entry]
+            self._probes.pop(key, None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'available': self.available,
+                'segments': len(self._entries),
+                'bytes': sum(self._entries.values()),
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'generation': self.generation.summary()
+            }
+
+    def _generate(self, key: str, path: str, index: int) -> bytes:
+        info = self.probe(key, path)
+        if info is None:
+            raise RemuxError(f'Cannot probe {path}')
+
+        if index >= self.segment_count(info):
+            raise RemuxError(f'Segment {index} is past the end of {path}')
+        start, length = self.segment_bounds(info, index)
+        end = start + length
+
+        if info['copy_video']:
+            video_args = ['-c:v', 'copy']
+            # Input seeking lands on the keyframe at or before -ss
+            start, end = start + CUT_MARGIN, end - CUT_MARGIN
+        else:
+            video_args = ['-c:v', 'libx264', '-preset', 'veryfast']
+        audio_codec = 'copy' if info['audio_codec'] in COPY_AUDIO_CODECS else 'aac'
+
+        command = [
+            self.ffmpeg, '-v', 'error', '-nostdin',
+            '-ss', f'{start:.6f}', '-to', f'{end:.6f}', '-i', path,
+            '-map', '0:v:0', '-map', '0:a:0?',
+            *video_args, '-c:a', audio_codec,
+            # Keep source timestamps so consecutive segments line up
+            '-copyts', '-start_at_zero', '-avoid_negative_ts', 'disabled',
+            '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            'pipe:1'
+        ]
+
+        started = time.monotonic()
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=120, check=True)
+        except subprocess.CalledProcessError as e:
+            raise RemuxError(e.stderr.decode(errors='replace').strip() or str(e))
+        except (subprocess.SubprocessError, OSError) as e:
+            raise RemuxError(str(e))
+        self.generation.record(time.monotonic() - started)
+
+        init, media = split_init(result.stdout)
+        init_path = self._path(key, 'init.mp4')
+        if not os.path.exists(init_path):
+            self._store(init_path, init)
+        self._store(self._path(key, f'{index}.m4s'), media)
+        return media
+
+    def _path(self, key: str, name: str) -> str:
+        return os.path.join(self.cache_dir, key, name)
+
+    def _read_cached(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+        return data
+
+    def _store(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._entries[path] = len(data)
+            self._entries.move_to_end(path)
+            victims = []
+            total = sum(self._entries.values())
+            while total > self.budget_bytes and len(self._entries) > 1:
+                victim, size = self._entries.popitem(last=False)
+                victims.append(victim)
+                total -= size
+                self.evictions += 1
+
+        for victim in victims:
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+
+    def _load(self):
+        """
+        Adopt segments left by a previous run, oldest first
+        """
+        found = []
+        for directory, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(('.m4s', '.mp4')):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(found):
+            self._entries[path] = size
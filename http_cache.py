@@ -0,0 +1,116 @@
+import gzip
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript',
+                      'application/vnd.apple.mpegurl')
+
+# Short names accepted by fields=, expanded to the keys they stand for
+FIELD_ALIASES = {
+    'cover': ('medium_cover_image',),
+    'images': ('background_image', 'medium_cover_image', 'large_cover_image')
+}
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Keys requested by a fields= parameter (aliases expanded), or None for all
+    """
+    if not value:
+        return None
+
+    fields = []
+    for name in (part.strip() for part in value.split(',')):
+        for key in FIELD_ALIASES.get(name, (name,)):
+            if key and key not in fields:
+                fields.append(key)
+    return fields or None
+
+
+def project(items: Iterable[Optional[Dict]], fields: Optional[List[str]]) -> List[Optional[Dict]]:
+    """
+    Keep only the requested keys of each item; None items stay None
+    """
+    if not fields:
+        return list(items)
+    return [{k: item[k] for k in fields if k in item} if item else item for item in items]
+
+
+def _encodings(accept_encoding: str) -> List[str]:
+    accepted = []
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.append(name.strip().lower())
+    return accepted
+
+
+def payload_etag(*parts: Optional[str]) -> Optional[str]:
+    """
+    ETag of a response built only from the given parts (content hashes of
+    cached values and the request arguments that shape the body), or None
+    if any part is unknown
+    """
+    if any(part is None for part in parts):
+        return None
+    return hashlib.blake2b('\0'.join(parts).encode(), digest_size=16).hexdigest()
+
+
+def finalize(response, request, cache_control: Optional[str] = None, etag: Optional[str] = None):
+    """
+    Add Cache-Control, a strong ETag (answering If-None-Match with 304) and
+    gzip/brotli compression to a buffered response. Streamed responses and
+    partial content are left alone. Routes that know the ETag of their
+    payload pass it in and the body is not hashed.
+    """
+    # Errors are never cached publicly
+    if (cache_control and 'Cache-Control' not in response.headers
+            and (response.status_code == 200 or cache_control == 'no-store')):
+        response.headers['Cache-Control'] = cache_control
+
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or request.method not in ('GET', 'HEAD')):
+        return response
+
+    body = response.get_data()
+    if etag is None:
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    encoding = None
+    mimetype = response.mimetype or ''
+    if (len(body) >= MIN_COMPRESS_BYTES and 'Content-Encoding' not in response.headers
+            and mimetype.startswith(COMPRESSIBLE_TYPES)):
+        accepted = _encodings(request.headers.get('Accept-Encoding', ''))
+        if BROTLI_AVAILABLE and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        response.vary.add('Accept-Encoding')
+
+    # Each encoding of the same payload is a different representation
+    tag = f'{etag}-{encoding}' if encoding else etag
+    response.set_etag(tag)
+
+    if request.if_none_match.contains(tag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop('Content-Length', None)
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
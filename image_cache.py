@@ -0,0 +1,209 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from single_flight import SingleFlight
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+# Width in pixels of each poster size
+POSTER_SIZES = {
+    'small': 160,
+    'medium': 320,
+    'large': 500
+}
+
+SOURCE_NAME = 'source'
+
+FORMATS = {
+    'webp': ('image/webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('image/jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True})
+}
+
+
+class ImageCache:
+    """
+    Disk cache of resized poster variants. Each source image is fetched
+    once, stored, and cut into WebP or JPEG variants on first request; the
+    directory is kept within a byte budget by evicting the least recently
+    served files. Without Pillow the source image is served as it is.
+    """
+
+    def __init__(self, root: str, budget_bytes: int, fetch: Callable[[str], bytes]):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.fetch = fetch
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def choose_format(accept: str) -> str:
+        if PILLOW_AVAILABLE and 'image/webp' in (accept or ''):
+            return 'webp'
+        return 'jpeg'
+
+    def get(self, movie_id: int, size: str, image_format: str,
+            source_url: Callable[[], Optional[str]]) -> Optional[Tuple[str, str, str]]:
+        """
+        Path, mimetype and ETag of a poster variant, built on a miss.
+        source_url is only called when the source image is not cached yet.
+        Returns None when the movie has no poster.
+        """
+        if PILLOW_AVAILABLE:
+            path = os.path.join(self.root, str(movie_id), f'{size}.{image_format}')
+        else:
+            path, image_format = self._source_path(movie_id), 'jpeg'
+        if self._touch(path):
+            with self._lock:
+                self.hits += 1
+        else:
+            with self._lock:
+                self.misses += 1
+            if not self._flight.do(path, lambda: self._build(movie_id, size, image_format, path, source_url)):
+                return None
+
+        return path, FORMATS[image_format][0], self._etag(path)
+
+    def record_sent(self, movie_id: int, path: str):
+        """
+        Count one variant body actually sent to a client, and the bytes it
+        saved over the full-size source. Revalidations (304) and HEAD send
+        no body and are not counted.
+        """
+        with self._lock:
+            variant_size = self._entries.get(path, 0)
+            source_size = self._entries.get(self._source_path(movie_id), variant_size)
+            self.bytes_served += variant_size
+            self.bytes_saved += max(0, source_size - variant_size)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'resizing': PILLOW_AVAILABLE,
+                'files': len(self._entries),
+                'bytes': sum(self._entries.values()),
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'bytes_served': self.bytes_served,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions
+            }
+
+    def _build(self, movie_id: int, size: str, image_format: str, path: str,
+               source_url: Callable[[], Optional[str]]) -> bool:
+        source_path = self._source_path(movie_id)
+        if not self._touch(source_path):
+            url = source_url()
+            if not url:
+                return False
+            self._store(source_path, self.fetch(url))
+
+        if path == source_path:
+            return True
+
+        with open(source_path, 'rb') as f:
+            source = f.read()
+        self._store(path, self._resize(source, POSTER_SIZES[size], image_format))
+        return True
+
+    @staticmethod
+    def _resize(source: bytes, width: int, image_format: str) -> bytes:
+        _, pil_format, options = FORMATS[image_format]
+        image = Image.open(io.BytesIO(source))
+        image.thumbnail((width, width * 4))
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        output = io.BytesIO()
+        image.save(output, pil_format, **options)
+        return output.getvalue()
+
+    def _source_path(self, movie_id: int) -> str:
+        return os.path.join(self.root, str(movie_id), SOURCE_NAME)
+
+    def _etag(self, path: str) -> str:
+        # Variants are immutable once written, so name and size identify them
+        digest = hashlib.blake2b(f'{path}:{self._entries.get(path, 0)}'.encode(), digest_size=12)
+        return digest.hexdigest()
+
+    def _touch(self, path: str) -> bool:
+        with self._lock:
+            if path not in self._entries:
+                return False
+            self._entries.move_to_end(path)
+        try:
+            # mtime carries the LRU order over restarts
+            os.utime(path)
+            return True
+        except OSError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return False
+
+    def _store(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._entries[path] = len(data)
+            self._entries.move_to_end(path)
+            victims = []
+            total = sum(self._entries.values())
+            while total > self.budget_bytes and len(self._entries) > 1:
+                victim, size = self._entries.popitem(last=False)
+                victims.append(victim)
+                total -= size
+                self.evictions += 1
+
+        for victim in victims:
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+
+    def _load(self):
+        """
+        Adopt files left by a previous run, least recently served first
+        """
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                # Skip temporary files of interrupted writes
+                if name.startswith('tmp'):
+                    os.remove(os.path.join(directory, name))
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+
+        for _, path, size in sorted(found):
+            self._entries[path] = size
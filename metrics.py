@@ -0,0 +1,60 @@
+import threading
+from collections import deque
+from typing import Dict
+
+
+class LatencyStats:
+    """
+    Keeps the most recent samples of a duration and summarizes them
+    """
+
+    def __init__(self, max_samples: int = 200):
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+
+        if not samples:
+            return {'count': count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+        return {
+            'count': count,
+            'mean': round(sum(samples) / len(samples), 3),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'max': round(samples[-1], 3)
+        }
+
+
+class MetricsRegistry:
+    """
+    Named latency metrics, created on first use
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._metrics.get(name)
+            if stats is None:
+                stats = self._metrics[name] = LatencyStats()
+        stats.record(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: stats.summary() for name, stats in metrics.items()}
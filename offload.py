@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Native threads available to blocking calls made from green threads
+POOL_SIZE = int(os.environ.get('OFFLOAD_THREADS', 20))
+
+# Seconds between checks while a green thread polls for progress made elsewhere
+POLL_INTERVAL = 0.2
+
+try:
+    import eventlet
+    import greenlet
+    from eventlet import patcher, tpool
+    tpool.set_num_threads(POOL_SIZE)
+    _native_threading = patcher.original('threading')
+    EVENTLET_AVAILABLE = True
+except ImportError:
+    _native_threading = threading
+    EVENTLET_AVAILABLE = False
+
+
+def in_green_thread() -> bool:
+    """
+    True when called from an eventlet green thread, where a blocking call
+    would stall every other request and websocket on the hub
+    """
+    return EVENTLET_AVAILABLE and greenlet.getcurrent().parent is not None
+
+
+def green_sockets() -> bool:
+    """
+    True when socket has been monkey-patched, so socket I/O from a green
+    thread yields to the hub instead of blocking it
+    """
+    return EVENTLET_AVAILABLE and patcher.is_monkey_patched('socket')
+
+
+def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Call fn without blocking the eventlet hub: from a green thread it runs on
+    the bounded native pool (tpool) and only this green thread waits; from a
+    native thread it is simply called.
+    """
+    if in_green_thread():
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def poll_until(ready: Callable[[], bool], timeout: float,
+               alive: Optional[Callable[[], bool]] = None,
+               interval: float = POLL_INTERVAL) -> bool:
+    """
+    Wait up to timeout for ready() to return True, giving up early once
+    alive() returns False. Both must be quick, non-blocking checks. Long
+    waits go through here rather than run_blocking so they never hold one
+    of the POOL_SIZE native threads: a green thread sleeps cooperatively
+    between checks, a native thread with time.sleep.
+    """
+    sleep = eventlet.sleep if in_green_thread() else time.sleep
+    deadline = time.monotonic() + timeout
+    while True:
+        if ready():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (alive is not None and not alive()):
+            return False
+        sleep(min(interval, remaining))
+
+
+def native_thread(target: Callable, name: str = None) -> threading.Thread:
+    """
+    A daemon OS thread, even when eventlet has monkey-patched threading,
+    for loops that block inside C code (libtorrent, sqlite, sockets)
+    """
+    return _native_threading.Thread(target=target, name=name, daemon=True)
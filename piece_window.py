@@ -0,0 +1,137 @@
+import ctypes
+import ctypes.util
+import os
+import threading
+import logging
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+# fallocate(2) flags for releasing a byte range of a sparse file
+_FALLOC_FL_KEEP_SIZE = 0x01
+_FALLOC_FL_PUNCH_HOLE = 0x02
+
+_libc = None
+if hasattr(os, 'posix_fallocate'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def release_bytes(path: str, offset: int, length: int) -> bool:
+    """
+    Give the storage under a byte range of a file back to the filesystem
+    (or tmpfs) without changing the file's size. Returns False where hole
+    punching is not supported.
+    """
+    if _libc is None or length <= 0:
+        return False
+
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except OSError:
+        return False
+
+    try:
+        result = _libc.fallocate(fd, _FALLOC_FL_PUNCH_HOLE | _FALLOC_FL_KEEP_SIZE, offset, length)
+        if result != 0:
+            logger.debug(f"fallocate failed on {path}: {os.strerror(ctypes.get_errno())}")
+        return result == 0
+    finally:
+        os.close(fd)
+
+
+class PieceWindow:
+    """
+    Decides which pieces of a torrent may be held in streaming-only mode: the
+    pinned container header and index, plus a window around each reader, all
+    within a fixed byte budget. Pieces outside the window are evicted,
+    furthest behind the playhead first, so storage stays flat whatever the
+    size of the file.
+    """
+
+    def __init__(self, num_pieces: int, piece_length: int, budget_bytes: int,
+                 behind_pieces: int = 2):
+        self.num_pieces = num_pieces
+        self.piece_length = piece_length
+        self.capacity = max(1, budget_bytes // piece_length)
+        self.behind_pieces = behind_pieces
+
+        self._lock = threading.Lock()
+        self._pinned: Set[int] = set()
+        self._readers: Dict[str, int] = {}
+        self.evicted = 0
+
+    def pin(self, pieces: Iterable[int]):
+        """
+        Keep pieces (container header and index) for as long as the torrent
+        is open
+        """
+        with self._lock:
+            self._pinned.update(p for p in pieces if 0 <= p < self.num_pieces)
+
+    def set_reader(self, reader_id: str, piece: int):
+        with self._lock:
+            self._readers[reader_id] = piece
+
+    def remove_reader(self, reader_id: str):
+        with self._lock:
+            self._readers.pop(reader_id, None)
+
+    def wanted(self, ahead: int) -> Set[int]:
+        """
+        Pieces that should be on disk: the pinned ones, then up to `ahead`
+        pieces in front of every reader (and a few behind it), shrunk evenly
+        so the total fits the budget
+        """
+        with self._lock:
+            wanted = set(self._pinned)
+            if not self._readers:
+                return wanted
+
+            share = max(1, (self.capacity - len(wanted)) // len(self._readers))
+            ahead = max(1, min(ahead, share - self.behind_pieces))
+            behind = max(0, min(self.behind_pieces, share - ahead))
+            for piece in self._readers.values():
+                wanted.update(range(max(0, piece - behind), min(self.num_pieces, piece + ahead)))
+            return wanted
+
+    def evictions(self, held: Iterable[int], wanted: Set[int]) -> List[int]:
+        """
+        Held pieces to discard so no more than the budget is kept; pieces
+        behind every reader go first, then those furthest ahead
+        """
+        held = list(held)
+        excess = len(held) - self.capacity
+        if excess <= 0:
+            return []
+
+        with self._lock:
+            positions = list(self._readers.values())
+
+        def distance(piece: int) -> int:
+            if not positions:
+                return 0
+            # Pieces behind a reader are worth less than pieces ahead of one
+            return min((p - piece) * 2 if piece < p else piece - p for p in positions)
+
+        candidates = sorted((p for p in held if p not in wanted), key=distance, reverse=True)
+        return candidates[:excess]
+
+    def record_eviction(self):
+        """
+        Count a piece whose storage was actually released
+        """
+        with self._lock:
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'capacity_pieces': self.capacity,
+                'pinned_pieces': len(self._pinned),
+                'readers': len(self._readers),
+                'evicted_pieces': self.evicted
+            }
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+
+class ProgressFanout:
+    """
+    Coalesces progress snapshots per Socket.IO room and emits them at a
+    bounded rate. Only the latest snapshot published to a room is sent on
+    each tick, and only the fields that changed since the previous emit;
+    identity fields are always included so clients can route the update.
+    """
+
+    IDENTITY_FIELDS = ('session_id', 'torrent_id')
+
+    def __init__(self, emit: Callable[[str, Dict, str], None], interval: float = 1.0):
+        self.emit = emit
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._sent: Dict[str, Dict[str, Any]] = {}
+        self._last_emit: Dict[str, float] = {}
+        self._intervals: Dict[str, float] = {}
+        self._events: Dict[str, str] = {}
+        self.stats = {'published': 0, 'emitted': 0, 'bytes': 0}
+
+    def set_interval(self, room: str, interval: float):
+        """
+        Override the minimum time between emits for one room
+        """
+        with self._lock:
+            self._intervals[room] = interval
+
+    def publish(self, room: str, event: str, snapshot: Dict[str, Any]):
+        """
+        Record the latest snapshot for a room; it is sent on the next tick
+        """
+        with self._lock:
+            self._pending[room] = dict(snapshot)
+            self._events[room] = event
+            self.stats['published'] += 1
+
+    def full_state(self, room: str) -> Optional[Dict[str, Any]]:
+        """
+        Everything last sent to a room, for clients that have just joined it
+        """
+        with self._lock:
+            state = self._sent.get(room)
+            return dict(state) if state else None
+
+    def forget(self, room: str):
+        with self._lock:
+            for table in (self._pending, self._sent, self._last_emit, self._intervals, self._events):
+                table.pop(room, None)
+
+    def flush(self, now: Optional[float] = None) -> int:
+        """
+        Emit due deltas for every room, returning the number of messages sent
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+
+        with self._lock:
+            for room, snapshot in list(self._pending.items()):
+                interval = self._intervals.get(room, self.interval)
+                if now - self._last_emit.get(room, 0.0) < interval:
+                    continue
+
+                previous = self._sent.get(room, {})
+                delta = {k: v for k, v in snapshot.items()
+                         if k in self.IDENTITY_FIELDS or previous.get(k) != v}
+                del self._pending[room]
+
+                if all(k in self.IDENTITY_FIELDS for k in delta):
+                    continue
+
+                self._sent[room] = {**previous, **snapshot}
+                self._last_emit[room] = now
+                due.append((self._events[room], delta, room))
+
+        for event, delta, room in due:
+            try:
+                self.emit(event, delta, room)
+                self.stats['emitted'] += 1
+                self.stats['bytes'] += len(json.dumps(delta, default=str))
+            except Exception as e:
+                self.logger.error(f"Failed to emit {event} to {room}: {e}")
+
+        return len(due)
+
+    def run(self, sleep: Callable[[float], None] = time.sleep, tick: float = 0.1):
+        """
+        Flush forever; meant to run as a background task
+        """
+        while True:
+            self.flush()
+            sleep(tick)
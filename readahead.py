@@ -0,0 +1,114 @@
+import math
+import threading
+import logging
+from typing import Dict, Set
+
+
+class ReadaheadScheduler:
+    """
+    Keeps time-critical piece deadlines for a sliding window ahead of each
+    reader of a torrent. The window is sized from the measured download rate
+    so a fast swarm buffers further ahead, and deadlines left behind by a seek
+    are cancelled so libtorrent stops chasing pieces nobody is waiting for.
+    """
+
+    def __init__(self, handle, piece_length: int, num_pieces: int,
+                 lookahead_seconds: float = 20.0, min_pieces: int = 4, max_pieces: int = 64,
+                 min_rate: int = 256 * 1024):
+        self.handle = handle
+        self.piece_length = piece_length
+        self.num_pieces = num_pieces
+        self.lookahead_seconds = lookahead_seconds
+        self.min_pieces = min_pieces
+        self.max_pieces = max_pieces
+        self.min_rate = min_rate
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._readers: Dict[str, range] = {}
+        self._deadlines: Set[int] = set()
+        self._rate = 0.0
+
+    def observe_rate(self, download_rate: float):
+        """
+        Feed a download rate sample (bytes/s), smoothed with an EWMA
+        """
+        with self._lock:
+            if self._rate:
+                self._rate = 0.7 * self._rate + 0.3 * download_rate
+            else:
+                self._rate = float(download_rate)
+
+    def window_size(self) -> int:
+        """
+        Number of pieces to keep under deadline ahead of a reader
+        """
+        rate = max(self._rate, self.min_rate)
+        pieces = math.ceil(rate * self.lookahead_seconds / self.piece_length)
+        return max(self.min_pieces, min(self.max_pieces, pieces))
+
+    def update(self, reader_id: str, piece: int):
+        """
+        Move a reader's playhead to the given piece and reschedule deadlines
+        """
+        with self._lock:
+            size = self.window_size()
+            window = range(max(0, piece), min(self.num_pieces, piece + size))
+            previous = self._readers.get(reader_id)
+            if previous == window:
+                return
+
+            self._readers[reader_id] = window
+            self._reschedule(rate_changed=previous is not None and len(previous) != len(window))
+
+    def remove_reader(self, reader_id: str):
+        """
+        Forget a reader and cancel the deadlines only it was holding
+        """
+        with self._lock:
+            if self._readers.pop(reader_id, None) is not None:
+                self._reschedule()
+
+    def clear(self):
+        """
+        Drop every reader and cancel all outstanding deadlines
+        """
+        with self._lock:
+            self._readers.clear()
+            self._reschedule()
+
+    def rebind(self, handle):
+        """
+        Move every deadline onto a new handle for the same torrent
+        """
+        with self._lock:
+            self.handle = handle
+            self._deadlines = set()
+            self._reschedule()
+
+    @property
+    def readers(self) -> Dict[str, range]:
+        with self._lock:
+            return dict(self._readers)
+
+    def _reschedule(self, rate_changed: bool = False):
+        wanted = {}
+        for window in self._readers.values():
+            for position, piece in enumerate(window):
+                wanted[piece] = min(position, wanted.get(piece, position))
+
+        # Deadlines left behind by a seek or a departed reader
+        for piece in self._deadlines - wanted.keys():
+            self.handle.reset_piece_deadline(piece)
+
+        # Space deadlines by the time one piece takes at the current rate, so
+        # the piece under the playhead is always requested first
+        per_piece_ms = int(1000 * self.piece_length / max(self._rate, self.min_rate))
+        for piece, position in wanted.items():
+            if piece in self._deadlines and not rate_changed:
+                continue
+            if self.handle.have_piece(piece):
+                continue
+            self.handle.set_piece_deadline(piece, position * per_piece_ms)
+
+        self._deadlines = set(wanted)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    Bounded in-process cache for parsed upstream responses.
+    Entries expire after a TTL but may still be served for a further stale
+    window while they are refreshed in the background. Eviction is LRU and
+    bounded both by entry count and by the approximate serialized size.
+    Each entry also keeps a hash of that serialization, so responses built
+    from it can be tagged without hashing their body.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float, float, int, Optional[str]]]" = OrderedDict()
+        # Key of each stored value by identity, for etag()
+        self._keys: Dict[int, Hashable] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, bool]]:
+        """
+        Look up a key. Returns (value, is_fresh) or None when the entry is
+        missing or past its stale window.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+
+            value, fresh_until, stale_until, _, _ = entry
+            if now >= stale_until:
+                self._remove(key)
+                self._stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            if now < fresh_until:
+                self._stats['hits'] += 1
+                return value, True
+
+            self._stats['stale_hits'] += 1
+            return value, False
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """
+        Return a fresh value without touching LRU order or counters
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                return None
+            return entry[0]
+
+    def etag(self, value: Any) -> Optional[str]:
+        """
+        Content hash of a value this cache handed out, or None once its
+        entry has been replaced or evicted
+        """
+        with self._lock:
+            entry = self._entries.get(self._keys.get(id(value)))
+            if entry is None or entry[0] is not value:
+                return None
+            return entry[4]
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0.0):
+        """
+        Store a value that is fresh for ttl seconds and may be served stale
+        for stale_ttl seconds after that
+        """
+        serialized = self._serialize(value)
+        size = len(serialized) if serialized is not None else 1024
+        if size > self.max_bytes:
+            return
+        etag = hashlib.blake2b(serialized, digest_size=16).hexdigest() if serialized is not None else None
+
+        now = time.monotonic()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, now + ttl, now + ttl + stale_ttl, size, etag)
+            self._keys[id(value)] = key
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and eviction counters plus current occupancy
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            return stats
+
+    def _remove(self, key: Hashable):
+        value, _, _, size, _ = self._entries.pop(key)
+        if self._keys.get(id(value)) == key:
+            del self._keys[id(value)]
+        self._bytes -= size
+
+    @staticmethod
+    def _serialize(value: Any) -> Optional[bytes]:
+        try:
+            return json.dumps(value, separators=(',', ':'), default=str).encode()
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,83 @@
+import json
+import os
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+
+class ResumeStore:
+    """
+    On-disk store of .torrent metadata, libtorrent fast-resume data and known
+    good peers, keyed by info-hash, so a torrent seen before can be re-added
+    without a metadata round-trip or a full hash check. Also holds the
+    session state (including the DHT node table).
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(root, exist_ok=True)
+
+    def load_resume(self, info_hash: str) -> Optional[bytes]:
+        return self._read(self._path(info_hash, 'fastresume'))
+
+    def load_torrent(self, info_hash: str) -> Optional[bytes]:
+        return self._read(self._path(info_hash, 'torrent'))
+
+    def save_resume(self, info_hash: str, data: bytes):
+        self._write(self._path(info_hash, 'fastresume'), data)
+
+    def save_torrent(self, info_hash: str, data: bytes):
+        self._write(self._path(info_hash, 'torrent'), data)
+
+    def load_peers(self, info_hash: str) -> List[Tuple[str, int]]:
+        data = self._read(self._path(info_hash, 'peers'))
+        if not data:
+            return []
+        try:
+            return [(ip, int(port)) for ip, port in json.loads(data)]
+        except (ValueError, TypeError):
+            return []
+
+    def save_peers(self, info_hash: str, peers: List[Tuple[str, int]]):
+        self._write(self._path(info_hash, 'peers'), json.dumps(peers).encode())
+
+    def load_session_state(self) -> Optional[bytes]:
+        return self._read(os.path.join(self.root, 'session.state'))
+
+    def save_session_state(self, data: bytes):
+        self._write(os.path.join(self.root, 'session.state'), data)
+
+    def has_torrent(self, info_hash: str) -> bool:
+        return os.path.exists(self._path(info_hash, 'torrent'))
+
+    def delete(self, info_hash: str, kinds: Iterable[str] = ('fastresume', 'torrent', 'peers')):
+        for kind in kinds:
+            try:
+                os.remove(self._path(info_hash, kind))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.logger.error(f"Failed to delete {kind} for {info_hash}: {e}")
+
+    def _path(self, info_hash: str, kind: str) -> str:
+        return os.path.join(self.root, f'{info_hash.lower()}.{kind}')
+
+    def _read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self.logger.error(f"Failed to read {path}: {e}")
+            return None
+
+    def _write(self, path: str, data: bytes):
+        # Write atomically so a crash never leaves a truncated resume file
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f"Failed to write {path}: {e}")
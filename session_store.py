@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class SessionStore:
+    """
+    Viewing sessions keyed by session id: what each one is watching and its
+    playback status. Web workers hold no session state of their own; they
+    read and update records here, in-process or through the engine process
+    (EngineClient exposes the same three methods), so any worker can serve
+    any request of a session.
+    """
+
+    FIELDS = ('current_torrent_id', 'current_movie', 'status')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._sessions.get(session_id)
+            return dict(record) if record else None
+
+    def update_session(self, session_id: str, **fields) -> Dict[str, Any]:
+        """
+        Merge fields into a session, creating it if needed; returns the record
+        """
+        unknown = set(fields) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown session fields: {', '.join(sorted(unknown))}")
+
+        with self._lock:
+            record = self._sessions.setdefault(session_id, {
+                'session_id': session_id,
+                'current_torrent_id': None,
+                'current_movie': None,
+                'status': 'ready'
+            })
+            record.update(fields)
+            record['updated_at'] = time.time()
+            return dict(record)
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
@@ -6,6 +6,7 @@ class TorrentPlayerApp {
         this.currentPage = 1;
         this.currentMovie = null;
         this.isPlaying = false;
+        this.torrentState = {};
         
         this.init();
     }
@@ -34,19 +35,32 @@ class TorrentPlayerApp {
             this.showToast('Disconnected from server', 'warning');
         });
         
+        // Progress arrives only for this session's torrent, as deltas
         this.socket.on('torrent_progress', (data) => {
-            if (data.session_id === this.sessionId) {
-                this.updateTorrentStatus(data);
+            if (data.torrent_id !== this.torrentState.torrent_id) {
+                this.torrentState = {};
             }
+            this.torrentState = { ...this.torrentState, ...data };
+            this.updateTorrentStatus(this.torrentState);
         });
         
         this.socket.on('video_ready', (data) => {
             if (data.session_id === this.sessionId) {
-                this.playVideo(data.video_path);
+                this.playVideo(data.video_path, data.hls_path);
             }
         });
         
-        this.socket.emit('join_session', { session_id: this.sessionId });
+        // Join on every (re)connect so the server-side rooms are restored
+        this.socket.on('connect', () => {
+            this.socket.emit('join_session', { session_id: this.sessionId });
+        });
+
+        // Rejoin when the session switches torrents, to move to its room
+        this.socket.on('session_torrent', (data) => {
+            if (data.session_id === this.sessionId) {
+                this.socket.emit('join_session', { session_id: this.sessionId });
+            }
+        });
     }
     
     setupEventListeners() {
@@ -97,6 +111,14 @@ class TorrentPlayerApp {
             this.showToast('Video ready to play', 'success');
         });
         
+        // Let the server fetch the target keyframe before the player asks for it
+        videoPlayer.addEventListener('seeking', () => {
+            if (this.isPlaying) {
+                fetch(`/api/seek/${this.sessionId}?t=${videoPlayer.currentTime}`)
+                    .catch(error => console.log('Seek hint failed:', error));
+            }
+        });
+        
         videoPlayer.addEventListener('error', (e) => {
             this.showToast('Video playback error', 'error');
             console.error('Video error:', e);
@@ -107,10 +129,12 @@ class TorrentPlayerApp {
         this.showLoading(true);
         
         try {
+            // The grid only needs these; full details come with /api/play
             const params = new URLSearchParams({
                 page: this.currentPage,
                 limit: 20,
-                quality: document.getElementById('qualitySelect').value
+                quality: document.getElementById('qualitySelect').value,
+                fields: 'id,title,year,rating,genres'
             });
             
             if (query) {
@@ -170,11 +194,13 @@ class TorrentPlayerApp {
         card.className = 'movie-card';
         card.addEventListener('click', () => this.playMovie(movie));
         
-        const poster = movie.medium_cover_image || movie.large_cover_image || '/static/images/no-poster.png';
+        const poster = `/img/${movie.id}`;
         
         card.innerHTML = `
-            <img src="${poster}" alt="${movie.title}" class="movie-poster" 
-                 onerror="this.src='/static/images/no-poster.png'">
+            <img src="${poster}/medium" srcset="${poster}/small 160w, ${poster}/medium 320w, ${poster}/large 500w"
+                 sizes="(max-width: 600px) 45vw, 200px" alt="${movie.title}" class="movie-poster"
+                 loading="lazy" decoding="async"
+                 onerror="this.onerror=null; this.srcset=''; this.src='/static/images/no-poster.png'">
             <div class="movie-info">
                 <h3 class="movie-title">${movie.title}</h3>
                 <p class="movie-year">${movie.year}</p>
@@ -213,8 +239,9 @@ class TorrentPlayerApp {
             const data = await response.json();
             
             if (data.success) {
+                this.currentMovie = data.movie || movie;
                 this.switchToVideoPanel();
-                this.updateMovieDetails(movie);
+                this.updateMovieDetails(this.currentMovie);
                 this.enableControlButtons();
                 this.showToast('Torrent started successfully', 'success');
             } else {
@@ -226,10 +253,25 @@ class TorrentPlayerApp {
         }
     }
     
-    playVideo(videoPath) {
+    playVideo(videoPath, hlsPath) {
         const videoPlayer = document.getElementById('videoPlayer');
-        videoPlayer.src = videoPath;
-        videoPlayer.load();
+        
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
+        
+        // Containers the browser cannot play are served as remuxed HLS
+        if (hlsPath && !videoPlayer.canPlayType('application/vnd.apple.mpegurl') &&
+            window.Hls && Hls.isSupported()) {
+            this.hls = new Hls();
+            this.hls.loadSource(hlsPath);
+            this.hls.attachMedia(videoPlayer);
+        } else {
+            const nativeHls = hlsPath && videoPlayer.canPlayType('application/vnd.apple.mpegurl');
+            videoPlayer.src = nativeHls ? hlsPath : videoPath;
+            videoPlayer.load();
+        }
         
         // Auto-play on mobile might be restricted, so we'll let user tap to play
         if (this.isMobile()) {
@@ -274,6 +316,10 @@ class TorrentPlayerApp {
     stopVideo() {
         const videoPlayer = document.getElementById('videoPlayer');
         videoPlayer.pause();
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
         videoPlayer.src = '';
         this.isPlaying = false;
         this.disableControlButtons();
@@ -281,11 +327,12 @@ class TorrentPlayerApp {
     }
     
     updateTorrentStatus(data) {
+        const progress = data.progress || 0;
         document.getElementById('statusValue').textContent = data.status;
-        document.getElementById('progressFill').style.width = `${data.progress}%`;
-        document.getElementById('progressText').textContent = `${data.progress.toFixed(1)}%`;
-        document.getElementById('speedValue').textContent = this.formatBytes(data.download_rate) + '/s';
-        document.getElementById('peersValue').textContent = data.peers;
+        document.getElementById('progressFill').style.width = `${progress}%`;
+        document.getElementById('progressText').textContent = `${progress.toFixed(1)}%`;
+        document.getElementById('speedValue').textContent = this.formatBytes(data.download_rate || 0) + '/s';
+        document.getElementById('peersValue').textContent = data.peers || 0;
         
         // Update control buttons based on status
         if (data.status === 'downloading') {
@@ -0,0 +1,203 @@
+import os
+import re
+import logging
+from typing import Callable, Iterator, Optional, Tuple
+
+# Size of each chunk read from disk and yielded to the client. Keeping this
+# small bounds the memory held per viewer and lets each chunk be released as
+# soon as the pieces under it have been downloaded.
+CHUNK_SIZE = 256 * 1024
+
+# Read size when copying an already complete range without a file_wrapper
+COMPLETE_CHUNK_SIZE = 1024 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+logger = logging.getLogger(__name__)
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for the file size"""
+
+
+def parse_range_header(header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse an HTTP Range header into an inclusive (start, end) byte range.
+    Returns None when no usable range was requested (serve the whole file).
+    Only single ranges are supported, multi-range requests fall back to the
+    whole file as allowed by RFC 7233.
+    """
+    if not header:
+        return None
+
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes of the file
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable(header)
+        start = max(0, file_size - length)
+        end = file_size - 1
+    else:
+        start = int(first)
+        end = int(last) if last else file_size - 1
+        end = min(end, file_size - 1)
+
+    if start >= file_size or start > end:
+        raise RangeNotSatisfiable(header)
+
+    return start, end
+
+
+def iter_file_range(path: str, start: int, end: int,
+                    wait_for_range: Callable[[int, int], bool],
+                    chunk_size: int = CHUNK_SIZE,
+                    on_close: Optional[Callable[[], None]] = None,
+                    on_sent: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Yield bytes start..end (inclusive) of a file that may still be downloading.
+    Before each chunk is read, wait_for_range(offset, length) is called and must
+    block until that part of the file is on disk; if it returns False the
+    stream is ended early and the client is expected to re-request the rest.
+    on_close is called once the stream finishes or the client disconnects,
+    and on_sent(n) once the server has taken each chunk of n bytes.
+    """
+    offset = start
+    handle = None
+    try:
+        while offset <= end:
+            length = min(chunk_size, end - offset + 1)
+
+            if not wait_for_range(offset, length):
+                logger.warning(f"Timed out waiting for bytes {offset}-{offset + length - 1} of {path}")
+                return
+
+            if handle is None:
+                handle = open(path, 'rb')
+            handle.seek(offset)
+
+            data = handle.read(length)
+            if not data:
+                return
+
+            offset += len(data)
+            yield data
+            if on_sent is not None:
+                on_sent(len(data))
+    finally:
+        if handle is not None:
+            handle.close()
+        if on_close is not None:
+            on_close()
+
+
+def iter_complete_range(environ: dict, path: str, start: int, end: int,
+                        on_close: Optional[Callable[[], None]] = None,
+                        on_sent: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Serve bytes start..end (inclusive) of a file whose pieces are all on disk.
+    When the WSGI server offers wsgi.file_wrapper (gunicorn uses os.sendfile
+    for it) the file is handed over positioned at start, and the response's
+    Content-Length bounds what is sent as PEP 3333 requires; otherwise it is
+    copied in large chunks without waiting on pieces. on_close is called
+    when the server closes the response either way, and on_sent(n) with the
+    bytes the server took: per chunk when copied, once on close for
+    file_wrapper.
+    """
+    handle = open(path, 'rb')
+    handle.seek(start)
+
+    file_wrapper = environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        return file_wrapper(_ClosingFile(handle, on_close, end - start + 1, on_sent),
+                            COMPLETE_CHUNK_SIZE)
+
+    return _iter_open_range(handle, start, end, on_close, on_sent)
+
+
+class _ClosingFile:
+    """
+    An open file whose close() also runs a cleanup callback. file_wrapper
+    responses bypass any iterator the app could wrap them in, so this is
+    the one close() the server is guaranteed to call; everything else,
+    fileno() included, goes to the real file so sendfile still applies.
+
+    It also works out how much of the range was sent. socket.sendfile()
+    leaves the file positioned just past what it sent, by a final seek,
+    so the last seek is used when there was one; a server iterating the
+    wrapper instead only reads, so then the bytes read are used.
+    """
+
+    def __init__(self, handle, on_close: Optional[Callable[[], None]],
+                 length: int = 0, on_sent: Optional[Callable[[int], None]] = None):
+        self._handle = handle
+        self._on_close = on_close
+        self._start = handle.tell()
+        self._length = length
+        self._on_sent = on_sent
+        self._read = 0
+        self._seeked_to = None
+
+    def __getattr__(self, name):
+        return getattr(self._handle, name)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._handle.read(size)
+        self._read += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        position = self._handle.seek(offset, whence)
+        self._seeked_to = position
+        return position
+
+    def sent(self) -> int:
+        if self._seeked_to is not None:
+            sent = self._seeked_to - self._start
+        else:
+            sent = self._read
+        return max(0, min(sent, self._length))
+
+    def close(self):
+        try:
+            on_sent, self._on_sent = self._on_sent, None
+            if on_sent is not None:
+                on_sent(self.sent())
+            self._handle.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+
+
+def _iter_open_range(handle, start: int, end: int,
+                     on_close: Optional[Callable[[], None]] = None,
+                     on_sent: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    remaining = end - start + 1
+    try:
+        while remaining > 0:
+            data = handle.read(min(COMPLETE_CHUNK_SIZE, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+            if on_sent is not None:
+                on_sent(len(data))
+    finally:
+        handle.close()
+        if on_close is not None:
+            on_close()
+
+
+def content_range(start: int, end: int, file_size: int) -> str:
+    """
+    Build a Content-Range header value
+    """
+    return f'bytes {start}-{end}/{file_size}'
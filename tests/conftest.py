@@ -0,0 +1,167 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_movie(movie_id: int, **fields):
+    movie = {
+        'id': movie_id,
+        'title': f'Movie {movie_id}',
+        'year': 2000 + movie_id % 25,
+        'rating': round(5 + movie_id % 5, 1),
+        'runtime': 100,
+        'genres': ['Drama'],
+        'summary': f'Summary of movie {movie_id}',
+        'language': 'en',
+        'mpa_rating': 'PG',
+        'date_uploaded_unix': 1_600_000_000 + movie_id,
+        'torrents': [{'hash': f'{movie_id:040x}', 'quality': '720p', 'url': f'magnet:{movie_id}',
+                      'seeds': 10, 'peers': 2, 'size_bytes': 700 * 1024 ** 2}]
+    }
+    movie.update(fields)
+    return movie
+
+
+class StandInYTS:
+    """
+    Local stand-in for the YTS API and its image host. Serves
+    list_movies.json (paged, sorted by date_added or any numeric field),
+    movie_details.json and /images/<name>, counting every request.
+    """
+
+    def __init__(self):
+        self.movies = []
+        self.images = {}
+        self.delay = 0.0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def count(self, path: str) -> int:
+        with self._lock:
+            return sum(1 for p in self.requests if p == path)
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _list(self, params):
+        page = int(params.get('page', 1))
+        limit = int(params.get('limit', 20))
+        sort_by = params.get('sort_by', 'date_added')
+        query = params.get('query_term', '').lower()
+
+        movies = [m for m in self.movies if query in m['title'].lower()]
+        key = 'date_uploaded_unix' if sort_by == 'date_added' else sort_by
+        movies.sort(key=lambda m: m.get(key) or 0, reverse=True)
+        return {
+            'movie_count': len(movies),
+            'movies': movies[(page - 1) * limit:page * limit]
+        }
+
+    def _details(self, params):
+        movie_id = int(params.get('movie_id', 0))
+        movie = next((m for m in self.movies if m['id'] == movie_id), None)
+        return {'movie': movie or {}}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stand_in._lock:
+                    stand_in.requests.append(url.path)
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+
+                if url.path.startswith('/images/'):
+                    body = stand_in.images.get(url.path[len('/images/'):])
+                    if body is None:
+                        self.send_error(404)
+                        return
+                    self._send(body, 'image/jpeg')
+                    return
+
+                if url.path == '/api/v2/list_movies.json':
+                    data = stand_in._list(params)
+                elif url.path == '/api/v2/movie_details.json':
+                    data = stand_in._details(params)
+                else:
+                    self.send_error(404)
+                    return
+                self._send(json.dumps({'status': 'ok', 'data': data}).encode(), 'application/json')
+
+            def _send(self, body: bytes, content_type: str):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def yts_server():
+    server = StandInYTS()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def scraper(yts_server):
+    from yts_scraper import YTSScraper
+
+    scraper = YTSScraper()
+    scraper.base_url = yts_server.url
+    yield scraper
+    scraper._executor.shutdown(wait=False)
+
+
+@pytest.fixture
+def app_module(monkeypatch, tmp_path, yts_server):
+    """
+    app.py imported in browser-only mode (no in-process torrent engine),
+    with its caches under tmp_path and YTS pointed at the stand-in server
+    """
+    monkeypatch.setenv('CATALOG_SYNC', '0')
+    monkeypatch.setenv('HLS_REMUX', '0')
+    monkeypatch.setenv('IMAGE_CACHE_DIR', str(tmp_path / 'images'))
+    monkeypatch.delenv('TORRENT_ENGINE_SOCKET', raising=False)
+    monkeypatch.delenv('WARMUP_PREFETCH', raising=False)
+    monkeypatch.setitem(sys.modules, 'libtorrent', None)
+    sys.modules.pop('app', None)
+
+    import app
+    app.scraper.base_url = yts_server.url
+    yield app
+    sys.modules.pop('app', None)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """
+    A real TorrentManager on a scratch download directory
+    """
+    pytest.importorskip('libtorrent')
+    from torrent_manager import TorrentManager
+
+    manager = TorrentManager(download_dir=str(tmp_path / 'downloads'), cache_budget=1024 ** 2)
+    yield manager
+    manager.cleanup(delete_files=True)
@@ -0,0 +1,62 @@
+import bandwidth_scheduler
+from bandwidth_scheduler import BandwidthScheduler
+
+
+class StubBandwidth:
+    def __init__(self, **stats):
+        self.stats = stats
+
+    def get_bandwidth_stats(self):
+        return self.stats
+
+
+def test_idle_intervals_leave_the_estimate_alone(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bandwidth_scheduler.time, 'monotonic', lambda: now[0])
+    scheduler = BandwidthScheduler()
+    scheduler.observe(10 * 1024 ** 2)
+
+    # Half an hour with nothing to download
+    for _ in range(360):
+        now[0] += 5
+        scheduler.observe(0, active=False)
+
+    assert scheduler.estimated_capacity == 10 * 1024 ** 2
+    assert scheduler.stats()['estimate_age'] == 1800
+
+
+def test_slow_swarms_do_not_lower_the_estimate():
+    scheduler = BandwidthScheduler()
+    scheduler.observe(4 * 1024 ** 2)
+    for _ in range(BandwidthScheduler.ESTIMATE_SAMPLES - 1):
+        scheduler.observe(50 * 1024)
+    assert scheduler.estimated_capacity == 4 * 1024 ** 2
+
+    # Only once the window is full of newer active intervals does it follow
+    scheduler.observe(50 * 1024)
+    assert scheduler.estimated_capacity == 50 * 1024
+
+
+def test_throughput_follows_recent_measurements_within_bounds(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'torrent_manager', StubBandwidth(
+        download_capacity=None, estimated_capacity=7 * 1024, estimate_age=1800.0))
+    assert app_module._client_throughput() is None
+
+    # Without a configured capacity a recent measurement stands in for it,
+    # but a slow swarm cannot drag it below the floor
+    monkeypatch.setattr(app_module, 'torrent_manager', StubBandwidth(
+        download_capacity=None, estimated_capacity=7 * 1024, estimate_age=5.0))
+    assert app_module._client_throughput() == app_module.THROUGHPUT_ESTIMATE_FLOOR
+
+    monkeypatch.setattr(app_module, 'torrent_manager', StubBandwidth(
+        download_capacity=None, estimated_capacity=3 * 1024 ** 2, estimate_age=5.0))
+    assert app_module._client_throughput() == 3 * 1024 ** 2
+
+    # A recent measurement above the configured capacity raises it; a stale one does not
+    monkeypatch.setattr(app_module, 'torrent_manager', StubBandwidth(
+        download_capacity=1024 ** 2, estimated_capacity=3 * 1024 ** 2, estimate_age=5.0))
+    assert app_module._client_throughput() == 3 * 1024 ** 2
+
+    monkeypatch.setattr(app_module, 'torrent_manager', StubBandwidth(
+        download_capacity=1024 ** 2, estimated_capacity=3 * 1024 ** 2, estimate_age=1800.0))
+    assert app_module._client_throughput() == 1024 ** 2
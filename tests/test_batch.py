@@ -0,0 +1,72 @@
+import time
+
+from conftest import make_movie
+
+
+def test_details_keep_request_order_with_missing_ids(scraper, yts_server):
+    yts_server.movies = [make_movie(i) for i in (1, 2, 3)]
+
+    movies = scraper.get_movie_details_many([3, 99, 1, 3])
+    assert [m['id'] if m else None for m in movies] == [3, None, 1, 3]
+    assert movies[1] is None
+    # The repeated id is fetched once
+    assert yts_server.count('/api/v2/movie_details.json') == 3
+
+
+def test_cached_details_are_served_without_going_upstream(scraper, yts_server):
+    yts_server.movies = [make_movie(i) for i in (1, 2)]
+    scraper.get_movie_details_many([1, 2])
+    fetched = yts_server.count('/api/v2/movie_details.json')
+
+    assert [m['id'] for m in scraper.get_movie_details_many([2, 1])] == [2, 1]
+    assert yts_server.count('/api/v2/movie_details.json') == fetched
+
+
+def test_timeout_returns_partial_results(scraper, yts_server):
+    yts_server.movies = [make_movie(i) for i in (1, 2, 3)]
+    scraper.get_movie_details(1)
+
+    yts_server.delay = 0.5
+    started = time.monotonic()
+    movies = scraper.get_movie_details_many([1, 2, 3], timeout=0.1)
+    assert time.monotonic() - started < 0.4
+    assert [m['id'] if m else None for m in movies] == [1, None, None]
+
+    # The slow fetches finish into the cache for the next request
+    yts_server.delay = 0
+    time.sleep(0.6)
+    fetched = yts_server.count('/api/v2/movie_details.json')
+    assert [m['id'] for m in scraper.get_movie_details_many([1, 2, 3])] == [1, 2, 3]
+    assert yts_server.count('/api/v2/movie_details.json') == fetched
+
+
+def test_movies_batch_endpoint(app_module, yts_server):
+    yts_server.movies = [make_movie(i) for i in (1, 2, 3)]
+    client = app_module.app.test_client()
+
+    data = client.get('/api/movies/batch?ids=2,99,1&fields=id,title').get_json()
+    assert data['movies'] == [{'id': 2, 'title': 'Movie 2'}, None, {'id': 1, 'title': 'Movie 1'}]
+    assert data['missing'] == [99]
+
+
+def test_torrents_batch_endpoint(app_module, yts_server):
+    yts_server.movies = [make_movie(i) for i in (1, 2)]
+    client = app_module.app.test_client()
+
+    data = client.get('/api/torrents/batch?ids=2,99,1').get_json()
+    assert [t['movie_id'] for t in data['torrents']] == [2, 99, 1]
+    assert data['torrents'][0]['torrent']['url'] == 'magnet:2'
+    assert data['torrents'][1]['torrent'] is None
+    assert data['torrents'][2]['torrent']['quality'] == '720p'
+
+
+def test_batch_endpoints_reject_bad_id_lists(app_module):
+    client = app_module.app.test_client()
+    too_many = ','.join(str(i) for i in range(1, app_module.MAX_BATCH_IDS + 2))
+    exactly = ','.join(str(i) for i in range(1, app_module.MAX_BATCH_IDS + 1))
+
+    for path in ('/api/movies/batch', '/api/torrents/batch'):
+        assert client.get(f'{path}?ids={too_many}').status_code == 400
+        assert client.get(f'{path}?ids=').status_code == 400
+        assert client.get(f'{path}?ids=1,x').status_code == 400
+    assert client.get(f'/api/movies/batch?ids={exactly}&timeout=0').status_code == 200
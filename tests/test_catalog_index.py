@@ -0,0 +1,121 @@
+from catalog_index import CatalogIndex, CatalogSyncer
+from conftest import make_movie
+
+
+def sync(scraper, index, **kwargs):
+    syncer = CatalogSyncer(scraper, index, page_size=2, page_delay=0, **kwargs)
+    syncer.sync_once()
+    return syncer
+
+
+def test_first_sync_walks_the_whole_catalog(scraper, yts_server, tmp_path):
+    yts_server.movies = [make_movie(i) for i in range(1, 6)]
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+
+    syncer = sync(scraper, index)
+
+    assert index.count() == 5
+    assert syncer.ready
+    assert yts_server.count('/api/v2/list_movies.json') == 3
+
+
+def test_incremental_sync_stops_at_known_entries(scraper, yts_server, tmp_path):
+    yts_server.movies = [make_movie(i) for i in range(1, 7)]
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    syncer = sync(scraper, index)
+    requests_before = yts_server.count('/api/v2/list_movies.json')
+
+    yts_server.movies.append(make_movie(7))
+    added = syncer.sync_once()
+
+    assert added == 1
+    assert index.get(7)['title'] == 'Movie 7'
+    # The page with the new entry, then one that is already fully known
+    assert yts_server.count('/api/v2/list_movies.json') - requests_before == 2
+
+
+def test_full_text_search_filters_and_sorts(tmp_path):
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    index.upsert([
+        {**make_movie(1, title='The Quiet Earth', rating=7.1, year=1985, genres=['Sci-Fi']),
+         'cast': [{'name': 'Bruno Lawrence'}]},
+        make_movie(2, title='Earthquake', rating=5.8, year=1974, genres=['Action']),
+        make_movie(3, title='Heat', rating=8.3, year=1995, genres=['Crime'])
+    ])
+
+    assert [m['id'] for m in index.search('quiet')] == [1]
+    assert [m['id'] for m in index.search('lawrence')] == [1]
+    # Terms match as prefixes
+    assert [m['id'] for m in index.search('earth', sort_by='rating')] == [1, 2]
+    assert [m['id'] for m in index.search(genre='Crime')] == [3]
+    assert [m['id'] for m in index.search(minimum_rating=7, sort_by='year')] == [3, 1]
+
+
+def test_popularity_sorts_are_not_answered_locally():
+    for sort_by in ('date_added', 'rating', 'year', 'title', 'runtime'):
+        assert CatalogIndex.can_sort(sort_by)
+    for sort_by in ('download_count', 'like_count', 'seeds', 'peers'):
+        assert not CatalogIndex.can_sort(sort_by)
+
+
+def test_listing_routes_unsupported_sorts_upstream(app_module, yts_server, tmp_path):
+    yts_server.movies = [make_movie(1, download_count=10), make_movie(2, download_count=5),
+                         make_movie(3, download_count=50)]
+    app_module.catalog_index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    app_module.catalog_syncer = sync(app_module.scraper, app_module.catalog_index)
+    client = app_module.app.test_client()
+    listed = yts_server.count('/api/v2/list_movies.json')
+
+    local = client.get('/api/movies?sort_by=rating').get_json()
+    assert yts_server.count('/api/v2/list_movies.json') == listed
+    assert [m['id'] for m in local['movies']] == [3, 2, 1]
+
+    popular = client.get('/api/movies?sort_by=download_count').get_json()
+    assert yts_server.count('/api/v2/list_movies.json') == listed + 1
+    assert [m['id'] for m in popular['movies']] == [3, 1, 2]
+
+
+def test_title_sort_matches_upstream(scraper, yts_server, tmp_path):
+    yts_server.movies = [make_movie(1, title='Alien'), make_movie(2, title='Zodiac'),
+                         make_movie(3, title='Heat')]
+    upstream = [m['id'] for m in scraper.get_movies(sort_by='title')]
+
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    index.upsert(yts_server.movies)
+    assert [m['id'] for m in index.search(sort_by='title')] == upstream == [2, 3, 1]
+
+
+def test_incremental_sync_refreshes_recent_and_periodically_all(scraper, yts_server, tmp_path):
+    yts_server.movies = [make_movie(i) for i in range(1, 7)]
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    syncer = sync(scraper, index, refresh_pages=2)
+
+    for movie in yts_server.movies:
+        movie['torrents'][0]['seeds'] = 99
+    syncer.sync_once()
+    # The first two pages are stored again even though nothing is new
+    assert index.get(6)['torrents'][0]['seeds'] == 99
+    assert index.get(4)['torrents'][0]['seeds'] == 99
+    assert index.get(1)['torrents'][0]['seeds'] == 10
+
+    syncer.full_refresh_interval = 0
+    syncer.sync_once()
+    assert index.get(1)['torrents'][0]['seeds'] == 99
+
+
+def test_only_one_worker_syncs_and_the_others_see_it_finish(app_module, scraper, yts_server, tmp_path):
+    lock = str(tmp_path / 'catalog.db.lock')
+    assert app_module._hold_lock(lock)
+    assert app_module._hold_lock(lock)
+    # Another worker opens the lock file separately and is refused
+    held = app_module._held_locks.pop(lock)
+    assert not app_module._hold_lock(lock)
+    held.close()
+
+    yts_server.movies = [make_movie(i) for i in range(1, 4)]
+    index = CatalogIndex(str(tmp_path / 'catalog.db'))
+    reader = CatalogSyncer(scraper, CatalogIndex(str(tmp_path / 'catalog.db')))
+    assert not reader.ready
+
+    sync(scraper, index)
+    assert reader.ready
@@ -0,0 +1,185 @@
+import os
+import struct
+import time
+
+import pytest
+
+from container_index import ContainerIndexCache, parse_container
+
+PIECE = 16 * 1024
+
+# Six video samples in three chunks of two; samples 1 and 4 are keyframes
+SAMPLE_SIZES = [20000, 7000, 9000, 15000, 8000, 6000]
+SAMPLE_DELTA = 500
+
+
+def box(box_type: bytes, payload: bytes, largesize: bool = False) -> bytes:
+    if largesize:
+        return struct.pack('>I4sQ', 1, box_type, len(payload) + 16) + payload
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+
+def full_box(box_type: bytes, payload: bytes) -> bytes:
+    return box(box_type, b'\0\0\0\0' + payload)
+
+
+def make_mp4(co64: bool = False, largesize: bool = False):
+    """
+    A small MP4 with its moov after mdat, and the (time, offset) of each keyframe
+    """
+    ftyp = box(b'ftyp', b'isom\0\0\0\0isom')
+    samples = os.urandom(sum(SAMPLE_SIZES))
+    mdat_start = len(ftyp) + 8
+
+    chunk_offsets = [mdat_start + sum(SAMPLE_SIZES[:i]) for i in (0, 2, 4)]
+    if co64:
+        offsets = full_box(b'co64', struct.pack('>I3Q', 3, *chunk_offsets))
+    else:
+        offsets = full_box(b'stco', struct.pack('>I3I', 3, *chunk_offsets))
+
+    stbl = box(b'stbl', b''.join([
+        full_box(b'stts', struct.pack('>III', 1, len(SAMPLE_SIZES), SAMPLE_DELTA)),
+        full_box(b'stsc', struct.pack('>IIII', 1, 1, 2, 1)),
+        full_box(b'stsz', struct.pack(f'>II{len(SAMPLE_SIZES)}I', 0, len(SAMPLE_SIZES), *SAMPLE_SIZES)),
+        full_box(b'stss', struct.pack('>III', 2, 1, 4)),
+        offsets
+    ]))
+    mdia = box(b'mdia', b''.join([
+        full_box(b'mdhd', struct.pack('>IIIIHH', 0, 0, 1000, SAMPLE_DELTA * len(SAMPLE_SIZES), 0, 0)),
+        full_box(b'hdlr', b'\0\0\0\0vide' + b'\0' * 12 + b'Video\0'),
+        box(b'minf', stbl)
+    ]))
+    moov = box(b'moov', box(b'trak', mdia), largesize=largesize)
+
+    keyframes = [(0.0, chunk_offsets[0]),
+                 (1.5, chunk_offsets[1] + SAMPLE_SIZES[2])]
+    return ftyp + box(b'mdat', samples) + moov, keyframes
+
+
+def ebml(element_id: int, payload: bytes) -> bytes:
+    # Element IDs keep their marker bits; sizes use the eight-byte form
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big')
+    return id_bytes + ((1 << 56) | len(payload)).to_bytes(8, 'big') + payload
+
+
+def uint(element_id: int, value: int) -> bytes:
+    return ebml(element_id, value.to_bytes(8, 'big'))
+
+
+def make_matroska():
+    """
+    A small Matroska file whose SeekHead points at Info and at Cues after
+    the clusters, and the (time, offset) of each cue
+    """
+    info = ebml(0x1549A966, uint(0x2AD7B1, 1000000) + ebml(0x4489, struct.pack('>d', 4000.0)))
+    clusters = [ebml(0x1F43B675, os.urandom(size)) for size in (30000, 25000)]
+
+    def seek_head(info_position, cues_position):
+        return ebml(0x114D9B74,
+                    ebml(0x4DBB, ebml(0x53AB, bytes.fromhex('1549A966')) + uint(0x53AC, info_position)) +
+                    ebml(0x4DBB, ebml(0x53AB, bytes.fromhex('1C53BB6B')) + uint(0x53AC, cues_position)))
+
+    # Positions are relative to the segment payload; the SeekHead's own
+    # length does not depend on the values written into it
+    info_position = len(seek_head(0, 0))
+    cluster_positions = [info_position + len(info),
+                         info_position + len(info) + len(clusters[0])]
+    cues_position = cluster_positions[1] + len(clusters[1])
+    cues = ebml(0x1C53BB6B, b''.join(
+        ebml(0xBB, uint(0xB3, cue_time) + ebml(0xB7, uint(0xF7, 1) + uint(0xF1, position)))
+        for cue_time, position in ((0, cluster_positions[0]), (2000, cluster_positions[1]))
+    ))
+    segment_payload = seek_head(info_position, cues_position) + info + b''.join(clusters) + cues
+
+    header = ebml(0x1A45DFA3, ebml(0x4282, b'matroska'))
+    segment = ebml(0x18538067, segment_payload)
+    segment_start = len(header) + len(segment) - len(segment_payload)
+    keyframes = [(0.0, segment_start + cluster_positions[0]),
+                 (2.0, segment_start + cluster_positions[1])]
+    return header + segment, keyframes
+
+
+def reader(data: bytes):
+    return lambda offset, length: data[offset:offset + length]
+
+
+@pytest.mark.parametrize('co64, largesize', [(False, False), (True, False), (False, True)])
+def test_mp4_keyframes_map_to_sample_offsets(co64, largesize):
+    data, keyframes = make_mp4(co64=co64, largesize=largesize)
+    index = parse_container(reader(data), len(data), 'movie.mp4')
+
+    assert index.container == 'mp4'
+    assert index.keyframes == keyframes
+    assert index.duration == 3.0
+    moov_offset = len(data) - index.index_range[1]
+    assert index.index_range == (moov_offset, len(data) - moov_offset)
+    assert index.seek(2.9) == keyframes[1]
+    assert index.seek(1.0) == keyframes[0]
+
+
+def test_matroska_keyframes_come_from_cues():
+    data, keyframes = make_matroska()
+    index = parse_container(reader(data), len(data), 'movie.mkv')
+
+    assert index.container == 'matroska'
+    assert index.keyframes == keyframes
+    assert index.duration == 4.0
+    assert data[index.index_range[0]:index.index_range[0] + 4] == bytes.fromhex('1C53BB6B')
+    assert index.index_range[0] + index.index_range[1] == len(data)
+    assert index.seek(3.0) == keyframes[1]
+
+
+@pytest.mark.parametrize('name, build', [('movie.mp4', make_mp4), ('movie.mkv', make_matroska)])
+def test_seek_prioritizes_the_keyframe_piece(tmp_path, name, build):
+    lt = pytest.importorskip('libtorrent')
+    from torrent_manager import TorrentManager
+
+    data, keyframes = build()
+    downloads = tmp_path / 'downloads'
+    (downloads / 'movie').mkdir(parents=True)
+    (downloads / 'movie' / name).write_bytes(data)
+    storage = lt.file_storage()
+    lt.add_files(storage, str(downloads / 'movie'))
+    creator = lt.create_torrent(storage, PIECE)
+    lt.set_piece_hashes(creator, str(downloads))
+    metadata = lt.bencode(creator.generate())
+    info_hash = str(lt.torrent_info(metadata).info_hash())
+
+    manager = TorrentManager(download_dir=str(downloads))
+    try:
+        manager.resume_store.save_torrent(info_hash, metadata)
+        torrent_id = manager.add_torrent(f'magnet:?xt=urn:btih:{info_hash}', info_hash=info_hash)
+        handle = manager.active_torrents[torrent_id]['handle']
+        deadline = time.monotonic() + 10
+        while not handle.status().is_seeding and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        time_at, offset = keyframes[1]
+        assert manager.seek(torrent_id, 'viewer', 0, time_at + 0.1) == {
+            'time': time_at, 'offset': offset, 'duration': manager.get_container_index(torrent_id, 0).duration
+        }
+        assert offset // PIECE > 0
+        assert manager.active_torrents[torrent_id]['readahead'].readers['viewer'].start == offset // PIECE
+    finally:
+        manager.cleanup(delete_files=True)
+
+
+
+def test_read_timeout_is_not_cached():
+    cache = ContainerIndexCache()
+
+    def timing_out(offset, length):
+        raise TimeoutError('piece not downloaded')
+
+    assert cache.get_or_build('a' * 40, 0, timing_out, 10 * 1024 ** 2, 'movie.mp4') is None
+    assert cache.get('a' * 40, 0) is None
+
+    # The next attempt builds again rather than hitting a cached failure
+    calls = []
+
+    def recording(offset, length):
+        calls.append(offset)
+        raise TimeoutError('still missing')
+
+    cache.get_or_build('a' * 40, 0, recording, 10 * 1024 ** 2, 'movie.mp4')
+    assert calls
@@ -0,0 +1,48 @@
+import os
+import time
+
+from disk_cache import DiskCache
+
+
+def write(root, name, size):
+    path = os.path.join(root, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return name
+
+
+def test_least_recently_watched_unpinned_torrents_are_evicted(tmp_path):
+    root = str(tmp_path)
+    cache = DiskCache(root, budget_bytes=450 * 1024)
+    for info_hash in ('old', 'pinned', 'new'):
+        cache.record(info_hash, [write(root, f'{info_hash}/video.mp4', 200 * 1024)])
+        time.sleep(0.01)
+    cache.touch('new')
+    cache.pin('pinned')
+
+    assert cache.enforce_budget() == ['old']
+    assert not os.path.exists(os.path.join(root, 'old/video.mp4'))
+    assert cache.enforce_budget(busy=['new']) == []
+    assert cache.contains('pinned') and cache.contains('new')
+
+
+def test_cache_index_survives_a_restart(tmp_path):
+    root = str(tmp_path)
+    cache = DiskCache(root, budget_bytes=1024 ** 2)
+    cache.record('abc', [write(root, 'abc/video.mkv', 4096)])
+    cache.save()
+
+    assert DiskCache(root, budget_bytes=1024 ** 2).cached_torrents() == ['abc']
+
+
+def test_eviction_drops_fast_resume_data(manager):
+    root = manager.download_dir
+    info_hash = 'ab' * 20
+    manager.disk_cache.record(info_hash, [write(root, 'movie/video.mp4', 2 * 1024 ** 2)])
+    manager.resume_store.save_resume(info_hash, b'd4:infoe')
+    manager.resume_store.save_torrent(info_hash, b'd4:infoe')
+
+    assert manager._enforce_cache_budget() == [info_hash]
+    assert manager.resume_store.load_resume(info_hash) is None
+    assert manager.resume_store.has_torrent(info_hash)
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+
+from engine_client import EngineClient, EngineError
+from engine_server import EngineServer
+from offload import native_thread
+from torrent_status import TorrentSnapshot
+
+
+class StubManager:
+    """
+    Stands in for TorrentManager inside the engine process: one torrent
+    whose file bytes and status are set by the test
+    """
+
+    def __init__(self):
+        self.data = bytes(range(256)) * 16
+        self.progress = 0.0
+        self.files = ()
+        self.viewers = {}
+
+    def add_torrent(self, torrent_url, callback, viewer_id='default', info_hash=None):
+        self.viewers.setdefault('stub', set()).add(viewer_id)
+        return 'stub'
+
+    def release_torrent(self, torrent_id, viewer_id='default', delete_files=False):
+        self.viewers.get(torrent_id, set()).discard(viewer_id)
+        return True
+
+    def get_viewer_count(self, torrent_id):
+        return len(self.viewers.get(torrent_id, ()))
+
+    def get_torrent_status(self, torrent_id):
+        if torrent_id != 'stub':
+            return None
+        return TorrentSnapshot('stub', 'downloading', self.progress, 0, 0, 1,
+                               self.get_viewer_count('stub'), 4, 1024, (0, 4), self.files)
+
+    def read_range(self, torrent_id, file_index, offset, length, timeout=60.0):
+        if offset >= len(self.data):
+            raise TimeoutError('piece not downloaded')
+        return self.data[offset:offset + length]
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def engine(tmp_path):
+    manager = StubManager()
+    server = EngineServer(manager, str(tmp_path / 'engine.sock'))
+    native_thread(server.serve_forever, name='stub-engine').start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def make_client(engine):
+    def make():
+        client = EngineClient(engine.socket_path, connect_timeout=2)
+        client.POLL_INTERVAL = 0.05
+        return client
+    return make
+
+
+def test_sessions_are_shared_between_workers(make_client):
+    first, second = make_client(), make_client()
+
+    first.update_session('s1', current_torrent_id='stub', status='downloading')
+    record = second.get_session('s1')
+    assert record['current_torrent_id'] == 'stub'
+    assert record['status'] == 'downloading'
+
+    second.update_session('s1', status='ready_to_play')
+    assert first.get_session('s1')['status'] == 'ready_to_play'
+    assert first.delete_session('s1')
+    assert second.get_session('s1') is None
+
+
+def test_invalid_session_fields_are_rejected(make_client):
+    with pytest.raises(EngineError, match='Unknown session fields'):
+        make_client().update_session('s1', download_progress=50)
+
+
+def test_read_range_returns_raw_bytes(engine, make_client):
+    client = make_client()
+    assert client.read_range('stub', 0, 10, 100) == engine.manager.data[10:110]
+
+    # The connection stays usable after an error response
+    with pytest.raises(EngineError, match='TimeoutError'):
+        client.read_range('stub', 0, 10 ** 6, 10)
+    assert client.read_range('stub', 0, 0, 4) == engine.manager.data[:4]
+
+
+def test_failed_calls_fall_back_to_defaults(make_client):
+    client = make_client()
+    assert client.call('ping') == 'pong'
+    with pytest.raises(EngineError, match='Unknown op'):
+        client.call('no_such_op')
+    assert client.get_torrent_status('missing') is None
+
+
+def test_poller_drives_progress_callbacks_and_listeners(engine, make_client):
+    client = make_client()
+    progress, events = [], []
+    torrent_id = client.add_torrent('magnet:?xt=urn:btih:stub', lambda tid, info: progress.append(info),
+                                    viewer_id='s1')
+    client.add_listener(torrent_id, lambda tid, event, info: events.append(event))
+
+    engine.manager.progress = 42.0
+    engine.manager.files = (('movie.mkv', 4096, 4),)
+    assert wait_for(lambda: progress and progress[-1]['progress'] == 42.0)
+    assert wait_for(lambda: 'metadata' in events)
+    assert client.get_torrent_status(torrent_id).files == (('movie.mkv', 4096, 4),)
+
+    client.release_torrent(torrent_id, 's1')
+    assert engine.manager.get_viewer_count(torrent_id) == 0
@@ -0,0 +1,79 @@
+import json
+import os
+import stat
+import struct
+
+from hls_remux import CUT_MARGIN, HLSRemuxer
+
+PROBE = {
+    'format': {'duration': '31.0'},
+    'streams': [{'codec_type': 'video', 'codec_name': 'h264'},
+                {'codec_type': 'audio', 'codec_name': 'aac'}]
+}
+
+
+def box(kind: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def fake_tool(path, script: str) -> str:
+    path.write_text('#!/usr/bin/env python3\n' + script)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def make_remuxer(tmp_path):
+    """Remuxer whose ffprobe reports PROBE and whose ffmpeg logs its argv"""
+    log = tmp_path / 'ffmpeg.log'
+    output = box(b'ftyp') + box(b'moov') + box(b'moof') + box(b'mdat', b'x')
+    ffprobe = fake_tool(tmp_path / 'ffprobe', f"print({json.dumps(json.dumps(PROBE))})\n")
+    ffmpeg = fake_tool(tmp_path / 'ffmpeg', (
+        "import json, sys\n"
+        f"open({str(log)!r}, 'a').write(json.dumps(sys.argv[1:]) + '\\n')\n"
+        f"sys.stdout.buffer.write({output!r})\n"
+    ))
+    remuxer = HLSRemuxer(str(tmp_path / 'cache'), 1024 ** 2, segment_seconds=6.0,
+                         ffmpeg=ffmpeg, ffprobe=ffprobe)
+    return remuxer, log
+
+
+def test_copied_segments_start_on_keyframes(tmp_path):
+    remuxer, _ = make_remuxer(tmp_path)
+    keyframes = [0.0, 2.5, 5.0, 7.5, 10.0, 12.5, 15.0, 17.5, 20.0, 22.5, 25.0, 27.5, 30.0]
+    info = remuxer.probe('movie', 'movie.mkv', lambda: keyframes)
+
+    assert info['copy_video']
+    assert info['starts'] == [0.0, 7.5, 15.0, 22.5, 30.0]
+    assert [remuxer.segment_bounds(info, i)[1] for i in range(5)] == [7.5, 7.5, 7.5, 7.5, 1.0]
+
+    playlist = remuxer.playlist(info, 5, True)
+    assert '#EXT-X-TARGETDURATION:8' in playlist
+    assert playlist.count('#EXTINF:7.500,') == 4
+    assert '#EXTINF:1.000,' in playlist
+
+
+def test_copied_segment_is_cut_between_its_keyframes(tmp_path):
+    remuxer, log = make_remuxer(tmp_path)
+    remuxer.probe('movie', 'movie.mkv', lambda: [0.0, 3.0, 6.2, 9.1, 12.4])
+
+    remuxer.segment('movie', 'movie.mkv', 1)
+    argv = json.loads(log.read_text().splitlines()[-1])
+    assert argv[argv.index('-c:v') + 1] == 'copy'
+    assert argv[argv.index('-ss') + 1] == f'{6.2 + CUT_MARGIN:.6f}'
+    assert argv[argv.index('-to') + 1] == f'{12.4 - CUT_MARGIN:.6f}'
+    assert argv.index('-to') < argv.index('-i')
+    assert os.path.exists(os.path.join(remuxer.cache_dir, 'movie', 'init.mp4'))
+
+
+def test_without_an_index_the_video_is_reencoded_on_a_grid(tmp_path):
+    remuxer, log = make_remuxer(tmp_path)
+    info = remuxer.probe('movie', 'movie.avi', lambda: None)
+
+    assert not info['copy_video']
+    assert info['starts'] == [0.0, 6.0, 12.0, 18.0, 24.0, 30.0]
+
+    remuxer.segment('movie', 'movie.avi', 2)
+    argv = json.loads(log.read_text().splitlines()[-1])
+    assert argv[argv.index('-c:v') + 1] == 'libx264'
+    assert argv[argv.index('-ss') + 1] == '12.000000'
+    assert argv[argv.index('-to') + 1] == '18.000000'
@@ -0,0 +1,121 @@
+import gzip
+
+import brotli
+
+import http_cache
+from conftest import make_movie
+from http_cache import parse_fields, project
+from response_cache import ResponseCache
+
+
+def test_parse_fields_expands_aliases_once():
+    assert parse_fields(None) is None
+    assert parse_fields('') is None
+    assert parse_fields(' , ') is None
+    assert parse_fields('id, cover,,id,title') == ['id', 'medium_cover_image', 'title']
+    assert parse_fields('images') == ['background_image', 'medium_cover_image', 'large_cover_image']
+
+
+def test_project_keeps_requested_keys_and_missing_items():
+    items = [{'id': 1, 'title': 'A', 'year': 2000}, None, {'id': 2}]
+    assert project(items, ['id', 'title']) == [{'id': 1, 'title': 'A'}, None, {'id': 2}]
+    assert project(items, None) == items
+
+
+def test_fields_projection_on_the_listing(app_module, yts_server):
+    yts_server.movies = [make_movie(1, medium_cover_image='/c1.jpg')]
+    client = app_module.app.test_client()
+
+    data = client.get('/api/movies?fields=id,cover').get_json()
+    assert data['movies'] == [{'id': 1, 'medium_cover_image': '/c1.jpg'}]
+
+
+def test_matching_etag_gets_304(app_module, yts_server):
+    yts_server.movies = [make_movie(1)]
+    client = app_module.app.test_client()
+
+    first = client.get('/api/movie/1')
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+
+    again = client.get('/api/movie/1', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert client.get('/api/movie/1', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_etag_comes_from_the_cache_entry(app_module, yts_server, monkeypatch):
+    yts_server.movies = [make_movie(1), make_movie(2)]
+    client = app_module.app.test_client()
+    first = client.get('/api/movies/batch?ids=1,2').headers['ETag']
+
+    # Served from the cache, the stored hashes tag the response; the body
+    # is never hashed
+    def no_body_hashing(*args, **kwargs):
+        raise AssertionError('body hashed')
+
+    monkeypatch.setattr(http_cache.hashlib, 'blake2b', no_body_hashing)
+    monkeypatch.setattr(http_cache, 'payload_etag', lambda *parts: '|'.join(parts))
+    monkeypatch.setattr(app_module, 'payload_etag', http_cache.payload_etag)
+    tagged = client.get('/api/movies/batch?ids=1,2&fields=id')
+    assert tagged.status_code == 200
+    assert tagged.headers['ETag'].strip('"').startswith('movies/batch|id|')
+    monkeypatch.undo()
+
+    # Different projections and changed entries are different payloads
+    assert client.get('/api/movies/batch?ids=1,2&fields=id').headers['ETag'] != first
+    app_module.scraper.cache.clear()
+    yts_server.movies[0]['title'] = 'Renamed'
+    assert client.get('/api/movies/batch?ids=1,2').headers['ETag'] != first
+
+
+def test_cache_etag_follows_the_stored_value():
+    cache = ResponseCache()
+    value = {'a': 1}
+    cache.set('k', value, ttl=60)
+    tag = cache.etag(value)
+    assert tag
+
+    cache.set('k', {'a': 1}, ttl=60)
+    assert cache.etag(value) is None
+    assert cache.etag(cache.get('k')[0]) == tag
+    assert cache.etag({'a': 1}) is None
+
+
+def test_compression_is_negotiated(app_module, yts_server):
+    yts_server.movies = [make_movie(i) for i in range(1, 21)]
+    client = app_module.app.test_client()
+    plain = client.get('/api/movies?limit=20')
+    assert plain.headers.get('Content-Encoding') is None
+    assert len(plain.data) >= http_cache.MIN_COMPRESS_BYTES
+
+    br = client.get('/api/movies?limit=20', headers={'Accept-Encoding': 'gzip, br'})
+    assert br.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(br.data) == plain.data
+    assert 'Accept-Encoding' in br.headers['Vary']
+
+    gz = client.get('/api/movies?limit=20', headers={'Accept-Encoding': 'br;q=0, gzip'})
+    assert gz.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gz.data) == plain.data
+
+    # Each encoding is its own representation
+    assert len({plain.headers['ETag'], br.headers['ETag'], gz.headers['ETag']}) == 3
+
+    # Small bodies go out as they are
+    small = client.get('/api/movie/1', headers={'Accept-Encoding': 'gzip'})
+    assert small.headers.get('Content-Encoding') is None
+
+
+def test_cache_control_per_route(app_module, yts_server):
+    yts_server.movies = [make_movie(1)]
+    client = app_module.app.test_client()
+
+    assert client.get('/api/movies').headers['Cache-Control'] == app_module.ROUTE_CACHE_CONTROL['get_movies']
+    assert client.get('/api/movie/1').headers['Cache-Control'] == \
+        app_module.ROUTE_CACHE_CONTROL['get_movie_details']
+    assert client.get('/api/cache/stats').headers['Cache-Control'] == 'no-store'
+
+    # Errors are never cached publicly
+    rejected = client.get('/api/movies/batch?ids=')
+    assert rejected.status_code == 400
+    assert 'Cache-Control' not in rejected.headers
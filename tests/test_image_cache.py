@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from conftest import make_movie
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def make_jpeg(width: int = 1000, height: int = 1500) -> bytes:
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(output, 'JPEG', quality=95)
+    return output.getvalue()
+
+
+@pytest.fixture
+def poster_app(app_module, yts_server):
+    yts_server.images['7.jpg'] = make_jpeg()
+    yts_server.movies = [make_movie(7, large_cover_image=f'{yts_server.url}/images/7.jpg')]
+    return app_module
+
+
+def test_poster_is_resized_once_and_cached_immutably(poster_app, yts_server):
+    client = poster_app.app.test_client()
+
+    first = client.get('/img/7/small', headers={'Accept': 'image/webp'})
+    assert first.status_code == 200
+    assert first.mimetype == 'image/webp'
+    assert Image.open(io.BytesIO(first.data)).width == 160
+    assert first.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert 'Accept' in first.headers['Vary']
+
+    again = client.get('/img/7/small', headers={'Accept': 'image/webp'})
+    assert again.data == first.data
+    assert yts_server.count('/images/7.jpg') == 1
+
+    revalidated = client.get('/img/7/small', headers={'Accept': 'image/webp',
+                                                      'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+
+def test_only_sent_bodies_count_towards_bytes_served(poster_app):
+    client = poster_app.app.test_client()
+    first = client.get('/img/7/medium')
+    assert first.mimetype == 'image/jpeg'
+
+    client.get('/img/7/medium', headers={'If-None-Match': first.headers['ETag']})
+    client.head('/img/7/medium')
+
+    stats = poster_app.image_cache.stats()
+    assert stats['misses'] == 1 and stats['hits'] == 2
+    assert stats['bytes_served'] == len(first.data)
+    assert stats['bytes_saved'] == len(make_jpeg()) - len(first.data)
+
+
+def test_unknown_size_and_missing_poster(poster_app, yts_server):
+    client = poster_app.app.test_client()
+    assert client.get('/img/7/huge').status_code == 404
+
+    yts_server.movies.append(make_movie(8))
+    assert client.get('/img/8/small').status_code == 404
@@ -0,0 +1,40 @@
+import threading
+import time
+
+import pytest
+
+from offload import poll_until
+
+eventlet = pytest.importorskip('eventlet')
+
+
+def test_green_waits_leave_the_hub_and_pool_free(monkeypatch):
+    from eventlet import tpool
+    monkeypatch.setattr(tpool, 'execute', lambda *args, **kwargs: pytest.fail('used the pool'))
+
+    arrived = threading.Event()
+    ticks = []
+
+    def ticker():
+        while not arrived.is_set():
+            ticks.append(time.monotonic())
+            eventlet.sleep(0.01)
+
+    def deliver():
+        eventlet.sleep(0.3)
+        arrived.set()
+
+    eventlet.spawn(ticker)
+    eventlet.spawn(deliver)
+    waiter = eventlet.spawn(poll_until, arrived.is_set, 5.0, interval=0.02)
+    assert waiter.wait() is True
+    # Other green threads kept running throughout the wait
+    assert len(ticks) > 10
+
+
+def test_gives_up_when_the_source_goes_away():
+    started = time.monotonic()
+    waiter = eventlet.spawn(poll_until, lambda: False, 5.0, alive=lambda: False)
+    assert waiter.wait() is False
+    assert time.monotonic() - started < 1.0
+    assert poll_until(lambda: False, 0.05, interval=0.01) is False
@@ -0,0 +1,171 @@
+import os
+import time
+
+import pytest
+
+from piece_window import PieceWindow
+
+PIECE = 64 * 1024
+
+
+class SyntheticSource:
+    """
+    Stands in for the swarm: every piece a window asks for arrives at once,
+    and held pieces are evicted exactly as the torrent manager would
+    """
+
+    def __init__(self, window: PieceWindow):
+        self.window = window
+        self.held = set()
+        self.fetched = 0
+
+    def tick(self, ahead: int = 8):
+        wanted = self.window.wanted(ahead)
+        new = wanted - self.held
+        self.fetched += len(new)
+        self.held |= new
+        for piece in self.window.evictions(sorted(self.held), wanted):
+            self.held.discard(piece)
+            self.window.record_eviction()
+        return wanted
+
+
+def test_sequential_playback_stays_within_budget():
+    window = PieceWindow(num_pieces=200, piece_length=PIECE, budget_bytes=16 * PIECE)
+    window.pin([0, 1, 199])
+    source = SyntheticSource(window)
+
+    for piece in range(200):
+        window.set_reader('viewer', piece)
+        source.tick()
+        assert len(source.held) <= window.capacity
+        assert {0, 1, 199, piece} <= source.held
+
+    # Every piece was fetched once: nothing evicted was wanted again
+    assert source.fetched == 200
+    assert window.stats()['evicted_pieces'] == 200 - window.capacity
+
+
+def test_backward_seek_refetches_only_the_new_window():
+    window = PieceWindow(num_pieces=200, piece_length=PIECE, budget_bytes=16 * PIECE)
+    source = SyntheticSource(window)
+    for piece in range(150):
+        window.set_reader('viewer', piece)
+        source.tick()
+
+    fetched = source.fetched
+    window.set_reader('viewer', 20)
+    wanted = source.tick()
+    assert set(range(20, 28)) <= source.held
+    assert source.fetched - fetched == len(wanted - set(range(140, 158)))
+    assert len(source.held) <= window.capacity
+
+
+def test_readers_share_the_budget():
+    window = PieceWindow(num_pieces=400, piece_length=PIECE, budget_bytes=20 * PIECE, behind_pieces=2)
+    source = SyntheticSource(window)
+    window.set_reader('a', 10)
+    window.set_reader('b', 300)
+    wanted = source.tick(ahead=32)
+
+    assert len(wanted) <= window.capacity
+    assert 10 in wanted and 300 in wanted
+    assert abs(len([p for p in wanted if p < 200]) - len([p for p in wanted if p >= 200])) <= 1
+
+    window.remove_reader('b')
+    assert all(p < 200 for p in source.tick(ahead=32))
+
+
+def streaming_only_torrent(tmp_path, monkeypatch):
+    """
+    A streaming-only TorrentManager with an 8-piece budget, and the id of a
+    32-piece torrent whose whole file is already on disk
+    """
+    lt = pytest.importorskip('libtorrent')
+    from torrent_manager import TorrentManager
+
+    # A local copy of the whole file is the piece source
+    downloads = tmp_path / 'downloads'
+    (downloads / 'movie').mkdir(parents=True)
+    (downloads / 'movie' / 'movie.mp4').write_bytes(os.urandom(32 * PIECE))
+    storage = lt.file_storage()
+    lt.add_files(storage, str(downloads / 'movie'))
+    creator = lt.create_torrent(storage, PIECE)
+    lt.set_piece_hashes(creator, str(downloads))
+    metadata = lt.bencode(creator.generate())
+    info_hash = str(lt.torrent_info(metadata).info_hash())
+
+    # Pin one piece at each end so most of the file is evictable
+    monkeypatch.setattr(TorrentManager, 'STARTUP_BUFFER_BYTES', PIECE)
+    monkeypatch.setattr(TorrentManager, 'INDEX_TAIL_BYTES', PIECE)
+    manager = TorrentManager(download_dir=str(downloads), window_budget=8 * PIECE)
+    manager.resume_store.save_torrent(info_hash, metadata)
+    return manager, manager.add_torrent(f'magnet:?xt=urn:btih:{info_hash}', info_hash=info_hash)
+
+
+def test_discarded_pieces_are_forgotten_without_a_recheck(tmp_path, monkeypatch):
+    lt = pytest.importorskip('libtorrent')
+    manager, torrent_id = streaming_only_torrent(tmp_path, monkeypatch)
+    try:
+        info = manager.active_torrents[torrent_id]
+
+        # The check finds every piece on disk; all but the budget is released
+        deadline = time.monotonic() + 10
+        while (not info['discarded'] or sum(info['have']) > info['window'].capacity) \
+                and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sum(info['have']) <= info['window'].capacity
+        assert info['handle'].upload_limit() == manager.WINDOW_UPLOAD_LIMIT
+        discarded = set(info['discarded'])
+        old_handle = info['handle']
+
+        # Seeking back into them has libtorrent forget them, not recheck
+        manager.update_playhead(torrent_id, 'viewer', 0, min(discarded) * PIECE)
+        deadline = time.monotonic() + 10
+        while info['handle'] == old_handle and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        handle = info['handle']
+        assert handle != old_handle
+        assert handle.status().state != lt.torrent_status.checking_files
+        assert not any(handle.have_piece(piece) for piece in discarded)
+        assert handle.upload_limit() == manager.WINDOW_UPLOAD_LIMIT
+        assert info['readahead'].handle == handle
+
+        # Needing a discarded piece again straight away does not re-add (and
+        # drop every peer) again
+        deadline = time.monotonic() + 10
+        while info['wanted'] is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        info['discarded'].add(min(info['wanted']))
+        manager.update_playhead(torrent_id, 'viewer', 0, min(discarded) * PIECE)
+        time.sleep(0.5)
+        assert info['handle'] == handle
+        assert not info['refetching']
+    finally:
+        manager.cleanup(delete_files=True)
+
+
+def test_streaming_only_mode_is_dropped_where_storage_cannot_be_released(tmp_path, monkeypatch):
+    pytest.importorskip('libtorrent')
+    import torrent_manager
+
+    monkeypatch.setattr(torrent_manager, 'release_bytes', lambda path, offset, length: False)
+    manager, torrent_id = streaming_only_torrent(tmp_path, monkeypatch)
+    try:
+        info = manager.active_torrents[torrent_id]
+        window = info['window']
+
+        # The check finds every piece; the first eviction fails and the
+        # torrent goes back to keeping everything
+        deadline = time.monotonic() + 10
+        while (info['window'] or not all(info['have'])) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert info['window'] is None
+        assert not info['discarded']
+        assert all(info['have'])
+        assert window.stats()['evicted_pieces'] == 0
+        assert info['handle'].upload_limit() != manager.WINDOW_UPLOAD_LIMIT
+        assert manager.get_window_stats() == {}
+    finally:
+        manager.cleanup(delete_files=True)
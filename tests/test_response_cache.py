@@ -0,0 +1,107 @@
+import time
+
+from conftest import make_movie
+from response_cache import ResponseCache
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_repeated_listing_is_served_from_cache(scraper, yts_server):
+    yts_server.movies = [make_movie(i) for i in range(1, 6)]
+
+    first = scraper.get_movies(limit=5)
+    second = scraper.get_movies(limit=5)
+
+    assert [m['id'] for m in first] == [5, 4, 3, 2, 1]
+    assert second == first
+    assert yts_server.count('/api/v2/list_movies.json') == 1
+    stats = scraper.cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_details_are_cached_per_movie(scraper, yts_server):
+    yts_server.movies = [make_movie(1), make_movie(2)]
+
+    assert scraper.get_movie_details(1)['title'] == 'Movie 1'
+    assert scraper.get_movie_details(1)['title'] == 'Movie 1'
+    assert scraper.get_movie_details(2)['title'] == 'Movie 2'
+    assert yts_server.count('/api/v2/movie_details.json') == 2
+
+
+def test_stale_entry_is_served_while_refreshing(scraper, yts_server):
+    scraper.CACHE_TTLS = {**scraper.CACHE_TTLS, 'list': (0.05, 60)}
+    yts_server.movies = [make_movie(1)]
+    scraper.get_movies(limit=5)
+
+    time.sleep(0.1)
+    yts_server.movies = [make_movie(1), make_movie(2)]
+    yts_server.delay = 0.3
+    started = time.monotonic()
+    stale = scraper.get_movies(limit=5)
+
+    # The stale copy comes back without waiting on the slow upstream
+    assert time.monotonic() - started < 0.2
+    assert [m['id'] for m in stale] == [1]
+    assert scraper.cache_stats()['stale_hits'] == 1
+
+    assert wait_for(lambda: [m['id'] for m in scraper.get_movies(limit=5)] == [2, 1])
+    assert yts_server.count('/api/v2/list_movies.json') == 2
+
+
+def test_expired_entry_is_fetched_again(scraper, yts_server):
+    scraper.CACHE_TTLS = {**scraper.CACHE_TTLS, 'details': (0.05, 0)}
+    yts_server.movies = [make_movie(1)]
+
+    scraper.get_movie_details(1)
+    time.sleep(0.1)
+    scraper.get_movie_details(1)
+    assert yts_server.count('/api/v2/movie_details.json') == 2
+
+
+def test_upstream_errors_are_not_cached(scraper, yts_server):
+    scraper.base_url = yts_server.url + '/missing'
+    assert scraper.get_movies() == []
+
+    scraper.base_url = yts_server.url
+    yts_server.movies = [make_movie(1)]
+    assert [m['id'] for m in scraper.get_movies()] == [1]
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == (1, True)
+    assert cache.get('c') == (3, True)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResponseCache(max_entries=100, max_bytes=250)
+    for key in range(5):
+        cache.set(key, 'x' * 100, ttl=60)
+
+    stats = cache.stats()
+    assert stats['bytes'] <= 250
+    assert stats['entries'] == 2
+    assert cache.get(4) is not None
+    assert cache.get(0) is None
+
+
+def test_oversized_values_are_not_stored():
+    cache = ResponseCache(max_bytes=10)
+    cache.set('big', 'x' * 100, ttl=60)
+    assert cache.get('big') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,47 @@
+def _progress_events(client):
+    return [e['args'][0] for e in client.get_received() if e['name'] == 'torrent_progress']
+
+
+def test_switching_sessions_sends_a_full_snapshot(app_module):
+    app_module.session_store.update_session('a', current_torrent_id='torrent-a', status='downloading')
+    app_module.session_store.update_session('b', current_torrent_id='torrent-b', status='downloading')
+    app_module.progress_fanout.publish('torrent:torrent-b', 'torrent_progress',
+                                       {'torrent_id': 'torrent-b', 'progress': 55.0})
+    app_module.progress_fanout.flush(now=1e9)
+
+    client = app_module.socketio.test_client(app_module.app)
+    client.emit('join_session', {'session_id': 'a'})
+    assert _progress_events(client) == [{'torrent_id': 'torrent-a', 'progress': 0.0,
+                                         'status': 'downloading', 'download_rate': 0, 'peers': 0}]
+
+    client.emit('join_session', {'session_id': 'b'})
+    snapshot, = _progress_events(client)
+    assert snapshot['torrent_id'] == 'torrent-b'
+    assert snapshot['progress'] == 55.0
+
+    # Only the new session's torrent reaches the client from now on
+    app_module.progress_fanout.publish('torrent:torrent-a', 'torrent_progress', {'progress': 11})
+    app_module.progress_fanout.publish('torrent:torrent-b', 'torrent_progress', {'progress': 56})
+    app_module.progress_fanout.flush(now=2e9)
+    assert [e.get('progress') for e in _progress_events(client)] == [56]
+    client.disconnect()
+
+
+def test_torrent_switch_asks_clients_to_rejoin(app_module):
+    client = app_module.socketio.test_client(app_module.app)
+    client.emit('join_session', {'session_id': 'a'})
+    client.get_received()
+
+    app_module.session_store.update_session('a', current_torrent_id='torrent-a')
+    app_module._notify_session_torrent('a', None, 'torrent-a')
+    events = client.get_received()
+    assert [e['name'] for e in events] == ['session_torrent']
+    assert events[0]['args'][0] == {'session_id': 'a', 'torrent_id': 'torrent-a'}
+
+    # Rejoining moves the client into the torrent's room
+    client.emit('join_session', {'session_id': 'a'})
+    client.get_received()
+    app_module.progress_fanout.publish('torrent:torrent-a', 'torrent_progress', {'progress': 3})
+    app_module.progress_fanout.flush(now=1e9)
+    assert [e['args'][0].get('progress') for e in client.get_received()] == [3]
+    client.disconnect()
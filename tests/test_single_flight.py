@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from conftest import make_movie
+from single_flight import SingleFlight
+
+
+def run_together(count, fn):
+    """Call fn from count threads released at once; returns results or exceptions"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_calls_reach_upstream_once(scraper, yts_server):
+    yts_server.movies = [make_movie(1)]
+    yts_server.delay = 0.3
+
+    results = run_together(10, lambda: scraper.get_movie_details(1))
+
+    assert all(r['title'] == 'Movie 1' for r in results)
+    assert yts_server.count('/api/v2/movie_details.json') == 1
+    assert scraper.cache_stats()['coalesced'] == 9
+
+
+def test_upstream_failure_reaches_every_waiter_and_is_not_cached(scraper, yts_server):
+    scraper.base_url = yts_server.url + '/missing'
+    yts_server.delay = 0.3
+
+    assert run_together(5, lambda: scraper.get_movie_details(1)) == [None] * 5
+    assert yts_server.count('/missing/api/v2/movie_details.json') == 1
+
+    scraper.base_url = yts_server.url
+    yts_server.delay = 0.0
+    yts_server.movies = [make_movie(1)]
+    assert scraper.get_movie_details(1)['title'] == 'Movie 1'
+
+
+def test_exception_is_raised_in_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('upstream down')
+
+    leader = threading.Thread(target=lambda: pytest.raises(ValueError, flight.do, 'k', failing))
+    leader.start()
+    while not flight.in_flight():
+        time.sleep(0.01)
+
+    errors = []
+
+    def waiter():
+        try:
+            flight.do('k', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    waiters = [threading.Thread(target=waiter) for _ in range(4)]
+    for thread in waiters:
+        thread.start()
+    while flight.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join()
+
+    assert len(errors) == 4 and len(calls) == 1
+    assert flight.in_flight() == 0
+    # The failure is not remembered: the next call runs again
+    assert flight.do('k', lambda: 'ok') == 'ok'
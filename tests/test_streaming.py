@@ -0,0 +1,103 @@
+import os
+import socket
+from wsgiref.util import FileWrapper
+
+import pytest
+
+from streaming import (RangeNotSatisfiable, iter_complete_range, iter_file_range,
+                       parse_range_header)
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    path.write_bytes(bytes(range(256)) * 4096)
+    return str(path)
+
+
+def test_parse_range_header():
+    assert parse_range_header(None, 100) is None
+    assert parse_range_header('bytes=10-19', 100) == (10, 19)
+    assert parse_range_header('bytes=90-', 100) == (90, 99)
+    assert parse_range_header('bytes=-5', 100) == (95, 99)
+    assert parse_range_header('bytes=0-500', 100) == (0, 99)
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header('bytes=100-', 100)
+
+
+def test_file_wrapper_close_runs_cleanup_once(video):
+    closed = []
+    body = iter_complete_range({'wsgi.file_wrapper': FileWrapper}, video, 1000, 1999,
+                               on_close=lambda: closed.append(True))
+
+    # sendfile needs the real descriptor, positioned at the range start
+    assert body.filelike.fileno() > 0
+    assert body.filelike.tell() == 1000
+    assert next(iter(body))[:3] == bytes([1000 % 256, 1001 % 256, 1002 % 256])
+
+    body.close()
+    body.close()
+    assert closed == [True]
+
+
+def test_copied_range_runs_cleanup_on_disconnect(video):
+    closed = []
+    body = iter_complete_range({}, video, 0, 3 * 1024 ** 2 - 1, on_close=lambda: closed.append(True))
+    next(body)
+    body.close()
+    assert closed == [True]
+
+
+def test_chunked_range_runs_cleanup_on_every_exit(video):
+    closed = []
+    body = iter_file_range(video, 0, 1024 ** 2 - 1, lambda offset, length: True,
+                           chunk_size=64 * 1024, on_close=lambda: closed.append('disconnect'))
+    next(body)
+    body.close()
+
+    # A piece wait that times out ends the stream early
+    body = iter_file_range(video, 0, 1024 ** 2 - 1, lambda offset, length: offset == 0,
+                           chunk_size=64 * 1024, on_close=lambda: closed.append('timeout'))
+    assert len(b''.join(body)) == 64 * 1024
+    assert closed == ['disconnect', 'timeout']
+
+
+def test_only_bytes_the_server_took_are_counted(video):
+    sent = []
+    body = iter_file_range(video, 0, 1024 ** 2 - 1, lambda offset, length: True,
+                           chunk_size=64 * 1024, on_sent=sent.append)
+    next(body)
+    next(body)
+    body.close()
+    # The second chunk was handed over but never asked past
+    assert sent == [64 * 1024]
+
+    sent = []
+    body = iter_complete_range({}, video, 10, 500009, on_sent=sent.append)
+    assert len(b''.join(body)) == sum(sent) == 500000
+
+
+def test_file_wrapper_counts_what_sendfile_sent(video):
+    sent = []
+    body = iter_complete_range({'wsgi.file_wrapper': FileWrapper}, video, 1000, 1999,
+                               on_sent=sent.append)
+
+    # As gunicorn does: sendfile from the current position, then rewind
+    fileno = body.filelike.fileno()
+    offset = os.lseek(fileno, 0, os.SEEK_CUR)
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        sender.sendfile(body.filelike, offset=offset, count=1000)
+        os.lseek(fileno, offset, os.SEEK_SET)
+        assert len(receiver.recv(4096)) == 1000
+    body.close()
+    assert sent == [1000]
+
+    # Servers without sendfile iterate the wrapper; reads past the range
+    # are cut off by Content-Length and not counted
+    sent = []
+    body = iter_complete_range({'wsgi.file_wrapper': FileWrapper}, video, 1000, 1999,
+                               on_sent=sent.append)
+    next(iter(body))
+    body.close()
+    assert sent == [1000]
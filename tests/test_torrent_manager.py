@@ -0,0 +1,87 @@
+import os
+import time
+
+import pytest
+
+lt = pytest.importorskip('libtorrent')
+
+
+def test_session_state_round_trips(manager):
+    manager._save_session_state()
+    state = manager.resume_store.load_session_state()
+
+    assert state
+    assert lt.read_session_params(state) is not None
+
+
+def make_torrent(tmp_path, pieces, piece_length=64 * 1024):
+    """
+    Metadata for a single-file torrent of random bytes, and the bytes of
+    each of its pieces
+    """
+    source = tmp_path / 'source'
+    (source / 'movie').mkdir(parents=True)
+    data = os.urandom(pieces * piece_length)
+    (source / 'movie' / 'movie.mp4').write_bytes(data)
+    storage = lt.file_storage()
+    lt.add_files(storage, str(source / 'movie'))
+    creator = lt.create_torrent(storage, piece_length)
+    lt.set_piece_hashes(creator, str(source))
+    metadata = lt.bencode(creator.generate())
+    info_hash = str(lt.torrent_info(metadata).info_hash())
+    return info_hash, metadata, [data[i:i + piece_length] for i in range(0, len(data), piece_length)]
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_torrent_is_kept_until_its_last_viewer_leaves(manager, tmp_path):
+    info_hash, metadata, _ = make_torrent(tmp_path, 4)
+    manager.resume_store.save_torrent(info_hash, metadata)
+    magnet = f'magnet:?xt=urn:btih:{info_hash}'
+
+    torrent_id = manager.add_torrent(magnet, viewer_id='a', info_hash=info_hash)
+    assert manager.add_torrent(magnet, viewer_id='b', info_hash=info_hash) == torrent_id
+    assert manager.get_viewer_count(torrent_id) == 2
+
+    assert manager.release_torrent(torrent_id, 'a')
+    assert torrent_id in manager.active_torrents
+    assert manager.get_viewer_count(torrent_id) == 1
+
+    # Leaving twice does not count against the remaining viewer
+    manager.release_torrent(torrent_id, 'a')
+    assert manager.get_viewer_count(torrent_id) == 1
+
+    manager.release_torrent(torrent_id, 'b')
+    assert torrent_id not in manager.active_torrents
+
+
+def test_playback_is_ready_only_with_head_and_index_pieces(manager, tmp_path, monkeypatch):
+    piece_length = 64 * 1024
+    monkeypatch.setattr(manager, 'STARTUP_BUFFER_BYTES', 2 * piece_length)
+    monkeypatch.setattr(manager, 'INDEX_TAIL_BYTES', piece_length)
+    info_hash, metadata, pieces = make_torrent(tmp_path, 8, piece_length)
+    manager.resume_store.save_torrent(info_hash, metadata)
+    torrent_id = manager.add_torrent(f'magnet:?xt=urn:btih:{info_hash}', info_hash=info_hash)
+    handle = manager.active_torrents[torrent_id]['handle']
+    assert wait_for(lambda: handle.status().state != lt.torrent_status.checking_files)
+
+    assert manager.get_playback_pieces(torrent_id, 0) == [0, 1, 7]
+    ready = []
+    assert manager.prepare_playback(torrent_id, 0, lambda tid, index: ready.append(index))
+
+    # Pieces outside the head and the index do not count
+    for piece in (0, 1, 4):
+        handle.add_piece(piece, pieces[piece], 0)
+    assert wait_for(lambda: all(handle.have_piece(p) for p in (0, 1, 4)))
+    time.sleep(0.5)
+    assert ready == []
+
+    handle.add_piece(7, pieces[7], 0)
+    assert wait_for(lambda: ready == [0])
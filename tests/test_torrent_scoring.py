@@ -0,0 +1,62 @@
+from torrent_scoring import (DEFAULT_BITRATES, REALTIME_MARGIN, choose_torrent, quality_fallback,
+                             score_torrent)
+
+
+def torrent(quality, seeds, peers=0, size_bytes=0, **fields):
+    return {'quality': quality, 'seeds': seeds, 'peers': peers, 'size_bytes': size_bytes, **fields}
+
+
+def test_quality_fallback_goes_down_before_up():
+    assert quality_fallback('720p') == ['720p', '480p', '1080p', '2160p']
+    assert quality_fallback('1080p') == ['1080p', '720p', '480p', '2160p']
+    assert quality_fallback('3D') == ['2160p', '1080p', '720p', '480p']
+
+
+def test_score_is_swarm_rate_capped_by_throughput_over_bitrate():
+    # 1.5 GB over 100 minutes is 250 kB/s
+    healthy = torrent('1080p', seeds=10, size_bytes=1_500_000_000)
+    score = score_torrent(healthy, 100)
+    assert score['bitrate'] == 250_000
+    assert score['headroom'] == score['sustainable'] / (250_000 * REALTIME_MARGIN)
+    assert score['headroom'] > 1.0
+
+    capped = score_torrent(healthy, 100, throughput=100_000)
+    assert capped['sustainable'] == 100_000
+    assert capped['headroom'] < 1.0
+
+    # Without size or runtime the quality's typical bitrate is assumed
+    assert score_torrent(torrent('480p', seeds=1), None)['bitrate'] == DEFAULT_BITRATES['480p']
+
+
+def test_a_healthy_swarm_beats_a_bigger_release():
+    lean = torrent('720p', seeds=30, size_bytes=700_000_000, hash='lean')
+    heavy = torrent('720p', seeds=3, size_bytes=1_400_000_000, hash='heavy')
+    assert choose_torrent([heavy, lean], 120)['hash'] == 'lean'
+
+
+def test_preferred_quality_wins_whenever_it_can_play():
+    hd = torrent('1080p', seeds=20, size_bytes=1_500_000_000, hash='hd')
+    sd = torrent('720p', seeds=200, size_bytes=800_000_000, hash='sd')
+    assert choose_torrent([sd, hd], 100, '1080p')['hash'] == 'hd'
+
+
+def test_falls_back_to_lower_quality_when_throughput_is_below_the_bitrate():
+    hd = torrent('1080p', seeds=50, size_bytes=1_500_000_000, hash='hd')
+    sd = torrent('720p', seeds=50, size_bytes=750_000_000, hash='sd')
+    tiny = torrent('480p', seeds=50, size_bytes=400_000_000, hash='tiny')
+
+    # 250 kB/s needed for 1080p, 125 kB/s for 720p, ~67 kB/s for 480p
+    assert choose_torrent([hd, sd, tiny], 100, '1080p', throughput=2_000_000)['hash'] == 'hd'
+    assert choose_torrent([hd, sd, tiny], 100, '1080p', throughput=200_000)['hash'] == 'sd'
+    assert choose_torrent([hd, sd, tiny], 100, '1080p', throughput=100_000)['hash'] == 'tiny'
+
+    # When nothing can play in real time the most headroom wins
+    assert choose_torrent([hd, sd, tiny], 100, '1080p', throughput=10_000)['hash'] == 'tiny'
+
+
+def test_odd_qualities_only_when_nothing_else_exists():
+    three_d = torrent('3D', seeds=500, size_bytes=100_000_000, hash='3d')
+    weak = torrent('720p', seeds=0, peers=1, size_bytes=800_000_000, hash='weak')
+    assert choose_torrent([three_d, weak], 100)['hash'] == 'weak'
+    assert choose_torrent([three_d], 100)['hash'] == '3d'
+    assert choose_torrent([], 100) is None
@@ -0,0 +1,35 @@
+from torrent_status import TorrentSnapshot, decode_runs, encode_runs
+
+
+def make_snapshot(**fields):
+    values = dict(
+        torrent_id='t', status='downloading', progress=12.5, download_rate=0, upload_rate=0,
+        peers=3, viewers=1, num_pieces=10, piece_length=1024, piece_runs=(2, 3, 5),
+        files=(('movie/sample.mkv', 1000, 1), ('movie/Movie.1080p.MKV', 8000, 4),
+               ('movie/subs.srt', 50, 1)),
+        file_pieces=((0, 0), (1, 8), (9, 9))
+    )
+    values.update(fields)
+    return TorrentSnapshot(**values)
+
+
+def test_runs_round_trip():
+    pieces = [0, 0, 1, 1, 1, 0, 1]
+    assert encode_runs(pieces) == [2, 3, 1, 1]
+    assert decode_runs(encode_runs(pieces)) == pieces
+    assert encode_runs([1, 1]) == [0, 2]
+
+
+def test_main_video_span_comes_from_the_snapshot():
+    snapshot = make_snapshot()
+    assert snapshot.main_video_index() == 1
+    assert snapshot.file_piece_span(1) == (1, 8)
+    assert snapshot.file_piece_span(7) is None
+    assert make_snapshot(files=(), file_pieces=()).main_video_index() is None
+
+
+def test_wire_round_trip_keeps_file_pieces():
+    snapshot = make_snapshot()
+    copy = TorrentSnapshot.from_wire(snapshot.to_wire())
+    assert copy.file_pieces == snapshot.file_pieces
+    assert copy.pieces_dict() == snapshot.pieces_dict()
@@ -0,0 +1,82 @@
+from bandwidth_scheduler import PREFETCHING
+from conftest import make_movie
+from warmup import WarmupPrefetcher
+
+MIB = 1024 ** 2
+
+
+class StubScraper:
+    def __init__(self, movies):
+        self.movies = movies
+
+    def get_movies(self, **params):
+        return self.movies
+
+    def get_best_torrent(self, movie, quality):
+        return movie['torrents'][0]
+
+
+class StubManager:
+    """
+    Warm-ups finish at once and reserve the whole pieces set per hash, as
+    TorrentManager reports them once metadata is known
+    """
+
+    def __init__(self, reserved):
+        self.reserved = reserved
+        self.started = []
+        self.limits = []
+
+    def warm_up(self, torrent_url, info_hash, head_bytes, download_limit=0, max_bytes=0):
+        self.started.append(info_hash)
+        self.limits.append(max_bytes)
+        return info_hash
+
+    def is_warming(self, torrent_id):
+        return False
+
+    def take_warm_up_bytes(self, torrent_id):
+        return self.reserved[torrent_id]
+
+    def get_warmup_stats(self):
+        return {}
+
+
+def make_prefetcher(reserved, budget):
+    movies = [make_movie(i) for i in range(1, 5)]
+    for movie in movies:
+        # 700 MiB over 100 minutes, so 30 s of head is about 3.5 MiB
+        movie['torrents'][0]['hash'] = f'{movie["id"]:040x}'
+    manager = StubManager({f'{i:040x}': size for i, size in enumerate(reserved, 1)})
+    return WarmupPrefetcher(StubScraper(movies), manager, disk_budget=budget,
+                            poll_interval=0.01), manager
+
+
+def test_budget_counts_whole_reserved_pieces():
+    # Head, index tail and piece rounding: each title reserves far more than its head
+    prefetcher, manager = make_prefetcher([12 * MIB, 12 * MIB, 12 * MIB, 12 * MIB], 30 * MIB)
+    assert prefetcher.warm_once() == 2
+    assert manager.limits == [30 * MIB, 18 * MIB, 6 * MIB]
+    assert prefetcher.stats()['warm_bytes'] == 24 * MIB
+
+    # Warm titles stay charged in later rounds and are not fetched again
+    manager.started.clear()
+    assert prefetcher.warm_once() == 0
+    assert manager.started == [f'{3:040x}']
+
+
+def test_manager_keeps_warm_ups_paused_until_viewers_leave(manager, monkeypatch):
+    warm_id = manager.warm_up(f'magnet:?xt=urn:btih:{1:040x}', f'{1:040x}', MIB)
+    assert warm_id and not manager.active_torrents[warm_id]['yielded']
+
+    viewer_id = manager.add_torrent(f'magnet:?xt=urn:btih:{2:040x}', None, viewer_id='viewer')
+    assert manager.active_torrents[warm_id]['yielded']
+
+    # Before playback starts the viewer's torrent is only prefetching
+    monkeypatch.setattr(manager, '_classify', lambda info: PREFETCHING)
+    manager._plan_bandwidth()
+    assert manager.active_torrents[warm_id]['yielded']
+
+    manager.release_torrent(viewer_id, 'viewer')
+    manager._plan_bandwidth()
+    assert not manager.active_torrents[warm_id]['yielded']
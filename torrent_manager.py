@@ -3,127 +3,1132 @@ import threading
 import time
 import os
 import tempfile
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, List
 import logging
 
+from readahead import ReadaheadScheduler
+from piece_window import PieceWindow, release_bytes
+from bandwidth_scheduler import BandwidthScheduler, Demand, BUFFERING, PLAYING, PREFETCHING, IDLE
+from disk_cache import DiskCache
+from resume_store import ResumeStore
+from metrics import MetricsRegistry
+from offload import native_thread
+from container_index import ContainerIndex, ContainerIndexCache
+from torrent_status import VIDEO_EXTENSIONS, TorrentSnapshot, encode_runs
+
 class TorrentManager:
-    def __init__(self):
-        self.session = lt.session()
-        self.session.listen_on(6881, 6891)
+    # How often the engine loop asks libtorrent for status updates (seconds)
+    UPDATE_INTERVAL = 1.0
+    # How often the disk cache budget is enforced (seconds)
+    CACHE_CHECK_INTERVAL = 30.0
+    # How often fast-resume data is saved for torrents that changed (seconds)
+    RESUME_SAVE_INTERVAL = 60.0
+    # How often session state (DHT routing table included) is saved (seconds)
+    SESSION_SAVE_INTERVAL = 300.0
+    # Number of good peers remembered per torrent
+    MAX_CACHED_PEERS = 30
+    # How often bandwidth and connections are re-planned across torrents (seconds)
+    BANDWIDTH_PLAN_INTERVAL = 5.0
+    # Bytes at the start of a video that must be on disk before playback
+    # starts (container header plus a startup buffer)
+    STARTUP_BUFFER_BYTES = int(os.environ.get('STARTUP_BUFFER_BYTES', 8 * 1024 * 1024))
+    # Bytes at the end of a video holding its index (MP4 moov, MKV cues)
+    INDEX_TAIL_BYTES = int(os.environ.get('INDEX_TAIL_BYTES', 4 * 1024 * 1024))
+    # Pieces kept ahead of a reader in streaming-only mode before the
+    # readahead scheduler has measured a rate
+    WINDOW_DEFAULT_AHEAD = 8
+    # Upload cap (bytes/s) for streaming-only torrents. libtorrent still
+    # advertises pieces they have discarded until it forgets them, and it
+    # reads 0 as unlimited, so 1 B/s is as close to off as it allows: a
+    # request times out long before a block of zeros could be sent.
+    WINDOW_UPLOAD_LIMIT = 1
+    # Minimum time between re-adds of a streaming-only torrent to forget
+    # discarded pieces. Each re-add drops every peer connection (cached
+    # peers are dialled again straight away), so a viewer seeking back and
+    # forth waits on discarded pieces rather than churning the swarm.
+    WINDOW_REFETCH_INTERVAL = 10.0
+    # How long a seek waits for header/index bytes before giving up on the index
+    SEEK_INDEX_TIMEOUT = 5.0
+    # Viewer that holds a torrent while it is being warmed up in the background
+    WARMUP_VIEWER = 'warmup'
+    
+    def __init__(self, download_dir: Optional[str] = None, cache_budget: Optional[int] = None,
+                 window_budget: Optional[int] = None):
         self.active_torrents = {}
-        self.download_dir = tempfile.mkdtemp(prefix="torrent_player_")
+        self.metrics = MetricsRegistry()
+        self.container_indexes = ContainerIndexCache()
+        self._registry_lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
         
+        # Persistent download directory, kept within a byte budget
+        self.download_dir = (download_dir or os.environ.get('TORRENT_CACHE_DIR') or
+                             os.path.join(tempfile.gettempdir(), 'torrent_player_cache'))
+        if cache_budget is None:
+            cache_budget = int(os.environ.get('TORRENT_CACHE_BYTES', 4 * 1024 ** 3))
+        self.disk_cache = DiskCache(self.download_dir, cache_budget)
+        
+        # Streaming-only mode: with a budget set, each torrent keeps just its
+        # container header and index plus a window around its readers, and
+        # pieces behind the playhead are discarded (0 keeps whole files)
+        if window_budget is None:
+            window_budget = int(os.environ.get('TORRENT_WINDOW_BYTES', 0))
+        self.window_budget = window_budget
+        
+        # Metadata and fast-resume data of every torrent we have seen
+        self.resume_store = ResumeStore(os.path.join(self.download_dir, '.resume'))
+        self._pending_removal = {}
+        
+        # Per-torrent limits are planned by the bandwidth scheduler; the
+        # capacities are optional (0 = unlimited, download estimated)
+        self.bandwidth = BandwidthScheduler(
+            download_capacity=int(os.environ.get('TORRENT_DOWNLOAD_BYTES', 0)),
+            upload_capacity=int(os.environ.get('TORRENT_UPLOAD_BYTES', 0)),
+            connections=int(os.environ.get('TORRENT_CONNECTIONS', 200))
+        )
+        self.allocations = {}
+        self.warmups = {'started': 0, 'completed': 0, 'claimed': 0, 'cancelled': 0, 'over_budget': 0}
+        self.warm_up_bytes: Dict[str, int] = {}
+        
+        self.session = self._create_session()
+        self.session.listen_on(6881, 6891)
+        
         # Configure session settings
         settings = self.session.get_settings()
         settings['user_agent'] = 'TorrentPlayer/1.0'
-        settings['download_rate_limit'] = 0  # No limit
-        settings['upload_rate_limit'] = 0    # No limit
-        settings['active_downloads'] = 1
-        settings['active_seeds'] = 1
-        settings['active_limit'] = 1
-        self.session.set_settings(settings)
+        settings['download_rate_limit'] = self.bandwidth.download_capacity
+        settings['upload_rate_limit'] = self.bandwidth.upload_capacity
+        settings['connections_limit'] = self.bandwidth.connections
+        # Every torrent stays active; the bandwidth scheduler decides how
+        # much each one gets instead of libtorrent's queue
+        settings['active_downloads'] = -1
+        settings['active_seeds'] = -1
+        settings['active_limit'] = -1
+        settings['alert_mask'] = (
+            lt.alert.category_t.error_notification |
+            lt.alert.category_t.status_notification |
+            lt.alert.category_t.storage_notification |
+            lt.alert.category_t.piece_progress_notification |
+            lt.alert.category_t.connect_notification
+        )
+        self.session.apply_settings(settings)
+        
+        # A single engine thread drives every torrent from libtorrent alerts
+        self._running = True
+        self._engine_thread = native_thread(self._engine_loop, name='torrent-engine')
+        self._engine_thread.start()
+    
+    def _create_session(self):
+        """
+        Create the libtorrent session, warm-started from the saved session
+        state so the DHT does not have to bootstrap from scratch
+        """
+        state = self.resume_store.load_session_state()
+        if state:
+            try:
+                session = lt.session(lt.read_session_params(state))
+                self.logger.info("Restored session state (DHT nodes included)")
+                return session
+            except Exception as e:
+                self.logger.warning(f"Discarding unusable session state: {e}")
+        
+        return lt.session()
+    
+    def _save_session_state(self):
+        try:
+            # The 2.0 bindings have no session_state(); save_state() gives the
+            # same bencoded layout, which read_session_params accepts
+            state = lt.bencode(self.session.save_state())
+            self.resume_store.save_session_state(state)
+        except Exception as e:
+            self.logger.error(f"Failed to save session state: {e}")
+    
+    def _save_peers(self, torrent_id: str, handle):
+        """
+        Remember the peers that actually sent us data, best first
+        """
+        try:
+            peers = [p for p in handle.get_peer_info() if p.total_download > 0]
+        except Exception as e:
+            self.logger.error(f"Failed to read peers of {torrent_id}: {e}")
+            return
+        
+        if peers:
+            peers.sort(key=lambda p: p.total_download, reverse=True)
+            self.resume_store.save_peers(
+                torrent_id, [list(p.ip) for p in peers[:self.MAX_CACHED_PEERS]]
+            )
+    
+    def _connect_cached_peers(self, torrent_id: str, handle):
+        """
+        Dial peers that served this torrent before instead of waiting on
+        trackers and the DHT
+        """
+        peers = self.resume_store.load_peers(torrent_id)
+        for endpoint in peers:
+            try:
+                handle.connect_peer(endpoint)
+            except Exception:
+                pass
+        if peers:
+            self.logger.info(f"Connecting {len(peers)} cached peers for {torrent_id}")
+    
+    def get_disk_cache_stats(self) -> Dict[str, int]:
+        """
+        Occupancy and eviction counters of the download cache
+        """
+        return self.disk_cache.stats()
+    
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summaries of startup latencies such as time-to-first-peer and
+        time-to-metadata
+        """
+        return self.metrics.summary()
     
-    def add_torrent(self, torrent_url: str, callback: Optional[Callable] = None) -> Optional[str]:
+    def add_torrent(self, torrent_url: str, callback: Optional[Callable] = None,
+                    viewer_id: str = 'default', info_hash: Optional[str] = None) -> Optional[str]:
         """
-        Add a torrent for downloading/streaming
+        Add a torrent for downloading/streaming, or attach another viewer to
+        it if the same info-hash is already active. Each viewer gets its own
+        progress callback and the download is shared between them.
         Returns torrent handle ID if successful
         """
         try:
-            # Create torrent parameters
-            params = {
-                'url': torrent_url,
-                'save_path': self.download_dir,
-                'storage_mode': lt.storage_mode_t.storage_mode_sparse
-            }
-            
-            # Add torrent to session
-            handle = self.session.add_torrent(params)
-            torrent_id = str(handle.info_hash())
-            
-            # Store torrent info
-            self.active_torrents[torrent_id] = {
-                'handle': handle,
-                'url': torrent_url,
-                'callback': callback,
-                'status': 'downloading',
-                'progress': 0.0,
-                'download_rate': 0,
-                'upload_rate': 0,
-                'peers': 0,
-                'files': []
-            }
+            with self._registry_lock:
+                torrent_id = info_hash.lower() if info_hash else None
+                
+                if torrent_id in self._pending_removal:
+                    # Re-added while its removal was waiting on resume data
+                    handle = self._pending_removal.pop(torrent_id)
+                elif torrent_id not in self.active_torrents:
+                    # Add torrent to session (libtorrent hands back the existing
+                    # handle if the URL resolves to a torrent we already have)
+                    handle = self.session.add_torrent(self._add_params(torrent_url, torrent_id))
+                    torrent_id = str(handle.info_hash())
+                    self._pending_removal.pop(torrent_id, None)
+                
+                torrent_info = self.active_torrents.get(torrent_id)
+                if torrent_info is None:
+                    # Store torrent info
+                    torrent_info = {
+                        'handle': handle,
+                        'url': torrent_url,
+                        'viewers': {},
+                        'listeners': [],
+                        'status': 'downloading',
+                        'progress': 0.0,
+                        'download_rate': 0,
+                        'upload_rate': 0,
+                        'peers': 0,
+                        'files': [],
+                        'torrent_file': None,
+                        'have': bytearray(),
+                        'snapshot': None,
+                        'pieces_changed': threading.Condition(),
+                        'readahead': None,
+                        'window': None,
+                        'wanted': None,
+                        'discarded': set(),
+                        'refetching': False,
+                        'refetched_at': 0.0,
+                        'readd_resume': None,
+                        'preparing': 0,
+                        'bandwidth_class': None,
+                        'warming': None,
+                        'yielded': False,
+                        'added_at': time.monotonic(),
+                        'first_peer_at': None,
+                        'metadata_at': None
+                    }
+                    self.active_torrents[torrent_id] = torrent_info
+                    
+                    # Metadata may already be present (e.g. a cached .torrent)
+                    self._load_files(torrent_id, torrent_info)
+                    self._connect_cached_peers(torrent_id, handle)
+                    self._take_snapshot(torrent_id, torrent_info)
+                    self.logger.info(f"Added torrent: {torrent_id}")
+                
+                # Never evict a torrent while someone is streaming it
+                if viewer_id not in torrent_info['viewers']:
+                    self.disk_cache.pin(torrent_id)
+                torrent_info['viewers'][viewer_id] = callback
             
-            # Start monitoring thread
-            monitor_thread = threading.Thread(
-                target=self._monitor_torrent, 
-                args=(torrent_id,),
-                daemon=True
-            )
-            monitor_thread.start()
+            if viewer_id != self.WARMUP_VIEWER:
+                # Playback takes over a warm-up of the same torrent and
+                # pauses every other one right away
+                if torrent_info['warming']:
+                    self._claim_warm_up(torrent_id, torrent_info)
+                self._yield_warm_ups(True)
             
-            self.logger.info(f"Added torrent: {torrent_id}")
+            self.logger.info(f"Viewer {viewer_id} attached to {torrent_id} "
+                             f"({len(torrent_info['viewers'])} watching)")
             return torrent_id
             
         except Exception as e:
             self.logger.error(f"Failed to add torrent: {e}")
             return None
     
-    def _monitor_torrent(self, torrent_id: str):
+    def _add_params(self, torrent_url: str, info_hash: Optional[str]):
+        """
+        Build add_torrent parameters, reusing saved resume data or metadata
+        for a known info-hash so neither metadata nor a full recheck is needed
+        """
+        if info_hash:
+            resume_data = self.resume_store.load_resume(info_hash)
+            if resume_data:
+                try:
+                    params = lt.read_resume_data(resume_data)
+                    params.save_path = self.download_dir
+                    params.storage_mode = lt.storage_mode_t.storage_mode_sparse
+                    self.logger.info(f"Resuming {info_hash} from fast-resume data")
+                    return params
+                except Exception as e:
+                    self.logger.warning(f"Discarding unusable resume data for {info_hash}: {e}")
+            
+            metadata = self.resume_store.load_torrent(info_hash)
+            if metadata:
+                try:
+                    params = lt.add_torrent_params()
+                    params.ti = lt.torrent_info(lt.bdecode(metadata))
+                    params.save_path = self.download_dir
+                    params.storage_mode = lt.storage_mode_t.storage_mode_sparse
+                    self.logger.info(f"Adding {info_hash} from saved metadata")
+                    return params
+                except Exception as e:
+                    self.logger.warning(f"Discarding unusable metadata for {info_hash}: {e}")
+        
+        # Create torrent parameters
+        return {
+            'url': torrent_url,
+            'save_path': self.download_dir,
+            'storage_mode': lt.storage_mode_t.storage_mode_sparse
+        }
+    
+    def release_torrent(self, torrent_id: str, viewer_id: str = 'default',
+                        delete_files: bool = False) -> bool:
+        """
+        Detach a viewer from a torrent, removing the torrent from the session
+        once its last viewer has left
+        """
+        with self._registry_lock:
+            torrent_info = self.active_torrents.get(torrent_id)
+            if not torrent_info:
+                return False
+            
+            if viewer_id in torrent_info['viewers']:
+                del torrent_info['viewers'][viewer_id]
+                self.disk_cache.unpin(torrent_id)
+            
+            scheduler = torrent_info['readahead']
+            if scheduler:
+                for reader_id in scheduler.readers:
+                    if reader_id.startswith(f'{viewer_id}:'):
+                        scheduler.remove_reader(reader_id)
+            
+            if torrent_info['viewers']:
+                self.logger.info(f"Viewer {viewer_id} left {torrent_id} "
+                                 f"({len(torrent_info['viewers'])} still watching)")
+                return True
+        
+        return self.remove_torrent(torrent_id, delete_files=delete_files)
+    
+    def get_viewer_count(self, torrent_id: str) -> int:
+        """
+        Number of viewers currently sharing a torrent
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        return len(torrent_info['viewers']) if torrent_info else 0
+    
+    def add_listener(self, torrent_id: str, listener: Callable) -> bool:
         """
-        Monitor torrent progress and update status
+        Register listener(torrent_id, event, torrent_info) for engine events.
+        Events are 'metadata', 'piece', 'progress' and 'finished'; they are
+        dispatched from the engine loop, so listeners must not block.
         """
         torrent_info = self.active_torrents.get(torrent_id)
         if not torrent_info:
-            return
+            return False
         
-        handle = torrent_info['handle']
+        torrent_info['listeners'].append(listener)
+        
+        # Late listeners still learn about metadata that already arrived
+        if torrent_info['files']:
+            self._dispatch(torrent_id, torrent_info, 'metadata')
+        return True
+    
+    def remove_listener(self, torrent_id: str, listener: Callable):
+        """
+        Unregister a listener added with add_listener
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if torrent_info and listener in torrent_info['listeners']:
+            torrent_info['listeners'].remove(listener)
+    
+    def _engine_loop(self):
+        """
+        Drive every torrent from one thread: request batched status updates
+        and handle state, piece-finished and metadata alerts as they arrive
+        """
+        last_update = 0.0
+        last_cache_check = 0.0
+        last_resume_save = time.monotonic()
+        last_session_save = time.monotonic()
+        last_bandwidth_plan = 0.0
         
-        while torrent_id in self.active_torrents:
+        while self._running:
             try:
-                status = handle.status()
+                now = time.monotonic()
+                if now - last_update >= self.UPDATE_INTERVAL:
+                    self.session.post_torrent_updates()
+                    self._retry_refetches()
+                    last_update = now
                 
-                # Update torrent info
-                torrent_info['progress'] = status.progress * 100
-                torrent_info['download_rate'] = status.download_rate
-                torrent_info['upload_rate'] = status.upload_rate
-                torrent_info['peers'] = status.num_peers
-                torrent_info['status'] = str(status.state)
+                if now - last_cache_check >= self.CACHE_CHECK_INTERVAL:
+                    self._enforce_cache_budget()
+                    last_cache_check = now
                 
-                # Get file list if not already done
-                if not torrent_info['files'] and handle.torrent_file():
-                    torrent_file = handle.torrent_file()
-                    files = []
-                    for i in range(torrent_file.num_files()):
-                        file_info = torrent_file.file_at(i)
-                        files.append({
-                            'path': file_info.path,
-                            'size': file_info.size,
-                            'priority': handle.file_priority(i)
-                        })
-                    torrent_info['files'] = files
+                if now - last_resume_save >= self.RESUME_SAVE_INTERVAL:
+                    self._save_resume_data()
+                    last_resume_save = now
                 
-                # Call callback if provided
-                if torrent_info['callback']:
-                    torrent_info['callback'](torrent_id, torrent_info)
+                if now - last_session_save >= self.SESSION_SAVE_INTERVAL:
+                    self._save_session_state()
+                    last_session_save = now
                 
-                # Check if torrent is complete
-                if status.is_finished:
-                    torrent_info['status'] = 'completed'
-                    self.logger.info(f"Torrent completed: {torrent_id}")
-                    break
+                if now - last_bandwidth_plan >= self.BANDWIDTH_PLAN_INTERVAL:
+                    self._plan_bandwidth()
+                    last_bandwidth_plan = now
                 
-                time.sleep(1)
+                self.session.wait_for_alert(int(self.UPDATE_INTERVAL * 1000))
+                for alert in self.session.pop_alerts():
+                    self._handle_alert(alert)
+                    
+            except Exception as e:
+                self.logger.error(f"Error in torrent engine loop: {e}")
+                time.sleep(self.UPDATE_INTERVAL)
+    
+    def _handle_alert(self, alert):
+        """
+        Route a single libtorrent alert to the torrent it concerns
+        """
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                self._on_status(status)
+            return
+        
+        if isinstance(alert, lt.peer_connect_alert):
+            torrent_info = self.active_torrents.get(str(alert.handle.info_hash()))
+            if torrent_info and torrent_info['first_peer_at'] is None:
+                torrent_info['first_peer_at'] = time.monotonic()
+                self.metrics.record('time_to_first_peer',
+                                    torrent_info['first_peer_at'] - torrent_info['added_at'])
+            return
+        
+        if isinstance(alert, (lt.save_resume_data_alert, lt.save_resume_data_failed_alert)):
+            torrent_id = str(alert.handle.info_hash())
+            torrent_info = self.active_torrents.get(torrent_id)
+            if isinstance(alert, lt.save_resume_data_alert):
+                params = alert.params
+                if torrent_info and torrent_info['discarded']:
+                    # Never persist pieces whose storage has been released
+                    params.have_pieces = [
+                        have and piece not in torrent_info['discarded']
+                        for piece, have in enumerate(params.have_pieces)
+                    ]
+                resume_data = lt.write_resume_data_buf(params)
+                self.resume_store.save_resume(torrent_id, resume_data)
+                if torrent_info and torrent_info['refetching']:
+                    self._readd_without_discarded(torrent_id, torrent_info, resume_data)
+            else:
+                if torrent_info:
+                    torrent_info['refetching'] = False
+                self.logger.warning(f"Could not save resume data for {torrent_id}: {alert.message()}")
+            
+            # Finish a removal that was waiting for its resume data
+            handle = self._pending_removal.pop(torrent_id, None)
+            if handle is not None:
+                self.session.remove_torrent(handle)
+            return
+        
+        if isinstance(alert, lt.torrent_removed_alert):
+            torrent_info = self.active_torrents.get(str(alert.info_hash))
+            if torrent_info and torrent_info['readd_resume'] is not None:
+                self._finish_readd(str(alert.info_hash), torrent_info)
+            return
+        
+        if isinstance(alert, (lt.piece_finished_alert, lt.metadata_received_alert,
+                              lt.torrent_finished_alert, lt.torrent_checked_alert)):
+            torrent_id = str(alert.handle.info_hash())
+            torrent_info = self.active_torrents.get(torrent_id)
+            if not torrent_info:
+                return
+            
+            if isinstance(alert, lt.piece_finished_alert):
+                if alert.piece_index < len(torrent_info['have']):
+                    torrent_info['have'][alert.piece_index] = 1
+                torrent_info['discarded'].discard(alert.piece_index)
+                if torrent_info['window']:
+                    self._apply_window(torrent_id, torrent_info)
                 
+                # Wake any readers waiting on pieces to arrive
+                with torrent_info['pieces_changed']:
+                    torrent_info['pieces_changed'].notify_all()
+                self._dispatch(torrent_id, torrent_info, 'piece')
+            
+            elif isinstance(alert, lt.torrent_checked_alert):
+                # Pieces found on disk by the check post no piece alerts
+                pieces = torrent_info['handle'].status(lt.status_flags_t.query_pieces).pieces
+                if torrent_info['files'] and len(pieces) == len(torrent_info['have']):
+                    torrent_info['have'][:] = bytearray(
+                        1 if have and piece not in torrent_info['discarded'] else 0
+                        for piece, have in enumerate(pieces)
+                    )
+                    if torrent_info['window']:
+                        self._apply_window(torrent_id, torrent_info)
+                    with torrent_info['pieces_changed']:
+                        torrent_info['pieces_changed'].notify_all()
+            
+            elif isinstance(alert, lt.metadata_received_alert):
+                self._load_files(torrent_id, torrent_info)
+                self._save_metadata(torrent_id, torrent_info['handle'])
+                self._dispatch(torrent_id, torrent_info, 'metadata')
+            
+            else:
+                torrent_info['status'] = 'completed'
+                self.logger.info(f"Torrent completed: {torrent_id}")
+                self._dispatch(torrent_id, torrent_info, 'finished')
+            return
+        
+        if alert.category() & lt.alert.category_t.error_notification:
+            self.logger.warning(f"libtorrent: {alert.message()}")
+    
+    def _on_status(self, status):
+        """
+        Apply one entry of a batched state update to its torrent
+        """
+        torrent_id = str(status.handle.info_hash())
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info:
+            return
+        
+        # Update torrent info
+        torrent_info['progress'] = status.progress * 100
+        torrent_info['download_rate'] = status.download_rate
+        torrent_info['upload_rate'] = status.upload_rate
+        torrent_info['peers'] = status.num_peers
+        if torrent_info['status'] not in ('completed', 'paused'):
+            torrent_info['status'] = str(status.state)
+        
+        if torrent_info['readahead']:
+            torrent_info['readahead'].observe_rate(status.download_rate)
+        
+        # Some torrents never post metadata_received (metadata came with the add)
+        if not torrent_info['files'] and status.has_metadata:
+            if self._load_files(torrent_id, torrent_info):
+                self._dispatch(torrent_id, torrent_info, 'metadata')
+        
+        self._take_snapshot(torrent_id, torrent_info)
+        
+        # Fan progress out to every viewer's callback
+        for viewer_id, callback in list(torrent_info['viewers'].items()):
+            if not callback:
+                continue
+            try:
+                callback(torrent_id, torrent_info)
+            except Exception as e:
+                self.logger.error(f"Error in progress callback of {viewer_id} for {torrent_id}: {e}")
+        
+        self._dispatch(torrent_id, torrent_info, 'progress')
+    
+    def _enforce_cache_budget(self) -> list:
+        """
+        Evict cached torrents beyond the disk budget along with their
+        fast-resume data, which would otherwise claim the deleted pieces.
+        Their metadata stays valid and saves a fetch on replay.
+        """
+        evicted = self.disk_cache.enforce_budget(busy=list(self.active_torrents))
+        for torrent_id in evicted:
+            self.resume_store.delete(torrent_id, kinds=('fastresume',))
+        return evicted
+    
+    def _save_metadata(self, torrent_id: str, handle):
+        """
+        Persist a torrent's metadata so the next add skips fetching it
+        """
+        if self.resume_store.has_torrent(torrent_id):
+            return
+        
+        try:
+            torrent_file = handle.torrent_file()
+            if torrent_file:
+                metadata = lt.bencode(lt.create_torrent(torrent_file).generate())
+                self.resume_store.save_torrent(torrent_id, metadata)
+        except Exception as e:
+            self.logger.error(f"Failed to save metadata for {torrent_id}: {e}")
+    
+    def _save_resume_data(self, force: bool = False) -> int:
+        """
+        Ask libtorrent for resume data of every torrent that changed since the
+        last save; the data arrives as save_resume_data alerts. Returns the
+        number of requests made.
+        """
+        requested = 0
+        for torrent_info in list(self.active_torrents.values()):
+            # Resume data would claim pieces a streaming-only torrent discarded
+            if torrent_info['window']:
+                continue
+            handle = torrent_info['handle']
+            try:
+                if not handle.is_valid() or not handle.status().has_metadata:
+                    continue
+                if force or handle.need_save_resume_data():
+                    handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+                    self._save_peers(str(handle.info_hash()), handle)
+                    requested += 1
             except Exception as e:
-                self.logger.error(f"Error monitoring torrent {torrent_id}: {e}")
+                self.logger.error(f"Failed to request resume data: {e}")
+        return requested
+    
+    def _load_files(self, torrent_id: str, torrent_info: Dict) -> bool:
+        """
+        Build the file list once the torrent's metadata is known
+        """
+        if torrent_info['files']:
+            return False
+        
+        handle = torrent_info['handle']
+        torrent_file = handle.torrent_file()
+        if not torrent_file:
+            return False
+        
+        files = []
+        for i in range(torrent_file.num_files()):
+            file_info = torrent_file.file_at(i)
+            files.append({
+                'path': file_info.path,
+                'size': file_info.size,
+                'priority': handle.file_priority(i),
+                # Piece span, published in snapshots so request threads can
+                # map files onto pieces without touching libtorrent
+                'pieces': (torrent_file.map_file(i, 0, 1).piece,
+                           torrent_file.map_file(i, max(file_info.size - 1, 0), 1).piece)
+            })
+        torrent_info['files'] = files
+        # Kept so request threads can map files onto pieces even while the
+        # handle is being replaced (see _readd_without_discarded)
+        torrent_info['torrent_file'] = torrent_file
+        
+        # Local copy of the piece bitfield, kept current from piece alerts
+        pieces = handle.status(lt.status_flags_t.query_pieces).pieces
+        torrent_info['have'] = bytearray(1 if have else 0 for have in pieces)
+        
+        self.disk_cache.record(torrent_id, [f['path'] for f in files])
+        
+        if self.window_budget:
+            self._open_window(torrent_id, torrent_info)
+        
+        torrent_info['metadata_at'] = time.monotonic()
+        self.metrics.record('time_to_metadata', torrent_info['metadata_at'] - torrent_info['added_at'])
+        return True
+    
+    def _open_window(self, torrent_id: str, torrent_info: Dict):
+        """
+        Switch a torrent to streaming-only storage: nothing is downloaded
+        until it falls inside the window, and the header and index of its
+        main video are pinned
+        """
+        handle = torrent_info['handle']
+        torrent_file = handle.torrent_file()
+        window = PieceWindow(torrent_file.num_pieces(), torrent_file.piece_length(), self.window_budget)
+        torrent_info['window'] = window
+        
+        videos = self.get_video_files(torrent_id)
+        if videos:
+            main_video = max(videos, key=lambda v: v['size'])
+            window.pin(self.get_playback_pieces(torrent_id, main_video['index']))
+        
+        handle.set_upload_limit(self.WINDOW_UPLOAD_LIMIT)
+        self._apply_window(torrent_id, torrent_info)
+        self.logger.info(f"Streaming-only storage for {torrent_id}: "
+                         f"{window.capacity} pieces of {window.piece_length} bytes")
+    
+    def _apply_window(self, torrent_id: str, torrent_info: Dict):
+        """
+        Point piece priorities at the current window and discard held pieces
+        beyond the budget
+        """
+        window = torrent_info['window']
+        handle = torrent_info['handle']
+        scheduler = torrent_info['readahead']
+        wanted = window.wanted(scheduler.window_size() if scheduler else self.WINDOW_DEFAULT_AHEAD)
+        
+        try:
+            if wanted != torrent_info['wanted']:
+                handle.prioritize_pieces([4 if p in wanted else 0 for p in range(window.num_pieces)])
+                torrent_info['wanted'] = wanted
+            
+            # libtorrent still believes it has discarded pieces; have it
+            # forget them (see _readd_without_discarded) and the priorities
+            # above fetch them again. Held back to one re-add per
+            # WINDOW_REFETCH_INTERVAL; _retry_refetches picks it up later.
+            if (wanted & torrent_info['discarded'] and not torrent_info['refetching']
+                    and time.monotonic() - torrent_info['refetched_at'] >= self.WINDOW_REFETCH_INTERVAL):
+                torrent_info['refetching'] = True
+                torrent_info['refetched_at'] = time.monotonic()
+                handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+            
+            have = torrent_info['have']
+            held = [p for p in range(len(have)) if have[p]]
+            for piece in window.evictions(held, wanted):
+                if not self._discard_piece(torrent_id, torrent_info, piece):
+                    self._close_window(torrent_id, torrent_info)
+                    break
+        except Exception as e:
+            self.logger.error(f"Failed to apply piece window for {torrent_id}: {e}")
+    
+    def _close_window(self, torrent_id: str, torrent_info: Dict):
+        """
+        Leave streaming-only mode where storage cannot be released (no hole
+        punching on this filesystem): the torrent downloads in full again,
+        and any pieces already discarded are fetched once more
+        """
+        self.logger.warning(f"Cannot release storage of {torrent_id}; "
+                            f"streaming-only mode disabled for it")
+        torrent_info['window'] = None
+        torrent_info['wanted'] = None
+        handle = torrent_info['handle']
+        handle.prioritize_pieces([4] * len(torrent_info['have']))
+        handle.set_upload_limit(0)
+        if torrent_info['discarded'] and not torrent_info['refetching']:
+            torrent_info['refetching'] = True
+            torrent_info['refetched_at'] = time.monotonic()
+            handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+    
+    def _retry_refetches(self):
+        """
+        Start refetches of discarded pieces that WINDOW_REFETCH_INTERVAL held back
+        """
+        for torrent_id, torrent_info in list(self.active_torrents.items()):
+            wanted = torrent_info['wanted']
+            if (torrent_info['window'] and wanted and wanted & torrent_info['discarded']
+                    and not torrent_info['refetching']):
+                self._apply_window(torrent_id, torrent_info)
+    
+    def _readd_without_discarded(self, torrent_id: str, torrent_info: Dict, resume_data: bytes):
+        """
+        Re-add a streaming-only torrent from its resume data with the
+        discarded pieces cleared, the only way libtorrent forgets pieces
+        short of a full recheck. Nothing is hashed again: the remaining
+        pieces are trusted from the resume data, and the discarded ones are
+        neither advertised any more nor skipped when prioritised. The add
+        happens in _finish_readd once the old handle is gone.
+        
+        Removing the torrent drops every peer connection, so the peers that
+        were sending data are saved and dialled again on the new handle,
+        and re-adds are limited by WINDOW_REFETCH_INTERVAL.
+        """
+        try:
+            self._save_peers(torrent_id, torrent_info['handle'])
+            torrent_info['readd_resume'] = resume_data
+            self.session.remove_torrent(torrent_info['handle'])
+        except Exception as e:
+            self.logger.error(f"Failed to refetch discarded pieces of {torrent_id}: {e}")
+            torrent_info['readd_resume'] = None
+            torrent_info['refetching'] = False
+    
+    def _finish_readd(self, torrent_id: str, torrent_info: Dict):
+        resume_data, torrent_info['readd_resume'] = torrent_info['readd_resume'], None
+        try:
+            params = lt.read_resume_data(resume_data)
+            params.save_path = self.download_dir
+            params.storage_mode = lt.storage_mode_t.storage_mode_sparse
+            with self._registry_lock:
+                handle = self.session.add_torrent(params)
+                torrent_info['handle'] = handle
+            
+            self.logger.info(f"Forgot {len(torrent_info['discarded'])} discarded pieces of {torrent_id}")
+            torrent_info['discarded'].clear()
+            self._connect_cached_peers(torrent_id, handle)
+            
+            # Limits, priorities and deadlines all belonged to the old handle
+            self.allocations.pop(torrent_id, None)
+            torrent_info['wanted'] = None
+            if torrent_info['readahead']:
+                torrent_info['readahead'].rebind(handle)
+            if torrent_info['window']:
+                handle.set_upload_limit(self.WINDOW_UPLOAD_LIMIT)
+                self._apply_window(torrent_id, torrent_info)
+        except Exception as e:
+            self.logger.error(f"Failed to re-add {torrent_id} after discarding pieces: {e}")
+        finally:
+            torrent_info['refetching'] = False
+    
+    def _discard_piece(self, torrent_id: str, torrent_info: Dict, piece: int) -> bool:
+        """
+        Release the storage under one piece and stop treating it as
+        available. Returns False if the storage could not be released; a
+        piece released only in part is still treated as discarded.
+        """
+        torrent_file = torrent_info['torrent_file']
+        slices = torrent_file.map_block(piece, 0, torrent_file.piece_size(piece))
+        released = 0
+        for file_slice in slices:
+            path = self.get_file_location(torrent_id, file_slice.file_index)
+            if not path or not release_bytes(path, file_slice.offset, file_slice.size):
                 break
+            released += 1
+        
+        if released:
+            torrent_info['have'][piece] = 0
+            torrent_info['discarded'].add(piece)
+        if released < len(slices):
+            return False
+        torrent_info['window'].record_eviction()
+        return True
+    
+    def _classify(self, torrent_info: Dict) -> str:
+        """
+        Bandwidth class of a torrent: buffering while a reader waits on the
+        piece under its playhead (or playback is still being prepared),
+        playing while its readers are ahead, prefetching when downloading
+        with nobody reading or warming up, idle when paused or complete
+        """
+        if torrent_info['status'] in ('paused', 'completed', 'seeding', 'finished'):
+            return IDLE
+        
+        if torrent_info['warming']:
+            return PREFETCHING
+        
+        if not torrent_info['files'] or torrent_info['preparing']:
+            return BUFFERING if torrent_info['viewers'] else PREFETCHING
+        
+        scheduler = torrent_info['readahead']
+        readers = scheduler.readers if scheduler else {}
+        if not readers:
+            return PREFETCHING
+        
+        have = torrent_info['have']
+        for window in readers.values():
+            if window and window.start < len(have) and not have[window.start]:
+                return BUFFERING
+        return PLAYING
+    
+    def _bitrate(self, torrent_id: str, torrent_info: Dict) -> float:
+        """
+        Average bitrate (bytes/s) of the torrent's main video, known once its
+        container index has been parsed
+        """
+        videos = self.get_video_files(torrent_id) if torrent_info['files'] else []
+        if not videos:
+            return 0.0
+        
+        main_video = max(videos, key=lambda v: v['size'])
+        index = self.container_indexes.get(torrent_id, main_video['index'])
+        if index and index.duration:
+            return main_video['size'] / index.duration
+        return 0.0
+    
+    def _plan_bandwidth(self):
+        """
+        Re-plan per-torrent rate limits and connection caps from the classes
+        and rates measured since the last plan
+        """
+        torrents = list(self.active_torrents.items())
+        
+        demands = {
+            torrent_id: Demand(
+                torrent_id,
+                self._classify(info),
+                bitrate=self._bitrate(torrent_id, info),
+                download_rate=info['download_rate'],
+                upload_cap=self.WINDOW_UPLOAD_LIMIT if info['window'] else 0,
+                download_cap=info['warming']['download_limit'] if info['warming'] else 0
+            )
+            for torrent_id, info in torrents
+        }
+        self.bandwidth.observe(
+            sum(info['download_rate'] for _, info in torrents),
+            active=any(d.klass != IDLE for d in demands.values())
+        )
+        self._yield_warm_ups(self._watching())
+        
+        allocations = {}
+        for torrent_id, allocation in self.bandwidth.plan(demands).items():
+            torrent_info = self.active_torrents.get(torrent_id)
+            if not torrent_info:
+                continue
+            
+            previous = self.allocations.get(torrent_id)
+            if previous is None or previous.as_tuple() != allocation.as_tuple():
+                try:
+                    handle = torrent_info['handle']
+                    handle.set_download_limit(allocation.download_limit)
+                    handle.set_upload_limit(allocation.upload_limit)
+                    handle.set_max_connections(allocation.max_connections)
+                except Exception as e:
+                    self.logger.error(f"Failed to apply bandwidth plan to {torrent_id}: {e}")
+                    continue
+            
+            allocations[torrent_id] = allocation
+            torrent_info['bandwidth_class'] = demands[torrent_id].klass
+        
+        self.allocations = allocations
+    
+    def get_bandwidth_stats(self) -> Dict:
+        """
+        Current class and limits of every torrent, with the capacity in use
+        """
+        return {
+            **self.bandwidth.stats(),
+            'torrents': {
+                torrent_id: {
+                    'class': self.active_torrents[torrent_id]['bandwidth_class']
+                    if torrent_id in self.active_torrents else None,
+                    **allocation.to_dict()
+                }
+                for torrent_id, allocation in list(self.allocations.items())
+            }
+        }
+    
+    def warm_up(self, torrent_url: str, info_hash: Optional[str], head_bytes: int,
+                download_limit: int = 0, max_bytes: int = 0) -> Optional[str]:
+        """
+        Fetch the metadata of a torrent and the header, first head_bytes and
+        index of its main video in the background, then drop it from the
+        session with the pieces kept in the disk cache. Warm-ups are
+        prefetching-class, capped at download_limit (bytes/s, 0 = no cap),
+        and paused while anything is being watched. One whose whole pieces
+        would exceed max_bytes (0 = no cap) is dropped after its metadata.
+        Returns the torrent id, or None if the torrent is already active.
+        """
+        if info_hash and info_hash.lower() in self.active_torrents:
+            return None
+        
+        torrent_id = self.add_torrent(torrent_url, None, viewer_id=self.WARMUP_VIEWER, info_hash=info_hash)
+        torrent_info = self.active_torrents.get(torrent_id) if torrent_id else None
+        if not torrent_info:
+            return None
+        if set(torrent_info['viewers']) != {self.WARMUP_VIEWER}:
+            # Someone started watching it in the meantime
+            self.release_torrent(torrent_id, self.WARMUP_VIEWER)
+            return None
+        
+        torrent_info['warming'] = {'head_bytes': head_bytes, 'download_limit': download_limit,
+                                   'max_bytes': max_bytes, 'reserved_bytes': 0}
+        self.warm_up_bytes.pop(torrent_id, None)
+        self.warmups['started'] += 1
+        try:
+            # Out of libtorrent's queue so a pause sticks
+            torrent_info['handle'].unset_flags(lt.torrent_flags.auto_managed)
+            if download_limit:
+                torrent_info['handle'].set_download_limit(download_limit)
+        except Exception as e:
+            self.logger.error(f"Failed to set up warm-up of {torrent_id}: {e}")
+        self._yield_warm_ups(self._watching())
+        
+        def on_metadata(tid: str, event: str, info: Dict):
+            if event == 'metadata':
+                self.remove_listener(tid, on_metadata)
+                self._start_warm_up(tid, info)
+        
+        self.add_listener(torrent_id, on_metadata)
+        self.logger.info(f"Warming up {torrent_id} ({head_bytes} head bytes)")
+        return torrent_id
+    
+    def is_warming(self, torrent_id: str) -> bool:
+        """
+        Whether a warm-up of the torrent is still running
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        return bool(torrent_info and torrent_info['warming'])
+    
+    def cancel_warm_up(self, torrent_id: str) -> bool:
+        """
+        Stop a warm-up, keeping whatever it has fetched so far
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info or not torrent_info['warming']:
+            return False
+        
+        self.warmups['cancelled'] += 1
+        self._end_warm_up(torrent_id, torrent_info)
+        return True
+    
+    def take_warm_up_bytes(self, torrent_id: str) -> int:
+        """
+        Bytes the last warm-up of a torrent reserved on disk: every whole
+        piece under its header, head and index. 0 if its metadata never
+        arrived. Forgotten once read.
+        """
+        return self.warm_up_bytes.pop(torrent_id, 0)
+    
+    def get_warmup_stats(self) -> Dict:
+        """
+        Warm-up counters and the torrents being warmed up now
+        """
+        return {
+            **self.warmups,
+            'warming': {
+                torrent_id: {**info['warming'], 'yielded': info['yielded']}
+                for torrent_id, info in list(self.active_torrents.items())
+                if info['warming']
+            }
+        }
+    
+    def _start_warm_up(self, torrent_id: str, torrent_info: Dict):
+        """
+        Restrict a warming torrent to the playback pieces of its main video
+        once its metadata is known
+        """
+        if not torrent_info['warming']:
+            return
+        
+        videos = self.get_video_files(torrent_id)
+        if not videos:
+            self.warmups['completed'] += 1
+            self._end_warm_up(torrent_id, torrent_info)
+            return
+        
+        main_video = max(videos, key=lambda v: v['size'])
+        head_bytes = torrent_info['warming']['head_bytes']
+        
+        def on_ready(tid: str, file_index: int):
+            if torrent_info['warming']:
+                self.warmups['completed'] += 1
+                self._end_warm_up(tid, torrent_info)
+        
+        # Whole pieces, so the tail read and the rounding at both ends count
+        pieces = set(self.get_playback_pieces(torrent_id, main_video['index'], head_bytes))
+        torrent_file = torrent_info['torrent_file']
+        reserved = sum(torrent_file.piece_size(p) for p in pieces)
+        self.warm_up_bytes[torrent_id] = reserved
+        warming = torrent_info['warming']
+        warming['reserved_bytes'] = reserved
+        if warming['max_bytes'] and reserved > warming['max_bytes']:
+            self.logger.info(f"Warm-up of {torrent_id} needs {reserved} bytes, "
+                             f"over its {warming['max_bytes']} byte budget")
+            self.warmups['over_budget'] += 1
+            self._end_warm_up(torrent_id, torrent_info)
+            return
+        
+        try:
+            # A streaming-only window already limits the torrent to its header and index
+            if not torrent_info['window']:
+                torrent_info['handle'].prioritize_pieces(
+                    [1 if p in pieces else 0 for p in range(len(torrent_info['have']))]
+                )
+            self.prepare_playback(torrent_id, main_video['index'], on_ready,
+                                  head_bytes=head_bytes, metric='time_to_warm')
+        except Exception as e:
+            self.logger.error(f"Failed to start warm-up of {torrent_id}: {e}")
+            self.cancel_warm_up(torrent_id)
+    
+    def _end_warm_up(self, torrent_id: str, torrent_info: Dict):
+        """
+        Drop a finished or cancelled warm-up from the session
+        """
+        self._restore_warm_torrent(torrent_info)
+        self.release_torrent(torrent_id, self.WARMUP_VIEWER)
+    
+    def _claim_warm_up(self, torrent_id: str, torrent_info: Dict):
+        """
+        Turn a warm-up into a regular download for a viewer who pressed play
+        """
+        self.warmups['claimed'] += 1
+        self._restore_warm_torrent(torrent_info)
+        self.release_torrent(torrent_id, self.WARMUP_VIEWER)
+        self.logger.info(f"Warm-up of {torrent_id} taken over by playback")
+    
+    def _restore_warm_torrent(self, torrent_info: Dict):
+        """
+        Undo the warm-up's piece priorities, pause and rate cap, so neither
+        a viewer nor the saved resume data inherits them
+        """
+        torrent_info['warming'] = None
+        handle = torrent_info['handle']
+        try:
+            if torrent_info['files'] and not torrent_info['window']:
+                handle.prioritize_pieces([4] * len(torrent_info['have']))
+            handle.set_download_limit(0)
+            if torrent_info['yielded']:
+                handle.resume()
+            handle.set_flags(lt.torrent_flags.auto_managed)
+        except Exception as e:
+            self.logger.error(f"Failed to restore warmed torrent: {e}")
+        torrent_info['yielded'] = False
+    
+    def _watching(self) -> bool:
+        """
+        Whether any torrent has a viewer, from play being pressed (while its
+        metadata and startup pieces are still prefetching) until released
+        """
+        return any(
+            set(info['viewers']) - {self.WARMUP_VIEWER}
+            for info in list(self.active_torrents.values())
+        )
+    
+    def _yield_warm_ups(self, streaming: bool):
+        """
+        Pause warm-ups while anything is being watched, resume them after
+        """
+        for torrent_id, info in list(self.active_torrents.items()):
+            if not info['warming'] or info['yielded'] == streaming:
+                continue
+            try:
+                if streaming:
+                    info['handle'].pause()
+                else:
+                    info['handle'].resume()
+                info['yielded'] = streaming
+            except Exception as e:
+                self.logger.error(f"Failed to {'pause' if streaming else 'resume'} warm-up of {torrent_id}: {e}")
+    
+    def get_window_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Budget and eviction counters of every streaming-only torrent
+        """
+        return {
+            torrent_id: {**info['window'].stats(), 'held_pieces': sum(info['have'])}
+            for torrent_id, info in list(self.active_torrents.items())
+            if info['window']
+        }
     
-    def get_torrent_status(self, torrent_id: str) -> Optional[Dict]:
+    def _take_snapshot(self, torrent_id: str, torrent_info: Dict):
         """
-        Get current status of a torrent
+        Publish an immutable status snapshot for request threads to read
         """
-        return self.active_torrents.get(torrent_id)
+        torrent_file = torrent_info['torrent_file']
+        torrent_info['snapshot'] = TorrentSnapshot(
+            torrent_id=torrent_id,
+            status=torrent_info['status'],
+            progress=torrent_info['progress'],
+            download_rate=torrent_info['download_rate'],
+            upload_rate=torrent_info['upload_rate'],
+            peers=torrent_info['peers'],
+            viewers=len(torrent_info['viewers']),
+            num_pieces=len(torrent_info['have']),
+            piece_length=torrent_file.piece_length() if torrent_file else 0,
+            piece_runs=encode_runs(torrent_info['have']),
+            files=tuple((f['path'], f['size'], f['priority']) for f in torrent_info['files']),
+            file_pieces=tuple(f['pieces'] for f in torrent_info['files'])
+        )
+    
+    def _dispatch(self, torrent_id: str, torrent_info: Dict, event: str):
+        """
+        Call every listener of a torrent, isolating the loop from their errors
+        """
+        for listener in list(torrent_info['listeners']):
+            try:
+                listener(torrent_id, event, torrent_info)
+            except Exception as e:
+                self.logger.error(f"Error in {event} listener for {torrent_id}: {e}")
+    
+    def get_torrent_status(self, torrent_id: str) -> Optional[TorrentSnapshot]:
+        """
+        Get current status of a torrent, as of the last engine tick
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        return torrent_info['snapshot'] if torrent_info else None
     
     def get_torrent_files(self, torrent_id: str) -> list:
         """
@@ -143,7 +1148,6 @@ class TorrentManager:
         if not torrent_info:
             return None
         
-        handle = torrent_info['handle']
         files = torrent_info.get('files', [])
         
         if file_index >= len(files):
@@ -152,6 +1156,265 @@ class TorrentManager:
         file_path = os.path.join(self.download_dir, files[file_index]['path'])
         return file_path if os.path.exists(file_path) else None
     
+    def get_file_location(self, torrent_id: str, file_index: int) -> Optional[str]:
+        """
+        Get the path a file of the torrent is (or will be) written to,
+        regardless of whether any of it has been downloaded yet
+        """
+        files = self.get_torrent_files(torrent_id)
+        if file_index >= len(files):
+            return None
+        
+        return os.path.join(self.download_dir, files[file_index]['path'])
+    
+    def get_piece_span(self, torrent_id: str, file_index: int, offset: int, length: int) -> Optional[tuple]:
+        """
+        Map a byte range of a file onto the (first, last) pieces that cover it
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info:
+            return None
+        
+        torrent_file = torrent_info['torrent_file']
+        if not torrent_file or length <= 0:
+            return None
+        
+        first = torrent_file.map_file(file_index, offset, 1).piece
+        last = torrent_file.map_file(file_index, offset + length - 1, 1).piece
+        return first, last
+    
+    def have_range(self, torrent_id: str, file_index: int, offset: int, length: int) -> bool:
+        """
+        Check whether every piece covering a byte range of a file is on disk
+        """
+        span = self.get_piece_span(torrent_id, file_index, offset, length)
+        if not span:
+            return False
+        
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info:
+            return False
+        
+        have = torrent_info['have']
+        first, last = span
+        return last < len(have) and all(have[first:last + 1])
+
+    def available_length(self, torrent_id: str, file_index: int, offset: int, length: int) -> int:
+        """
+        Number of contiguous bytes from offset (up to length) that are on disk
+        """
+        span = self.get_piece_span(torrent_id, file_index, offset, length)
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not span or not torrent_info:
+            return 0
+
+        have = torrent_info['have']
+        first, last = span
+        missing = next((p for p in range(first, last + 1) if p >= len(have) or not have[p]), None)
+        if missing is None:
+            return length
+
+        torrent_file = torrent_info['torrent_file']
+        piece_length = torrent_file.piece_length()
+        request = torrent_file.map_file(file_index, offset, 1)
+        position = request.piece * piece_length + request.start
+        return max(0, min(length, missing * piece_length - position))
+
+    def wait_for_range(self, torrent_id: str, file_index: int, offset: int, length: int,
+                       timeout: float = 60.0) -> bool:
+        """
+        Block until the pieces covering a byte range of a file are on disk.
+        Returns False if the torrent goes away or the timeout expires.
+        """
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            torrent_info = self.active_torrents.get(torrent_id)
+            if not torrent_info:
+                return False
+            
+            if self.have_range(torrent_id, file_index, offset, length):
+                return True
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            
+            with torrent_info['pieces_changed']:
+                torrent_info['pieces_changed'].wait(min(remaining, 1.0))
+    
+    def get_playback_pieces(self, torrent_id: str, file_index: int,
+                            head_bytes: Optional[int] = None,
+                            tail_bytes: Optional[int] = None) -> list:
+        """
+        Pieces a player needs before it can start: the container header and
+        startup buffer at the head of the file, and the index at its tail
+        """
+        files = self.get_torrent_files(torrent_id)
+        if file_index >= len(files):
+            return []
+        
+        size = files[file_index]['size']
+        head_bytes = min(size, head_bytes if head_bytes is not None else self.STARTUP_BUFFER_BYTES)
+        tail_bytes = min(size, tail_bytes if tail_bytes is not None else self.INDEX_TAIL_BYTES)
+        
+        pieces = []
+        for offset, length in ((0, head_bytes), (size - tail_bytes, tail_bytes)):
+            span = self.get_piece_span(torrent_id, file_index, offset, length)
+            if span:
+                pieces.extend(p for p in range(span[0], span[1] + 1) if p not in pieces)
+        return pieces
+    
+    def prepare_playback(self, torrent_id: str, file_index: int, on_ready: Callable,
+                         head_bytes: Optional[int] = None, tail_bytes: Optional[int] = None,
+                         metric: str = 'time_to_ready') -> bool:
+        """
+        Fetch the head and tail pieces of a video first and call
+        on_ready(torrent_id, file_index) from the engine loop once they are
+        all on disk. The time this took is recorded under metric.
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info:
+            return False
+        
+        pieces = self.get_playback_pieces(torrent_id, file_index, head_bytes, tail_bytes)
+        if not pieces:
+            return False
+        
+        handle = torrent_info['handle']
+        started = time.monotonic()
+        
+        # Head pieces in playback order first, then the index at the tail
+        missing = set()
+        for position, piece in enumerate(pieces):
+            if not handle.have_piece(piece):
+                handle.set_piece_deadline(piece, position * 100)
+                missing.add(piece)
+        
+        def finish():
+            self.metrics.record(metric, time.monotonic() - started)
+            on_ready(torrent_id, file_index)
+        
+        if not missing:
+            finish()
+            return True
+        
+        # Counts as buffering for the bandwidth scheduler until ready
+        torrent_info['preparing'] += 1
+        
+        def on_event(tid: str, event: str, info: Dict):
+            if event not in ('piece', 'finished'):
+                return
+            for piece in [p for p in missing if handle.have_piece(p)]:
+                missing.discard(piece)
+            if not missing:
+                self.remove_listener(torrent_id, on_event)
+                torrent_info['preparing'] -= 1
+                finish()
+        
+        self.add_listener(torrent_id, on_event)
+        return True
+    
+    def read_range(self, torrent_id: str, file_index: int, offset: int, length: int,
+                   timeout: float = 60.0) -> bytes:
+        """
+        Read a byte range of a file, waiting for its pieces to arrive first.
+        Raises TimeoutError if they do not arrive in time.
+        """
+        if not self.wait_for_range(torrent_id, file_index, offset, length, timeout):
+            raise TimeoutError(f"Bytes {offset}-{offset + length - 1} of {torrent_id} not available")
+        
+        with open(self.get_file_location(torrent_id, file_index), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+    
+    def get_container_index(self, torrent_id: str, file_index: int,
+                            timeout: float = 60.0) -> Optional[ContainerIndex]:
+        """
+        Time-to-byte index of a video file, parsed once per info-hash from
+        the container header and index (MP4 moov, Matroska Cues). None if
+        the bytes it needs do not arrive within timeout.
+        """
+        files = self.get_torrent_files(torrent_id)
+        if file_index >= len(files):
+            return None
+        
+        return self.container_indexes.get_or_build(
+            torrent_id, file_index,
+            lambda offset, length: self.read_range(torrent_id, file_index, offset, length, timeout),
+            files[file_index]['size'],
+            files[file_index]['path']
+        )
+    
+    def get_keyframe_times(self, torrent_id: str, file_index: int) -> Optional[List[float]]:
+        """
+        Times of a video's keyframes from its container index, or None if
+        the index is not available within SEEK_INDEX_TIMEOUT
+        """
+        index = self.get_container_index(torrent_id, file_index, self.SEEK_INDEX_TIMEOUT)
+        if not index or not index.keyframes:
+            return None
+        return [time_at for time_at, _ in index.keyframes]
+    
+    def seek(self, torrent_id: str, reader_id: str, file_index: int, seconds: float) -> Optional[Dict]:
+        """
+        Prioritize the pieces of the keyframe nearest before a playback time.
+        Returns the keyframe's time and byte offset, or None without an index.
+        """
+        index = self.get_container_index(torrent_id, file_index, self.SEEK_INDEX_TIMEOUT)
+        keyframe = index.seek(seconds) if index else None
+        if not keyframe:
+            return None
+        
+        time_at, offset = keyframe
+        self.update_playhead(torrent_id, reader_id, file_index, offset)
+        return {'time': time_at, 'offset': offset, 'duration': index.duration}
+    
+    def update_playhead(self, torrent_id: str, reader_id: str, file_index: int, offset: int) -> bool:
+        """
+        Record a reader's current position in a file so the pieces just ahead
+        of it are downloaded first
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if not torrent_info:
+            return False
+        
+        torrent_file = torrent_info['torrent_file']
+        if not torrent_file:
+            return False
+        
+        scheduler = torrent_info['readahead']
+        if scheduler is None:
+            scheduler = ReadaheadScheduler(
+                torrent_info['handle'],
+                torrent_file.piece_length(),
+                torrent_file.num_pieces()
+            )
+            scheduler.observe_rate(torrent_info['download_rate'])
+            torrent_info['readahead'] = scheduler
+        
+        try:
+            piece = torrent_file.map_file(file_index, offset, 1).piece
+            scheduler.update(reader_id, piece)
+            if torrent_info['window']:
+                torrent_info['window'].set_reader(reader_id, piece)
+                self._apply_window(torrent_id, torrent_info)
+            self.disk_cache.touch(torrent_id)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to update playhead for {torrent_id}: {e}")
+            return False
+    
+    def remove_reader(self, torrent_id: str, reader_id: str):
+        """
+        Stop reading ahead for a reader that has gone away
+        """
+        torrent_info = self.active_torrents.get(torrent_id)
+        if torrent_info and torrent_info['readahead']:
+            torrent_info['readahead'].remove_reader(reader_id)
+        if torrent_info and torrent_info['window']:
+            torrent_info['window'].remove_reader(reader_id)
+    
     def prioritize_file(self, torrent_id: str, file_index: int, priority: int = 7):
         """
         Set priority for a specific file in the torrent
@@ -209,16 +1472,37 @@ class TorrentManager:
         if not torrent_info:
             return False
         
+        # Streaming-only torrents are full of holes; nothing worth caching
+        if torrent_info['window']:
+            delete_files = True
+        
         try:
-            self.session.remove_torrent(torrent_info['handle'])
-            del self.active_torrents[torrent_id]
+            with self._registry_lock:
+                handle = torrent_info['handle']
+                self.active_torrents.pop(torrent_id, None)
+                
+                if not delete_files and handle.status().has_metadata:
+                    self._save_peers(torrent_id, handle)
+                    
+                    # Remove once resume data is saved so a replay skips the recheck
+                    self._pending_removal[torrent_id] = handle
+                    handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+                else:
+                    self.session.remove_torrent(handle)
+            
+            # Release any streams still waiting on this torrent
+            with torrent_info['pieces_changed']:
+                torrent_info['pieces_changed'].notify_all()
             
             if delete_files:
                 # Clean up downloaded files
-                for file_info in torrent_info.get('files', []):
-                    file_path = os.path.join(self.download_dir, file_info['path'])
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                self.disk_cache.forget(torrent_id, delete_files=True)
+                self.resume_store.delete(torrent_id)
+                self.container_indexes.forget(torrent_id)
+            else:
+                # Keep the files cached, evictable once nobody watches them
+                for _ in torrent_info['viewers']:
+                    self.disk_cache.unpin(torrent_id)
             
             self.logger.info(f"Removed torrent: {torrent_id}")
             return True
@@ -231,12 +1515,11 @@ class TorrentManager:
         Get list of video files in a torrent
         """
         files = self.get_torrent_files(torrent_id)
-        video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v']
         
         video_files = []
         for i, file_info in enumerate(files):
             file_path = file_info['path'].lower()
-            if any(file_path.endswith(ext) for ext in video_extensions):
+            if file_path.endswith(VIDEO_EXTENSIONS):
                 video_files.append({
                     'index': i,
                     'path': file_info['path'],
@@ -246,19 +1529,24 @@ class TorrentManager:
         
         return video_files
     
-    def cleanup(self):
+    def cleanup(self, delete_files: bool = False):
         """
-        Clean up all torrents and temporary files
+        Remove all torrents from the session. Downloaded files stay in the
+        disk cache for the next run unless delete_files is set.
         """
         for torrent_id in list(self.active_torrents.keys()):
-            self.remove_torrent(torrent_id, delete_files=True)
+            self.remove_torrent(torrent_id, delete_files=delete_files)
         
-        # Clean up download directory
-        try:
-            import shutil
-            shutil.rmtree(self.download_dir, ignore_errors=True)
-        except Exception as e:
-            self.logger.error(f"Failed to cleanup download directory: {e}")
+        # Give the engine loop a moment to write out pending resume data
+        deadline = time.monotonic() + 10
+        while self._pending_removal and time.monotonic() < deadline:
+            time.sleep(0.1)
+        
+        self._save_session_state()
+        self._running = False
+        # Let the loop leave libtorrent before the session can be torn down
+        self._engine_thread.join(timeout=5 * self.UPDATE_INTERVAL)
+        self.disk_cache.save()
 
 if __name__ == "__main__":
     # Test the torrent manager
@@ -275,4 +1563,4 @@ if __name__ == "__main__":
     if torrent_id:
         print(f"Added torrent: {torrent_id}")
         time.sleep(10)  # Monitor for 10 seconds
-        manager.cleanup()
+        manager.cleanup(delete_files=True)
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional
+
+QUALITY_ORDER = ['2160p', '1080p', '720p', '480p']
+
+# Rough upload a single seed / leecher contributes to one downloader (bytes/s)
+SEED_RATE = 96 * 1024
+PEER_RATE = 24 * 1024
+
+# Typical bitrates (bytes/s) when size or runtime is unknown
+DEFAULT_BITRATES = {
+    '2160p': 2_500_000,
+    '1080p': 250_000,
+    '720p': 125_000,
+    '480p': 80_000
+}
+
+# Sustained rate needed relative to the bitrate to play without rebuffering
+REALTIME_MARGIN = 1.3
+
+
+def estimate_bitrate(torrent: Dict, runtime_minutes: Optional[int]) -> float:
+    """
+    Average bitrate of a torrent's video in bytes/s: its size over the
+    movie's runtime
+    """
+    size = torrent.get('size_bytes') or 0
+    if size and runtime_minutes:
+        return size / (runtime_minutes * 60)
+    return DEFAULT_BITRATES.get(torrent.get('quality'), DEFAULT_BITRATES['720p'])
+
+
+def estimate_swarm_rate(torrent: Dict) -> float:
+    """
+    Download rate one client can expect from a swarm of this health
+    """
+    return (torrent.get('seeds') or 0) * SEED_RATE + (torrent.get('peers') or 0) * PEER_RATE
+
+
+def score_torrent(torrent: Dict, runtime_minutes: Optional[int],
+                  throughput: Optional[float] = None) -> Dict[str, float]:
+    """
+    Expected playback headroom of one torrent: the rate it can sustain (its
+    swarm, capped by the client's measured throughput) over the rate it
+    needs to play in real time
+    """
+    bitrate = estimate_bitrate(torrent, runtime_minutes)
+    sustainable = estimate_swarm_rate(torrent)
+    if throughput:
+        sustainable = min(sustainable, throughput)
+
+    return {
+        'bitrate': bitrate,
+        'sustainable': sustainable,
+        'headroom': sustainable / (bitrate * REALTIME_MARGIN)
+    }
+
+
+def quality_fallback(preferred_quality: str) -> List[str]:
+    """
+    Qualities to try: the preferred one, then lower ones, then higher ones
+    """
+    if preferred_quality not in QUALITY_ORDER:
+        return list(QUALITY_ORDER)
+
+    position = QUALITY_ORDER.index(preferred_quality)
+    return QUALITY_ORDER[position:] + QUALITY_ORDER[:position][::-1]
+
+
+def choose_torrent(torrents: List[Dict], runtime_minutes: Optional[int],
+                   preferred_quality: str = '720p',
+                   throughput: Optional[float] = None) -> Optional[Dict]:
+    """
+    Pick the torrent to stream: the healthiest one at the preferred quality
+    if it can play in real time, otherwise the first fallback quality that
+    can. If none can, the one with the most headroom wins.
+    """
+    if not torrents:
+        return None
+
+    scored = [(score_torrent(t, runtime_minutes, throughput), t) for t in torrents]
+
+    for quality in quality_fallback(preferred_quality):
+        candidates = [(s, t) for s, t in scored if t.get('quality') == quality]
+        viable = [(s, t) for s, t in candidates if s['headroom'] >= 1.0]
+        if viable:
+            return max(viable, key=lambda entry: (entry[0]['headroom'], entry[1].get('seeds') or 0))[1]
+
+    # Prefer regular releases over 3D and other odd qualities
+    known = [(s, t) for s, t in scored if t.get('quality') in QUALITY_ORDER] or scored
+    return max(known, key=lambda entry: entry[0]['headroom'])[1]
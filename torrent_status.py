@@ -0,0 +1,144 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v')
+
+
+def encode_runs(pieces: Iterable[int]) -> List[int]:
+    """
+    Run-length encode a piece bitfield as alternating run lengths, starting
+    with a (possibly empty) run of missing pieces: [missing, have, missing, ...]
+    """
+    runs = []
+    current = 0
+    length = 0
+    for have in pieces:
+        have = 1 if have else 0
+        if have == current:
+            length += 1
+        else:
+            runs.append(length)
+            current = have
+            length = 1
+    if length or not runs:
+        runs.append(length)
+    return runs
+
+
+def decode_runs(runs: List[int]) -> List[int]:
+    """
+    Expand alternating run lengths back into a 0/1 piece list
+    """
+    pieces = []
+    for position, length in enumerate(runs):
+        pieces.extend([position % 2] * length)
+    return pieces
+
+
+class TorrentSnapshot:
+    """
+    Immutable, serializable view of a torrent taken once per engine tick, so
+    request threads can read status without touching libtorrent
+    """
+
+    __slots__ = ('torrent_id', 'status', 'progress', 'download_rate', 'upload_rate',
+                 'peers', 'viewers', 'num_pieces', 'piece_length', 'piece_runs',
+                 'files', 'file_pieces', 'updated_at', '_dict')
+
+    def __init__(self, torrent_id: str, status: str, progress: float, download_rate: int,
+                 upload_rate: int, peers: int, viewers: int, num_pieces: int, piece_length: int,
+                 piece_runs: Tuple[int, ...], files: Tuple[Tuple[str, int, int], ...],
+                 file_pieces: Tuple[Tuple[int, int], ...] = (),
+                 updated_at: Optional[float] = None):
+        values = {
+            'torrent_id': torrent_id,
+            'status': status,
+            'progress': progress,
+            'download_rate': download_rate,
+            'upload_rate': upload_rate,
+            'peers': peers,
+            'viewers': viewers,
+            'num_pieces': num_pieces,
+            'piece_length': piece_length,
+            'piece_runs': tuple(piece_runs),
+            'files': tuple(files),
+            'file_pieces': tuple(file_pieces),
+            'updated_at': time.time() if updated_at is None else updated_at,
+            '_dict': None
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def to_dict(self) -> Dict:
+        """
+        JSON-ready status (without the piece map), built once and reused
+        """
+        if self._dict is None:
+            object.__setattr__(self, '_dict', {
+                'torrent_id': self.torrent_id,
+                'status': self.status,
+                'progress': self.progress,
+                'download_rate': self.download_rate,
+                'upload_rate': self.upload_rate,
+                'peers': self.peers,
+                'viewers': self.viewers,
+                'num_pieces': self.num_pieces,
+                'files': [
+                    {'path': path, 'size': size, 'priority': priority}
+                    for path, size, priority in self.files
+                ],
+                'updated_at': self.updated_at
+            })
+        return self._dict
+
+    def to_wire(self) -> Dict:
+        """
+        Every field, for sending the snapshot to another process
+        """
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_dict'}
+
+    @classmethod
+    def from_wire(cls, data: Dict) -> 'TorrentSnapshot':
+        return cls(
+            torrent_id=data['torrent_id'],
+            status=data['status'],
+            progress=data['progress'],
+            download_rate=data['download_rate'],
+            upload_rate=data['upload_rate'],
+            peers=data['peers'],
+            viewers=data['viewers'],
+            num_pieces=data['num_pieces'],
+            piece_length=data['piece_length'],
+            piece_runs=tuple(data['piece_runs']),
+            files=tuple(tuple(f) for f in data['files']),
+            file_pieces=tuple(tuple(span) for span in data.get('file_pieces', ())),
+            updated_at=data['updated_at']
+        )
+
+    def main_video_index(self) -> Optional[int]:
+        """
+        Index of the largest video file, if the file list is known
+        """
+        videos = [(size, index) for index, (path, size, _) in enumerate(self.files)
+                  if path.lower().endswith(VIDEO_EXTENSIONS)]
+        return max(videos)[1] if videos else None
+
+    def file_piece_span(self, file_index: int) -> Optional[Tuple[int, int]]:
+        """
+        (first, last) pieces covering a file, known once metadata has arrived
+        """
+        if 0 <= file_index < len(self.file_pieces):
+            return self.file_pieces[file_index]
+        return None
+
+    def pieces_dict(self) -> Dict:
+        return {
+            'torrent_id': self.torrent_id,
+            'num_pieces': self.num_pieces,
+            'piece_length': self.piece_length,
+            'runs': list(self.piece_runs),
+            'updated_at': self.updated_at
+        }
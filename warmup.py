@@ -0,0 +1,157 @@
+import threading
+import time
+import logging
+from typing import Dict, Tuple
+
+from offload import native_thread
+from torrent_scoring import estimate_bitrate
+
+
+class WarmupPrefetcher:
+    """
+    Background thread that warms up the torrents of trending titles so they
+    start near-instantly: for each title on the first page of the listing it
+    picks the torrent a viewer would get and has the torrent manager fetch
+    its metadata plus the header, index and first head_seconds of its main
+    video. Warm-ups run one at a time at prefetching priority, capped at
+    download_limit, and the manager pauses them while anything is watched.
+    Each title is charged the whole pieces its warm-up reserves (header,
+    head and index), and a round stops at the first title that would take
+    it past disk_budget.
+    """
+
+    def __init__(self, scraper, manager, sort_by: str = 'download_count', titles: int = 10,
+                 quality: str = '720p', head_seconds: float = 30.0, download_limit: int = 0,
+                 disk_budget: int = 1024 ** 3, interval: float = 1800, timeout: float = 600,
+                 poll_interval: float = 5.0):
+        self.scraper = scraper
+        self.manager = manager
+        self.sort_by = sort_by
+        self.titles = titles
+        self.quality = quality
+        self.head_seconds = head_seconds
+        self.download_limit = download_limit
+        self.disk_budget = disk_budget
+        self.interval = interval
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(__name__)
+        self.last_run = None
+        self.current = None
+        self.warmed = 0
+        self.timeouts = 0
+        self._done: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = native_thread(self._run, name='warmup')
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.current:
+            self.manager.cancel_warm_up(self.current)
+
+    def warm_once(self) -> int:
+        """
+        Warm up the current trending titles, returning the number warmed
+        """
+        movies = self.scraper.get_movies(limit=self.titles, quality=self.quality, sort_by=self.sort_by)
+        trending = set()
+        used = 0
+        warmed = 0
+
+        for movie in movies:
+            if self._stop.is_set():
+                break
+
+            torrent = self.scraper.get_best_torrent(movie, self.quality)
+            if not torrent or not torrent.get('hash') or not torrent.get('url'):
+                continue
+
+            info_hash = torrent['hash'].lower()
+            if info_hash in trending:
+                continue
+
+            remaining = self.disk_budget - used
+            if info_hash in self._done:
+                if self._done[info_hash] > remaining:
+                    break
+                used += self._done[info_hash]
+                trending.add(info_hash)
+                continue
+
+            head_bytes = int(estimate_bitrate(torrent, movie.get('runtime')) * self.head_seconds)
+            if head_bytes > remaining:
+                break
+            done, reserved = self._warm(movie, torrent['url'], info_hash, head_bytes, remaining)
+            if reserved > remaining:
+                self.logger.info(f"Warm-up budget reached at {movie.get('title')} ({reserved} bytes)")
+                break
+            used += reserved
+            trending.add(info_hash)
+            if done:
+                self.logger.info(f"Warmed up {movie.get('title')} ({reserved} bytes)")
+                self._done[info_hash] = reserved
+                warmed += 1
+
+        # Titles that left the list may be evicted; warm them again if they return
+        self._done = {h: size for h, size in self._done.items() if h in trending}
+        self.warmed += warmed
+        self.last_run = time.time()
+        self.logger.info(f"Warm-up round finished: {warmed} new of {len(trending)} trending titles")
+        return warmed
+
+    def stats(self) -> Dict:
+        return {
+            'sort_by': self.sort_by,
+            'last_run': self.last_run,
+            'current': self.current,
+            'warm_titles': len(self._done),
+            'warm_bytes': sum(self._done.values()),
+            'warmed': self.warmed,
+            'timeouts': self.timeouts,
+            'manager': self.manager.get_warmup_stats()
+        }
+
+    def _warm(self, movie: Dict, torrent_url: str, info_hash: str, head_bytes: int,
+              max_bytes: int) -> Tuple[bool, int]:
+        """
+        Warm up one torrent; whether it finished, and the bytes it reserved
+        """
+        torrent_id = self.manager.warm_up(torrent_url, info_hash, head_bytes,
+                                          self.download_limit, max_bytes)
+        if not torrent_id:
+            # Already active, most likely being watched
+            return False, 0
+        done = self._wait(movie, torrent_id)
+        return done, self.manager.take_warm_up_bytes(torrent_id)
+
+    def _wait(self, movie: Dict, torrent_id: str) -> bool:
+        """
+        Wait for a warm-up to end; False if it was cancelled or timed out
+        """
+        self.current = torrent_id
+        deadline = time.monotonic() + self.timeout
+        try:
+            while self.manager.is_warming(torrent_id):
+                if self._stop.wait(self.poll_interval):
+                    return False
+                if time.monotonic() >= deadline:
+                    self.logger.info(f"Warm-up of {movie.get('title')} timed out")
+                    self.manager.cancel_warm_up(torrent_id)
+                    self.timeouts += 1
+                    return False
+        finally:
+            self.current = None
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.warm_once()
+            except Exception as e:
+                self.logger.error(f"Warm-up failed: {e}")
+            self._stop.wait(self.interval)
@@ -1,17 +1,46 @@
 import requests
-from bs4 import BeautifulSoup
 import json
-import re
-from typing import List, Dict, Optional
-import time
+from typing import Callable, List, Dict, Optional, Tuple
+import threading
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from torrent_scoring import choose_torrent
+
+class YTSError(Exception):
+    """Raised when the YTS API answers with a non-ok status"""
+
 
 class YTSScraper:
-    def __init__(self):
+    # (ttl, stale_ttl) in seconds for each cached endpoint
+    CACHE_TTLS = {
+        'list': (300, 900),
+        'search': (600, 1800),
+        'details': (3600, 6 * 3600)
+    }
+    
+    # Upper bound on concurrent upstream requests (async API and refreshes)
+    MAX_CONCURRENCY = int(os.environ.get('YTS_MAX_CONCURRENCY', 8))
+    
+    def __init__(self, cache: Optional[ResponseCache] = None):
         self.base_url = "https://yts.mx"
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Keep-alive connections for every worker of the pool
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.MAX_CONCURRENCY)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENCY,
+                                            thread_name_prefix='yts')
+        self.cache = cache or ResponseCache()
+        self._flight = SingleFlight()
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
     
     def get_movies(self, page: int = 1, limit: int = 20, quality: str = "720p", 
                    minimum_rating: int = 0, query_term: str = "", 
@@ -19,36 +48,42 @@ class YTSScraper:
         """
         Fetch movies from YTS.mx API
         """
+        params = {
+            'page': page,
+            'limit': limit,
+            'quality': quality,
+            'minimum_rating': minimum_rating,
+            'query_term': query_term,
+            'genre': genre,
+            'sort_by': sort_by
+        }
+        
         try:
-            url = f"{self.base_url}/api/v2/list_movies.json"
-            params = {
-                'page': page,
-                'limit': limit,
-                'quality': quality,
-                'minimum_rating': minimum_rating,
-                'query_term': query_term,
-                'genre': genre,
-                'sort_by': sort_by
-            }
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data.get('status') == 'ok':
-                movies = data.get('data', {}).get('movies', [])
-                return self._process_movies(movies)
-            else:
-                print(f"API Error: {data.get('status_message', 'Unknown error')}")
-                return []
-                
+            return self._cached('search' if query_term else 'list', 'list_movies.json', params,
+                                lambda data: self._process_movies(data.get('movies', [])))
         except requests.RequestException as e:
             print(f"Request error: {e}")
             return []
         except json.JSONDecodeError as e:
             print(f"JSON decode error: {e}")
             return []
+        except YTSError as e:
+            print(f"API Error: {e}")
+            return []
+    
+    def fetch_movies_page(self, page: int = 1, limit: int = 50,
+                          sort_by: str = "date_added") -> Tuple[List[Dict], int]:
+        """
+        Fetch one uncached listing page for bulk syncing.
+        Returns (movies, total movie count) and raises on upstream errors.
+        """
+        data = self._request('list_movies.json', {
+            'page': page,
+            'limit': limit,
+            'quality': 'all',
+            'sort_by': sort_by
+        })
+        return self._process_movies(data.get('movies', [])), data.get('movie_count', 0)
     
     def search_movies(self, query: str, limit: int = 20) -> List[Dict]:
         """
@@ -61,27 +96,154 @@ class YTSScraper:
         Get detailed information about a specific movie
         """
         try:
-            url = f"{self.base_url}/api/v2/movie_details.json"
-            params = {'movie_id': movie_id}
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data.get('status') == 'ok':
-                movie = data.get('data', {}).get('movie', {})
-                return self._process_movie_details(movie)
-            else:
-                print(f"API Error: {data.get('status_message', 'Unknown error')}")
-                return None
-                
+            return self._cached('details', 'movie_details.json', {'movie_id': movie_id},
+                                lambda data: self._process_movie_details(data.get('movie', {})))
         except requests.RequestException as e:
             print(f"Request error: {e}")
             return None
         except json.JSONDecodeError as e:
             print(f"JSON decode error: {e}")
             return None
+        except YTSError as e:
+            print(f"API Error: {e}")
+            return None
+    
+    def get_movie_details_many(self, movie_ids: List[int],
+                               timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        """
+        Details of several movies in input order. Cached ones are returned
+        as they are; the rest are fetched concurrently on the bounded pool.
+        With a timeout, fetches still running are left to finish into the
+        cache and come back as None, as do unknown ids (YTS answers those
+        with an empty movie).
+        """
+        results = {}
+        pending = {}
+        for movie_id in dict.fromkeys(movie_ids):
+            key = self._cache_key('movie_details.json', {'movie_id': movie_id})
+            if self.cache.peek(key) is not None:
+                results[movie_id] = self.get_movie_details(movie_id)
+            else:
+                pending[movie_id] = self._executor.submit(self.get_movie_details, movie_id)
+        
+        if pending:
+            wait(pending.values(), timeout=timeout)
+        for movie_id, future in pending.items():
+            results[movie_id] = future.result() if future.done() else None
+        
+        return [results[movie_id] if results[movie_id] and results[movie_id].get('id') else None
+                for movie_id in movie_ids]
+    
+    def etag(self, value) -> Optional[str]:
+        """
+        Content hash of a listing or movie this scraper returned, kept with
+        its cache entry; None if it was not cached or has since changed
+        """
+        return self.cache.etag(value)
+    
+    async def get_movies_async(self, **kwargs) -> List[Dict]:
+        """
+        get_movies for asyncio callers, run on the scraper's bounded pool
+        """
+        return await self._run_async(self.get_movies, **kwargs)
+    
+    async def search_movies_async(self, query: str, limit: int = 20) -> List[Dict]:
+        return await self._run_async(self.search_movies, query, limit)
+    
+    async def get_movie_details_async(self, movie_id: int) -> Optional[Dict]:
+        return await self._run_async(self.get_movie_details, movie_id)
+    
+    async def get_movie_details_many_async(self, movie_ids: List[int],
+                                           timeout: Optional[float] = None) -> List[Optional[Dict]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.get_movie_details_many, movie_ids, timeout))
+    
+    async def _run_async(self, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and eviction counters of the response cache, plus the
+        number of upstream calls saved by request coalescing
+        """
+        stats = self.cache.stats()
+        stats['coalesced'] = self._flight.coalesced
+        return stats
+    
+    def _cache_key(self, endpoint: str, params: Dict) -> tuple:
+        """
+        Normalize an endpoint and its params into a hashable key
+        """
+        return (endpoint,) + tuple(sorted((k, str(v)) for k, v in params.items()))
+    
+    def _cached(self, kind: str, endpoint: str, params: Dict, process: Callable):
+        """
+        Serve a processed API response from the cache. Stale entries are
+        returned immediately while a background refresh fetches a new copy.
+        """
+        key = self._cache_key(endpoint, params)
+        cached = self.cache.get(key)
+        
+        if cached is not None:
+            value, fresh = cached
+            if not fresh:
+                self._refresh_in_background(kind, key, endpoint, params, process)
+            return value
+        
+        return self._fetch_and_store(kind, key, endpoint, params, process)
+    
+    def _fetch_and_store(self, kind: str, key: tuple, endpoint: str, params: Dict, process: Callable):
+        """
+        Fetch and cache a response. Concurrent callers for the same key share
+        one upstream request, and its error if it fails.
+        """
+        def fetch():
+            value = process(self._request(endpoint, params))
+            ttl, stale_ttl = self.CACHE_TTLS[kind]
+            self.cache.set(key, value, ttl, stale_ttl)
+            return value
+        
+        return self._flight.do(key, fetch)
+    
+    def _refresh_in_background(self, kind: str, key: tuple, endpoint: str, params: Dict, process: Callable):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def refresh():
+            try:
+                self._fetch_and_store(kind, key, endpoint, params, process)
+            except (requests.RequestException, ValueError, YTSError) as e:
+                print(f"Background refresh failed for {endpoint}: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+        
+        self._executor.submit(refresh)
+    
+    def fetch_image(self, url: str) -> bytes:
+        """
+        Download a poster or background image
+        """
+        response = self.session.get(url, timeout=15)
+        response.raise_for_status()
+        return response.content
+    
+    def _request(self, endpoint: str, params: Dict) -> Dict:
+        """
+        Call a YTS API endpoint and return its 'data' object
+        """
+        url = f"{self.base_url}/api/v2/{endpoint}"
+        response = self.session.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        
+        data = response.json()
+        if data.get('status') != 'ok':
+            raise YTSError(data.get('status_message', 'Unknown error'))
+        
+        return data.get('data', {})
     
     def _process_movies(self, movies: List[Dict]) -> List[Dict]:
         """
@@ -102,7 +264,8 @@ class YTSScraper:
                 'background_image': movie.get('background_image'),
                 'medium_cover_image': movie.get('medium_cover_image'),
                 'large_cover_image': movie.get('large_cover_image'),
-                'torrents': movie.get('torrents', [])
+                'torrents': movie.get('torrents', []),
+                'date_added': movie.get('date_uploaded_unix')
             }
             processed.append(processed_movie)
         return processed
@@ -131,27 +294,15 @@ class YTSScraper:
             'yt_trailer_code': movie.get('yt_trailer_code')
         }
     
-    def get_best_torrent(self, movie: Dict, preferred_quality: str = "720p") -> Optional[Dict]:
+    def get_best_torrent(self, movie: Dict, preferred_quality: str = "720p",
+                         throughput: Optional[float] = None) -> Optional[Dict]:
         """
-        Get the best available torrent for a movie based on quality preference
+        Get the best torrent for a movie: the preferred quality if its swarm
+        (and the client's measured throughput, in bytes/s) can sustain its
+        bitrate, otherwise the next lower quality that can
         """
-        torrents = movie.get('torrents', [])
-        if not torrents:
-            return None
-        
-        # Sort by quality preference
-        quality_order = ['2160p', '1080p', '720p', '480p']
-        if preferred_quality in quality_order:
-            preferred_index = quality_order.index(preferred_quality)
-            quality_order = [preferred_quality] + [q for q in quality_order if q != preferred_quality]
-        
-        for quality in quality_order:
-            for torrent in torrents:
-                if torrent.get('quality') == quality:
-                    return torrent
-        
-        # If no preferred quality found, return the first available
-        return torrents[0] if torrents else None
+        return choose_torrent(movie.get('torrents', []), movie.get('runtime'),
+                              preferred_quality, throughput)
 
 if __name__ == "__main__":
     # Test the scraper